@@ -0,0 +1,30 @@
+"""
+Guard for operational endpoints (index reloads, diagnostics).
+
+Admin routes are disabled unless ADMIN_TOKEN is set; callers must then send it
+in the X-Admin-Token header.
+"""
+import os
+import hmac
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+
+
+def admin_token() -> str:
+    return os.getenv("ADMIN_TOKEN", "")
+
+
+def is_admin(token: Optional[str]) -> bool:
+    expected = admin_token()
+    return bool(expected) and bool(token) and hmac.compare_digest(token, expected)
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """FastAPI dependency for admin-only routes."""
+    if not admin_token():
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN not set).")
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=401, detail=f"Missing or invalid {ADMIN_TOKEN_HEADER} header.")
@@ -0,0 +1,245 @@
+"""
+Admission control for /chat.
+
+Expensive work is split into stages (classification, retrieval, generation),
+each with its own concurrency pool, so a burst of generations cannot starve
+classification of the next requests. Waiters are granted slots earliest
+deadline first. A request is shed (503) as soon as it can no longer finish
+within its deadline given the current queue and the observed service times,
+instead of waiting until the client has already given up. Per-client token
+buckets (429) bound how much expensive work any one client can queue.
+Cheap answers (small talk, cache hits) never enter the pools.
+"""
+import os
+import time
+import heapq
+import itertools
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+STAGES = ("classification", "retrieval", "generation")
+EWMA_ALPHA = 0.2
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed; maps to 503 (or 429 for rate limits)."""
+
+    def __init__(self, reason: str, retry_after: float = 1.0, status_code: int = 503):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, int(round(retry_after)))
+        self.status_code = status_code
+
+
+class StagePool:
+    """Bounded concurrency for one stage with an earliest-deadline-first wait queue."""
+
+    def __init__(self, name: str, limit: int, max_queue: int):
+        self.name = name
+        self.limit = max(1, limit)
+        self.max_queue = max_queue
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._seq = itertools.count()
+        self.active = 0
+        self.admitted = 0
+        self.shed = 0
+        self.total_wait_s = 0.0
+        self.max_wait_s = 0.0
+        self.service_s = None  # EWMA of time a slot is held
+
+    def expected_wait(self) -> float:
+        """Time until a newly queued request would get a slot, from the current queue."""
+        if self.service_s is None:
+            return 0.0
+        ahead = len(self._waiters) + max(self.active - self.limit + 1, 0)
+        return ahead * self.service_s / self.limit
+
+    def expected_service(self) -> float:
+        return self.service_s or 0.0
+
+    def _shed(self, reason: str, retry_after: float):
+        self.shed += 1
+        raise Overloaded(f"{self.name}: {reason}", retry_after)
+
+    def acquire(self, deadline: Optional[float], downstream_s: float = 0.0):
+        with self._cond:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                self.admitted += 1
+                return 0.0
+
+            wait_estimate = self.expected_wait()
+            if len(self._waiters) >= self.max_queue:
+                self._shed("queue full", wait_estimate)
+            if deadline is not None and time.monotonic() + wait_estimate + downstream_s > deadline:
+                self._shed("deadline cannot be met", wait_estimate)
+
+            # Earliest deadline first; requests without one go last, in arrival order
+            ticket = (deadline if deadline is not None else float("inf"), next(self._seq))
+            heapq.heappush(self._waiters, ticket)
+            started = time.monotonic()
+            try:
+                while not (self.active < self.limit and self._waiters[0] == ticket):
+                    timeout = None if deadline is None else deadline - time.monotonic()
+                    if timeout is not None and timeout <= 0:
+                        self._shed("deadline expired while queued", self.expected_wait())
+                    self._cond.wait(timeout)
+            except BaseException:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+                raise
+
+            heapq.heappop(self._waiters)
+            self.active += 1
+            self.admitted += 1
+            waited = time.monotonic() - started
+            self.total_wait_s += waited
+            self.max_wait_s = max(self.max_wait_s, waited)
+            # Another slot may still be free for the next waiter
+            self._cond.notify_all()
+            return waited
+
+    def release(self, held_s: float):
+        with self._cond:
+            self.active -= 1
+            self.service_s = held_s if self.service_s is None else (
+                EWMA_ALPHA * held_s + (1 - EWMA_ALPHA) * self.service_s)
+            self._cond.notify_all()
+
+    def stats(self) -> Dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": len(self._waiters),
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "avg_wait_ms": round(1000 * self.total_wait_s / self.admitted, 1) if self.admitted else 0.0,
+            "max_wait_ms": round(1000 * self.max_wait_s, 1),
+            "expected_wait_ms": round(1000 * self.expected_wait(), 1),
+            "avg_service_ms": round(1000 * self.expected_service(), 1),
+        }
+
+
+class TokenBucket:
+    def __init__(self, rate_per_s: float, burst: float):
+        self.rate = rate_per_s
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Consume a token; returns 0 on success or the seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+
+class ClientLimiter:
+    """Per-client token buckets, keeping the most recently seen `max_clients`."""
+
+    def __init__(self, per_minute: float, burst: float, max_clients: int = 10000):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    def check(self, client_id: str):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            bucket = self._buckets.get(client_id)
+            if bucket is None:
+                bucket = self._buckets[client_id] = TokenBucket(self.rate, self.burst)
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            self._buckets.move_to_end(client_id)
+            retry_after = bucket.take()
+            if retry_after:
+                self.limited += 1
+                raise Overloaded("rate limit exceeded", retry_after, status_code=429)
+
+
+class AdmissionController:
+    def __init__(self):
+        cores = os.cpu_count() or 1
+        max_queue = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+        self.pools = {
+            "classification": StagePool("classification", int(os.getenv("CLASSIFY_CONCURRENCY", "8")), max_queue),
+            "retrieval": StagePool("retrieval", int(os.getenv("RETRIEVAL_CONCURRENCY", str(cores))), max_queue),
+            "generation": StagePool("generation", int(os.getenv("GENERATION_CONCURRENCY", "4")), max_queue),
+        }
+        # Requests past the fast lane at once; keep below the threadpool size (40) so
+        # queued RAG work can never occupy every thread
+        self.max_inflight = int(os.getenv("ADMISSION_MAX_INFLIGHT", "32"))
+        self.limiter = ClientLimiter(float(os.getenv("RATE_LIMIT_PER_MINUTE", "30")),
+                                     float(os.getenv("RATE_LIMIT_BURST", "10")))
+        self._lock = threading.Lock()
+        self.inflight = 0
+        self.fast_lane = 0
+        self.shed_inflight = 0
+
+    @staticmethod
+    def deadline_from(deadline_ms) -> Optional[float]:
+        """Absolute monotonic deadline from a client budget in milliseconds (ignored if invalid)."""
+        try:
+            budget = float(deadline_ms) if deadline_ms is not None else 0.0
+        except (TypeError, ValueError):
+            return None
+        if budget <= 0:
+            return None
+        return time.monotonic() + budget / 1000.0
+
+    def record_fast_lane(self):
+        with self._lock:
+            self.fast_lane += 1
+
+    def downstream_s(self, stage: str) -> float:
+        """Observed service time of the stages after `stage`."""
+        later = STAGES[STAGES.index(stage) + 1:]
+        return sum(self.pools[name].expected_service() for name in later)
+
+    @contextmanager
+    def request(self, client_id: str):
+        """Admit one expensive request: rate limit, then the global in-flight cap."""
+        self.limiter.check(client_id)
+        with self._lock:
+            if self.inflight >= self.max_inflight:
+                self.shed_inflight += 1
+                raise Overloaded("too many requests in flight", self.pools["generation"].expected_wait())
+            self.inflight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.inflight -= 1
+
+    @contextmanager
+    def stage(self, name: str, deadline: Optional[float]):
+        pool = self.pools[name]
+        pool.acquire(deadline, pool.expected_service() + self.downstream_s(name))
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            pool.release(time.monotonic() - started)
+
+    def stats(self) -> Dict:
+        return {
+            "inflight": self.inflight,
+            "max_inflight": self.max_inflight,
+            "fast_lane": self.fast_lane,
+            "shed_inflight": self.shed_inflight,
+            "rate_limited": self.limiter.limited,
+            "pools": {name: pool.stats() for name, pool in self.pools.items()},
+        }
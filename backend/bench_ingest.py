@@ -0,0 +1,290 @@
+"""
+Ingest throughput benchmarks with a regression gate.
+
+Each stage of backend/ingest.py is timed on the processeddata/ corpus and on
+synthetic corpora made of N replicas of every Act (symlinked under new names):
+
+- load:     ingest.load_json_files (whole files with json.load)
+- flatten:  corpus.flatten_legal_json over the loaded Acts
+- stream:   corpus.iter_corpus_entries (the incremental parser ingest uses)
+- embed:    the ingest encoder on up to --max-embed clauses, batch EMBED_BATCH_SIZE
+- chroma:   Chroma writes of up to --max-embed clauses with precomputed vectors
+
+Every (scale, stage) runs in a fresh interpreter, so peak RSS is that stage's
+own. Results (wall time, clauses/s, peak and growth of RSS) are compared with a
+stored baseline; the command exits 1 when a stage is slower than the baseline
+by more than --tolerance or uses more memory than --memory-tolerance allows.
+
+    python backend/bench_ingest.py --update-baseline        # record on the CI machine
+    python backend/bench_ingest.py --scales 1 10 100        # gate: exit 1 on regression
+    python backend/bench_ingest.py --stages load flatten stream --scales 1 10
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import queue
+import multiprocessing
+from pathlib import Path
+from typing import Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from config.paths import PROCESSED_DIR
+from backend.corpus import iter_corpus_entries, flatten_legal_json, iter_batches
+from backend.memstats import current_rss_mb, peak_rss_mb
+
+STAGES = ("load", "flatten", "stream", "embed", "chroma")
+DEFAULT_BASELINE = PROJECT_ROOT / "ingest_baseline.json"
+# Memory differences below this are noise (allocator, import order)
+MEMORY_FLOOR_MB = 8.0
+
+
+def replicate_corpus(source: Path, target: Path, copies: int) -> Path:
+    """`copies` replicas of every Act, as symlinks named "<title> rN.json" (distinct document titles)."""
+    target.mkdir(parents=True, exist_ok=True)
+    for f in sorted(source.glob("*.json")):
+        for n in range(copies):
+            link = target / f"{f.stem} r{n}.json"
+            try:
+                link.symlink_to(f.resolve())
+            except OSError:
+                link.write_bytes(f.read_bytes())
+    return target
+
+
+def stage_peak_mb() -> float:
+    """High-water RSS of this interpreter; ru_maxrss would include the parent's, as it survives fork/exec."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def count_clauses(corpus: Path) -> int:
+    return sum(1 for _ in iter_corpus_entries(corpus))
+
+
+def run_stage(stage: str, corpus: str, max_embed: int, model_name: str, dim: int, queue):
+    """Runs in its own interpreter; puts {"wall_s", "clauses", "start_rss_mb", "peak_rss_mb"} on the queue."""
+    corpus = Path(corpus)
+    result = {}
+    try:
+        if stage == "load":
+            from backend.ingest import load_json_files
+            result["start_rss_mb"] = current_rss_mb()
+            started = time.perf_counter()
+            docs = load_json_files(corpus)
+            result["wall_s"] = time.perf_counter() - started
+            result["clauses"] = sum(len(flatten_legal_json(title, js)) for title, js in docs)
+        elif stage == "flatten":
+            from backend.ingest import load_json_files
+            docs = load_json_files(corpus)
+            result["start_rss_mb"] = current_rss_mb()
+            started = time.perf_counter()
+            entries = [entry for title, js in docs for entry in flatten_legal_json(title, js)]
+            result["wall_s"] = time.perf_counter() - started
+            result["clauses"] = len(entries)
+        elif stage == "stream":
+            result["start_rss_mb"] = current_rss_mb()
+            started = time.perf_counter()
+            result["clauses"] = sum(1 for _ in iter_corpus_entries(corpus))
+            result["wall_s"] = time.perf_counter() - started
+        elif stage == "embed":
+            from backend.ingest import get_embeddings_model, EMBED_BATCH_SIZE
+            texts = [e["text"] for _, e in zip(range(max_embed), iter_corpus_entries(corpus))]
+            model = get_embeddings_model(model_name)
+            model.embed_documents(texts[:2])  # first call pays one-off setup
+            result["start_rss_mb"] = current_rss_mb()
+            started = time.perf_counter()
+            for batch in iter_batches(texts, EMBED_BATCH_SIZE):
+                model.embed_documents(batch)
+            result["wall_s"] = time.perf_counter() - started
+            result["clauses"] = len(texts)
+        elif stage == "chroma":
+            import uuid
+            import numpy as np
+            import chromadb
+            from backend.ingest import EMBED_BATCH_SIZE, hnsw_collection_metadata
+            entries = [e for _, e in zip(range(max_embed), iter_corpus_entries(corpus))]
+            vectors = np.random.default_rng(0).standard_normal((len(entries), dim)).astype(np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            with tempfile.TemporaryDirectory(prefix="bench_chroma_") as scratch:
+                collection = chromadb.PersistentClient(path=scratch).create_collection(
+                    "bench", metadata=hnsw_collection_metadata())
+                result["start_rss_mb"] = current_rss_mb()
+                started = time.perf_counter()
+                for start in range(0, len(entries), EMBED_BATCH_SIZE):
+                    batch = entries[start:start + EMBED_BATCH_SIZE]
+                    collection.add(ids=[str(uuid.uuid4()) for _ in batch],
+                                   embeddings=vectors[start:start + len(batch)].tolist(),
+                                   documents=[e["text"] for e in batch],
+                                   metadatas=[e["metadata"] for e in batch])
+                result["wall_s"] = time.perf_counter() - started
+            result["clauses"] = len(entries)
+        result["peak_rss_mb"] = stage_peak_mb()
+    except Exception as e:
+        result = {"error": f"{type(e).__name__}: {e}"}
+    queue.put(result)
+
+
+def run_once(stage: str, corpus: Path, args) -> Dict:
+    """One stage in a fresh interpreter; a child that dies or overruns --timeout is a failed stage."""
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    proc = ctx.Process(target=run_stage, args=(stage, str(corpus), args.max_embed, args.model, args.dim, results))
+    proc.start()
+    deadline = time.monotonic() + args.timeout
+    result = None
+    while result is None:
+        try:
+            result = results.get(timeout=1.0)
+        except queue.Empty:
+            if not proc.is_alive():
+                # OOM-kill, segfault in a native extension...: nothing was (or will be) reported
+                proc.join()
+                return {"error": f"stage process died (exit code {proc.exitcode})"}
+            if time.monotonic() > deadline:
+                proc.kill()
+                proc.join()
+                return {"error": f"timed out after {args.timeout:.0f}s"}
+    proc.join()
+    return result
+
+
+def measure(stage: str, corpus: Path, args) -> Dict:
+    """Best wall time of --repeat fresh-process runs, with the highest peak memory seen."""
+    runs = []
+    for _ in range(args.repeat):
+        result = run_once(stage, corpus, args)
+        if "error" in result:
+            return result
+        runs.append(result)
+    best = min(runs, key=lambda r: r["wall_s"])
+    peak = max(r["peak_rss_mb"] for r in runs)
+    return {
+        "wall_s": round(best["wall_s"], 3),
+        "clauses": best["clauses"],
+        "clauses_per_s": round(best["clauses"] / best["wall_s"], 1) if best["wall_s"] > 0 else 0.0,
+        "peak_rss_mb": peak,
+        "rss_growth_mb": round(max(r["peak_rss_mb"] - r["start_rss_mb"] for r in runs), 1),
+    }
+
+
+def run_benchmarks(args) -> Dict:
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench_corpus_") as scratch:
+        for scale in args.scales:
+            corpus = PROCESSED_DIR if scale == 1 else replicate_corpus(PROCESSED_DIR, Path(scratch) / f"x{scale}", scale)
+            label = f"{scale}x"
+            print(f"\n📚 {label} corpus: {count_clauses(corpus)} clauses")
+            results[label] = {}
+            for stage in args.stages:
+                row = measure(stage, corpus, args)
+                results[label][stage] = row
+                if "error" in row:
+                    print(f"   ❌ {stage:<8} {row['error']}")
+                else:
+                    print(f"   ⏱️  {stage:<8} {row['wall_s']:>9.3f}s {row['clauses_per_s']:>11.1f} clauses/s "
+                          f"peak {row['peak_rss_mb']:>7.1f} MB (+{row['rss_growth_mb']} MB)")
+    return {
+        "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                    "cpus": os.cpu_count()},
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "max_embed": args.max_embed,
+        "model": args.model,
+        "results": results,
+    }
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float, memory_tolerance: float) -> List[str]:
+    """Regressions of the current run against the baseline, as readable lines."""
+    regressions = []
+    if current["machine"] != baseline.get("machine"):
+        print(f"⚠️  Baseline was recorded on {baseline.get('machine')}; timings may not be comparable.")
+    for scale, stages in current["results"].items():
+        for stage, row in stages.items():
+            base = baseline.get("results", {}).get(scale, {}).get(stage)
+            if not base or "error" in base:
+                continue
+            if "error" in row:
+                regressions.append(f"{scale} {stage}: failed ({row['error']})")
+                continue
+            if row["clauses_per_s"] < base["clauses_per_s"] * (1 - tolerance):
+                regressions.append(f"{scale} {stage}: {row['clauses_per_s']} clauses/s vs. baseline "
+                                   f"{base['clauses_per_s']} (-{100 * (1 - row['clauses_per_s'] / base['clauses_per_s']):.0f}%)")
+            allowed = max(base["rss_growth_mb"] * (1 + memory_tolerance), base["rss_growth_mb"] + MEMORY_FLOOR_MB)
+            if row["rss_growth_mb"] > allowed:
+                regressions.append(f"{scale} {stage}: +{row['rss_growth_mb']} MB RSS vs. baseline "
+                                   f"+{base['rss_growth_mb']} MB")
+    return regressions
+
+
+def main():
+    from backend.ingest import EMBEDDING_MODEL
+
+    parser = argparse.ArgumentParser(description="Benchmark ingest stages and gate on regressions.")
+    parser.add_argument("--scales", nargs="+", type=int, default=[1, 10, 100],
+                        help="Corpus sizes as multiples of processeddata/ (default: 1 10 100)")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; the fastest counts (default: 3)")
+    parser.add_argument("--max-embed", type=int, default=2000,
+                        help="Clauses embedded / written to Chroma per scale (default: 2000)")
+    parser.add_argument("--model", default=EMBEDDING_MODEL, help="Encoder for the embed stage")
+    parser.add_argument("--dim", type=int, default=1024, help="Vector size for the chroma stage (default: 1024)")
+    parser.add_argument("--timeout", type=float, default=1800.0,
+                        help="Seconds before a stage run counts as failed (default: 1800)")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed throughput drop vs. the baseline (default: 0.25 = 25%%)")
+    parser.add_argument("--memory-tolerance", type=float, default=0.25,
+                        help="Allowed RSS growth increase vs. the baseline (default: 0.25 = 25%%)")
+    parser.add_argument("--update-baseline", action="store_true", help="Write this run as the new baseline")
+    parser.add_argument("--output", type=Path, default=None, help="Optional path to write the JSON report")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report written to {args.output}")
+
+    failed = [f"{scale} {stage}: {row['error']}" for scale, stages in report["results"].items()
+              for stage, row in stages.items() if "error" in row]
+    if args.update_baseline:
+        if failed:
+            # A failed stage in the baseline would never be compared again
+            print(f"❌ Not writing the baseline, {len(failed)} stage(s) failed:")
+            for line in failed:
+                print(f"   - {line}")
+            return 1
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Baseline written to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print(f"⚠️  No baseline at {args.baseline}; record one with --update-baseline.")
+        return 0
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(report, baseline, args.tolerance, args.memory_tolerance)
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) against {args.baseline}:")
+        for line in regressions:
+            print(f"   - {line}")
+        return 1
+    print(f"\n✅ No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""
+Benchmark the Chroma and NumPy retrieval backends on recall and latency.
+
+Ground truth is an exact float32 search over the embeddings stored in Chroma;
+results from both backends are matched on clause identity (document, part,
+article, clause), so the two indexes must be built with the same embedding model.
+
+    python backend/benchmark_retrieval.py --k 8 --repeat 5
+"""
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from config.paths import VECTORSTORE_DIR, NUMPY_INDEX_DIR, EVAL_PATH
+from backend.vector_engine import NumpyVectorIndex, clause_key
+from backend.memstats import peak_rss_mb
+
+COLLECTION_NAME = "legal_docs"
+
+# Used when the evaluation dataset is not available locally
+SAMPLE_QUERIES = [
+    "What fundamental rights are guaranteed by the Constitution of Nepal?",
+    "What is the minimum age for a child to be held criminally liable?",
+    "What is the maximum penalty for libel under the Penal Code?",
+    "What are the rights of workers regarding overtime pay in Nepal?",
+    "Within how many hours must an arrested person be produced before a judicial authority?",
+    "How is a heinous offence defined in Nepal's criminal law?",
+    "What is the purpose of the Victim Protection Fund?",
+    "Who may be appointed as a Probation Officer or Parole Officer?",
+    "What are the provisions relating to advance tax and withholding tax?",
+    "Is gambling legal in Nepal?",
+]
+
+
+def load_queries(limit: int) -> List[str]:
+    """Queries from the evaluation dataset, falling back to a built-in sample."""
+    if EVAL_PATH.exists():
+        with open(EVAL_PATH, "r", encoding="utf-8") as f:
+            queries = [item.get("query", "") for item in json.load(f) if item.get("query")]
+        if queries:
+            return queries[:limit]
+    print(f"⚠️  Evaluation dataset not found at {EVAL_PATH}, using built-in sample queries.")
+    return SAMPLE_QUERIES[:limit]
+
+
+def recall_at_k(retrieved: List[str], relevant: List[str]) -> float:
+    if not relevant:
+        return 0.0
+    return len(set(retrieved) & set(relevant)) / len(relevant)
+
+
+def percentile_ms(samples: List[float], pct: float) -> float:
+    return round(float(np.percentile(samples, pct)) * 1000, 3) if samples else 0.0
+
+
+def dir_size_mb(path: Path) -> float:
+    return round(sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file()) / 1024 / 1024, 2)
+
+
+def exact_ground_truth(collection, query_embs: np.ndarray, k: int) -> List[List[str]]:
+    """Brute-force float32 top-k over every embedding stored in Chroma."""
+    stored = collection.get(include=["embeddings", "metadatas"])
+    matrix = np.asarray(stored["embeddings"], dtype=np.float32)
+    keys = [clause_key(m) for m in stored["metadatas"]]
+    scores = query_embs @ matrix.T
+    top = np.argsort(-scores, axis=1)[:, :k]
+    return [[keys[i] for i in row] for row in top]
+
+
+def benchmark(k: int, repeat: int, n_queries: int) -> Dict:
+    import chromadb
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    index = NumpyVectorIndex(NUMPY_INDEX_DIR)
+    collection = chromadb.PersistentClient(path=str(VECTORSTORE_DIR)).get_collection(name=COLLECTION_NAME)
+
+    print(f"🔄 Encoding queries with {index.embedding_model}...")
+    model = HuggingFaceEmbeddings(
+        model_name=index.embedding_model,
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'normalize_embeddings': True}
+    )
+    queries = load_queries(n_queries)
+    query_embs = np.asarray(model.embed_documents(queries), dtype=np.float32)
+
+    truth = exact_ground_truth(collection, query_embs, k)
+
+    chroma_times, numpy_times = [], []
+    chroma_recall, numpy_recall = [], []
+    for qi, emb in enumerate(query_embs):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            res = collection.query(query_embeddings=[emb.tolist()], n_results=k)
+            chroma_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            hits = index.search(emb, k)
+            numpy_times.append(time.perf_counter() - start)
+
+        chroma_recall.append(recall_at_k([clause_key(m) for m in res["metadatas"][0]], truth[qi]))
+        numpy_recall.append(recall_at_k([clause_key(h["metadata"]) for h in hits], truth[qi]))
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        index.search_batch(query_embs, k)
+    batch_total = (time.perf_counter() - start) / repeat
+
+    return {
+        "k": k,
+        "queries": len(queries),
+        "rows": index.size,
+        "numpy_compression": index.compression.label(),
+        "chroma": {
+            "recall_at_k": round(float(np.mean(chroma_recall)), 4),
+            "p50_ms": percentile_ms(chroma_times, 50),
+            "p95_ms": percentile_ms(chroma_times, 95),
+            "disk_mb": dir_size_mb(VECTORSTORE_DIR),
+        },
+        "numpy": {
+            "recall_at_k": round(float(np.mean(numpy_recall)), 4),
+            "p50_ms": percentile_ms(numpy_times, 50),
+            "p95_ms": percentile_ms(numpy_times, 95),
+            "batched_ms_per_query": round(batch_total / len(queries) * 1000, 3),
+            "disk_mb": dir_size_mb(NUMPY_INDEX_DIR),
+        },
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Chroma and NumPy retrieval backends.")
+    parser.add_argument("--k", type=int, default=8, help="Top-k to retrieve (default: 8)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed repetitions per query (default: 5)")
+    parser.add_argument("--queries", type=int, default=100, help="Maximum number of eval queries (default: 100)")
+    parser.add_argument("--output", type=Path, default=None, help="Optional path to write the JSON report")
+    args = parser.parse_args()
+
+    report = benchmark(args.k, args.repeat, args.queries)
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Small in-process caches shared by the /chat pipeline.
+"""
+import re
+import time
+import threading
+from itertools import islice
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from backend.memstats import deep_sizeof
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Cache key form of a user query: case- and whitespace-insensitive."""
+    return _WHITESPACE_RE.sub(" ", query.strip().lower())
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 3600.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def trim(self, fraction: float = 0.5) -> int:
+        """Drop the least recently used `fraction` of the entries; returns how many were dropped."""
+        with self._lock:
+            drop = int(len(self._data) * fraction + 0.5)
+            for _ in range(drop):
+                self._data.popitem(last=False)
+        return drop
+
+    def approx_bytes(self, sample: int = 32) -> int:
+        """Mean deep size of the `sample` most recent entries times the number of entries."""
+        with self._lock:
+            count = len(self._data)
+            recent = list(islice(reversed(self._data.items()), sample))
+        if not recent:
+            return 0
+        return int(sum(deep_sizeof(item) for item in recent) / len(recent) * count)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_s": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,335 @@
+"""
+Direct lookup of explicitly cited provisions ("Section 47(2) of the Labour Act",
+"Article 17 Constitution") without classification, embedding or vector search.
+
+`ProvisionIndex` is built once from the processed JSONs (a few thousand
+clauses, well under a second) as {Act: {article: clauses}} plus an alias table
+of Act names: the title without its year or "The", "(Code)" variants, spelling
+variants (labour/labor, offence/offense) and common names ("Muluki Penal
+Code"). Years are accepted in Bikram Sambat or the Gregorian equivalent
+(2074 BS ~ 2017/2018 AD). A citation is unambiguous when it names exactly one
+Act (or uses "Article" alone, the Constitution's numbering) and the article
+exists; only then does /chat skip the rewrite and retrieval.
+
+    python backend/citations.py "Section 47 of the Labour Act 2017"
+"""
+import re
+import sys
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from backend.corpus import iter_corpus_entries
+
+CONSTITUTION = "constitution"
+# Bikram Sambat runs 56-57 years ahead of the Gregorian calendar
+BS_AD_OFFSETS = (57, 56)
+# Names that cannot be derived from the titles
+EXTRA_ALIASES = {
+    "constitution": ["constitution", "nepal constitution", "sambidhan", "samvidhan"],
+    "penal": ["muluki penal code", "muluki criminal code", "criminal code", "penal code"],
+    "civil": ["muluki civil code", "muluki ain", "civil code"],
+    "bank and financial institution": ["bafia", "bank and financial institutions act"],
+    "electronic commerce": ["e-commerce act", "ecommerce act", "e commerce act"],
+}
+SPELLING_VARIANTS = [("labour", "labor"), ("offences", "offenses"), ("offence", "offense")]
+# Largest number of clauses returned for one cited article in /chat
+MAX_CITED_CLAUSES = 24
+
+_YEAR_RE = re.compile(r"\b(1[89]\d\d|20\d\d)\b")
+_PROVISION_RE = re.compile(
+    r"\b(?P<kind>articles?|art\.|sections?|sec\.|s\.|rule)\s*(?P<num>\d{1,3}[a-z]?)\b"
+    r"(?P<sub>(?:\s*\(\s*[0-9a-z]{1,4}\s*\))*)"
+)
+_NESTED_RE = re.compile(
+    r"\b(?:sub-?section|sub-?clause|clause)\s*\(?\s*(?P<sub>[0-9a-z]{1,4})\s*\)?\s+of\s+"
+    r"(?P<kind>articles?|art\.|sections?|sec\.)\s*(?P<num>\d{1,3}[a-z]?)\b"
+)
+_PART_RE = re.compile(r"\b(?P<kind>part|chapter)\s*-?\s*(?P<num>\d{1,2})\b")
+_MARKER_RE = re.compile(r"^\s*\(\s*([0-9a-z]{1,4})\s*\)", re.IGNORECASE)
+
+
+def provision_unit(document_title: str) -> str:
+    """The Constitution is divided into Articles, the Acts into Sections."""
+    return "Article" if CONSTITUTION in (document_title or "").lower() else "Section"
+
+
+def article_key(article_number) -> str:
+    """'47.' -> '47', '47A.126' -> '47a' (trailing page numbers from extraction are dropped)."""
+    match = re.match(r"\s*(\d+[A-Za-z]?)", str(article_number or ""))
+    return match.group(1).lower() if match else ""
+
+
+def part_key(part_number) -> str:
+    match = re.search(r"(\d+)", str(part_number or ""))
+    return match.group(1) if match else ""
+
+
+def clause_marker(text: str) -> str:
+    match = _MARKER_RE.match(text or "")
+    return match.group(1).lower() if match else ""
+
+
+def _normalize(text: str) -> str:
+    text = text.lower().replace("(code)", "code")
+    text = re.sub(r"[^a-z0-9\-]+", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def year_variants(title: str) -> set:
+    years = {int(y) for y in _YEAR_RE.findall(title)}
+    return {str(y) for y in years} | {str(y - off) for y in years if y > 2030 for off in BS_AD_OFFSETS}
+
+
+def title_aliases(title: str) -> set:
+    """Ways people write an Act's name, all normalized."""
+    base = _normalize(_YEAR_RE.sub(" ", title))
+    base = re.sub(r"^the ", "", base)
+    names = {base}
+    if base.startswith("national "):
+        names.add(base[len("national "):])
+    for name in list(names):
+        if name.endswith(" code act"):
+            names.add(name[:-len(" act")])           # "national penal code"
+            names.add(name.replace(" code act", " act"))  # "penal act"
+    for name in list(names):
+        for a, b in SPELLING_VARIANTS:
+            if a in name:
+                names.add(name.replace(a, b))
+    for key, extra in EXTRA_ALIASES.items():
+        if key in base:
+            names.update(_normalize(e) for e in extra)
+    return {n for n in names if n}
+
+
+class Citation:
+    def __init__(self, kind: str, article: str, markers: Tuple[str, ...] = (), part: str = ""):
+        self.kind = kind              # "article" / "section" / "rule"
+        self.article = article        # normalized article key
+        self.markers = markers        # sub-section / clause markers, outermost first
+        self.part = part
+
+    def label(self) -> str:
+        return f"{self.kind.title()} {self.article.upper()}" + "".join(f"({m})" for m in self.markers)
+
+
+class Resolution:
+    """Outcome of resolving a query: the Act, the citations and the exact clauses."""
+
+    def __init__(self, document: Optional[str], citations: List[Citation], sources: List[Dict],
+                 ambiguous: bool, reason: str = "", candidates: Optional[List[str]] = None):
+        self.document = document
+        self.citations = citations
+        self.sources = sources
+        self.ambiguous = ambiguous
+        self.reason = reason
+        self.candidates = candidates or []
+
+    @property
+    def resolved(self) -> bool:
+        return bool(self.sources) and not self.ambiguous
+
+    def label(self) -> str:
+        cited = ", ".join(c.label() for c in self.citations)
+        return f"{self.document}, {cited}" if self.document else cited
+
+    def to_dict(self) -> Dict:
+        return {
+            "document_title": self.document,
+            "citations": [c.label() for c in self.citations],
+            "resolved": self.resolved,
+            "ambiguous": self.ambiguous,
+            "reason": self.reason,
+            "candidates": self.candidates,
+        }
+
+
+class ActMatcher:
+    """Act titles named in free text, matched through their aliases (also used to route shard searches)."""
+
+    def __init__(self, titles):
+        aliases = {}
+        for title in titles:
+            for alias in title_aliases(title):
+                aliases.setdefault(alias, set()).add(title)
+        # Longest first so "national penal code act" wins over "penal code"
+        self._patterns = [
+            (re.compile(r"\b" + re.escape(alias).replace(r"\ ", r"\s+") + r"\b"), titles)
+            for alias, titles in sorted(aliases.items(), key=lambda kv: -len(kv[0]))
+        ]
+
+    def __len__(self) -> int:
+        return len(self._patterns)
+
+    def find(self, text: str) -> List[str]:
+        """Acts named in the text, without overlapping matches."""
+        normalized = _normalize(text)
+        taken, found = [], []
+        for pattern, titles in self._patterns:
+            for match in pattern.finditer(normalized):
+                if any(match.start() < end and start < match.end() for start, end in taken):
+                    continue
+                taken.append(match.span())
+                for title in sorted(titles):
+                    if title not in found:
+                        found.append(title)
+        return found
+
+
+class ProvisionIndex:
+    def __init__(self):
+        # Act -> article key -> {"article_number", "article_title", "part_number", "part_title", "clauses"}
+        self.documents: Dict[str, "OrderedDict[str, Dict]"] = {}
+        self.years: Dict[str, set] = {}
+        self._matcher = ActMatcher([])
+
+    @classmethod
+    def build(cls, processed_dir: Path, source_fn=None) -> "ProvisionIndex":
+        """`source_fn(text, metadata)` shapes each clause (defaults to text + metadata)."""
+        index = cls()
+        for entry in iter_corpus_entries(processed_dir):
+            meta = entry["metadata"]
+            if meta.get("section") != "Clause":
+                continue
+            key = article_key(meta.get("article_number"))
+            if not key:
+                continue
+            articles = index.documents.setdefault(meta["document_title"], OrderedDict())
+            article = articles.setdefault(key, {
+                "article_number": meta.get("article_number", ""),
+                "article_title": meta.get("article_title", ""),
+                "part_number": meta.get("part_number", ""),
+                "part_title": meta.get("part_title", ""),
+                "clauses": [],
+            })
+            article["clauses"].append(source_fn(entry["text"], meta) if source_fn else
+                                      {"text": entry["text"], **meta})
+        index._build_aliases()
+        return index
+
+    def _build_aliases(self):
+        for title in self.documents:
+            self.years[title] = year_variants(title)
+        self._matcher = ActMatcher(self.documents)
+
+    @property
+    def clause_count(self) -> int:
+        return sum(len(a["clauses"]) for arts in self.documents.values() for a in arts.values())
+
+    def constitution(self) -> Optional[str]:
+        return next((t for t in self.documents if CONSTITUTION in t.lower()), None)
+
+    def find_documents(self, text: str) -> List[str]:
+        """Acts named in the text, without overlapping matches."""
+        return self._matcher.find(text)
+
+    def parse_citations(self, text: str) -> List[Citation]:
+        lowered = text.lower()
+        citations, seen = [], set()
+        part_match = _PART_RE.search(lowered)
+        part = part_match.group("num") if part_match else ""
+        for match in _NESTED_RE.finditer(lowered):
+            kind = "article" if match.group("kind").startswith("art") else "section"
+            citation = Citation(kind, match.group("num"), (match.group("sub"),), part)
+            seen.add((citation.article, citation.markers))
+            citations.append(citation)
+        for match in _PROVISION_RE.finditer(lowered):
+            kind = match.group("kind")
+            kind = "article" if kind.startswith("art") else "rule" if kind == "rule" else "section"
+            markers = tuple(re.findall(r"\(\s*([0-9a-z]{1,4})\s*\)", match.group("sub")))
+            if any(article == match.group("num") for article, _ in seen):
+                continue  # already covered by "clause (x) of section N"
+            seen.add((match.group("num"), markers))
+            citations.append(Citation(kind, match.group("num"), markers, part))
+        return citations
+
+    def clauses_for(self, document: str, citation: Citation) -> List[Dict]:
+        article = self.documents.get(document, {}).get(citation.article)
+        if article is None:
+            return []
+        clauses = article["clauses"]
+        for marker in citation.markers:
+            narrowed = self._narrow(clauses, marker)
+            if not narrowed:
+                break
+            clauses = narrowed
+        return clauses
+
+    @staticmethod
+    def _narrow(clauses: List[Dict], marker: str) -> List[Dict]:
+        """The clause starting with "(marker)" plus its sub-items, up to the next sibling."""
+        numeric = marker.isdigit()
+        if numeric and not any(clause_marker(c["text"]) for c in clauses):
+            # Unmarked sub-clauses (e.g. the Constitution's): one per entry, in order
+            return [c for c in clauses if str(c.get("clause_index")) == marker]
+        for i, clause in enumerate(clauses):
+            if clause_marker(clause["text"]) != marker:
+                continue
+            group = [clause]
+            for following in clauses[i + 1:]:
+                next_marker = clause_marker(following["text"])
+                if next_marker and next_marker.isdigit() == numeric:
+                    break
+                group.append(following)
+            return group
+        return []
+
+    def resolve(self, text: str) -> Resolution:
+        citations = self.parse_citations(text)
+        if not citations:
+            return Resolution(None, [], [], ambiguous=False, reason="no citation")
+
+        documents = self.find_documents(text)
+        if not documents and all(c.kind == "article" for c in citations) and self.constitution():
+            # Nepali Acts number "sections"; "Article N" on its own means the Constitution
+            documents = [self.constitution()]
+        if len(documents) != 1:
+            reason = "no Act named" if not documents else "several Acts named"
+            return Resolution(None, citations, [], ambiguous=True, reason=reason, candidates=documents)
+        document = documents[0]
+
+        mentioned_years = set(_YEAR_RE.findall(text))
+        if mentioned_years and not mentioned_years & self.years.get(document, set()):
+            return Resolution(document, citations, [], ambiguous=True,
+                              reason=f"year {', '.join(sorted(mentioned_years))} does not match {document}")
+
+        sources, missing = [], []
+        for citation in citations:
+            clauses = self.clauses_for(document, citation)
+            if not clauses:
+                missing.append(citation.label())
+            sources.extend(clauses)
+        if missing:
+            return Resolution(document, citations, sources, ambiguous=True,
+                              reason=f"not found in {document}: {', '.join(missing)}")
+        return Resolution(document, citations, sources, ambiguous=False)
+
+    def lookup(self, document: str, article: str, clause: str = "") -> Resolution:
+        """Structured lookup: an Act (title or alias), an article/section number and optional marker."""
+        documents = [document] if document in self.documents else self.find_documents(document)
+        if len(documents) != 1:
+            return Resolution(None, [], [], ambiguous=True,
+                              reason="unknown Act" if not documents else "several Acts match",
+                              candidates=documents)
+        citation = Citation("article" if CONSTITUTION in documents[0].lower() else "section",
+                            article_key(article), tuple(re.findall(r"[0-9a-z]{1,4}", clause.lower())))
+        sources = self.clauses_for(documents[0], citation)
+        return Resolution(documents[0], [citation], sources, ambiguous=not sources,
+                          reason="" if sources else f"not found in {documents[0]}: {citation.label()}")
+
+    def stats(self) -> Dict:
+        return {"documents": len(self.documents), "clauses": self.clause_count,
+                "aliases": len(self._matcher)}
+
+
+if __name__ == "__main__":
+    from config.paths import PROCESSED_DIR
+    index = ProvisionIndex.build(PROCESSED_DIR)
+    print(f"📚 {index.stats()}")
+    for query in sys.argv[1:]:
+        resolution = index.resolve(query)
+        print(f"🔎 {query!r}: {resolution.to_dict()}")
+        for source in resolution.sources[:10]:
+            print(f"   • {source.get('article_number')} {source['text'][:100]}")
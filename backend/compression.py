@@ -0,0 +1,187 @@
+"""
+Embedding compression for the NumPy vector engine.
+
+Two independent stages, both recorded in the index manifest so queries are
+decoded exactly the way the stored vectors were encoded:
+
+1. Dimensionality reduction
+   - "pca":      project onto the top principal components of the corpus
+   - "truncate": keep the leading dimensions (Matryoshka-style models)
+2. Quantisation
+   - "float32" / "float16": plain matrices
+   - "int8": symmetric per-row scalar quantisation (4x smaller than float32)
+   - "pq":   product quantisation, uint8 code per sub-vector; the top candidates
+             are optionally re-scored exactly against a float16 copy on disk
+"""
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+QUANTIZATIONS = ("float32", "float16", "int8", "pq")
+REDUCTIONS = ("none", "pca", "truncate")
+
+PQ_CENTROIDS = 256
+PQ_TRAIN_ITERATIONS = 20
+TRAIN_SAMPLE_ROWS = 20000
+
+
+class CompressionSettings:
+    """How vectors are reduced and quantised; serialised into manifest.json."""
+
+    def __init__(self, quantization: str = "float16", reduction: str = "none",
+                 dim: Optional[int] = None, pq_subvectors: int = 64,
+                 rescore_candidates: int = 0):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unsupported quantization '{quantization}', expected one of {QUANTIZATIONS}")
+        if reduction not in REDUCTIONS:
+            raise ValueError(f"Unsupported reduction '{reduction}', expected one of {REDUCTIONS}")
+        if reduction != "none" and not dim:
+            raise ValueError(f"Reduction '{reduction}' requires a target dimension.")
+        self.quantization = quantization
+        self.reduction = reduction
+        self.dim = dim
+        self.pq_subvectors = pq_subvectors
+        self.rescore_candidates = rescore_candidates
+
+    def to_dict(self) -> Dict:
+        return {
+            "quantization": self.quantization,
+            "reduction": self.reduction,
+            "dim": self.dim,
+            "pq_subvectors": self.pq_subvectors if self.quantization == "pq" else None,
+            "rescore_candidates": self.rescore_candidates,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "CompressionSettings":
+        return cls(
+            quantization=data.get("quantization", "float16"),
+            reduction=data.get("reduction", "none"),
+            dim=data.get("dim"),
+            pq_subvectors=data.get("pq_subvectors") or 64,
+            rescore_candidates=data.get("rescore_candidates") or 0,
+        )
+
+    def label(self) -> str:
+        parts = [self.quantization]
+        if self.quantization == "pq":
+            parts[0] = f"pq{self.pq_subvectors}"
+        if self.reduction != "none":
+            parts.append(f"{self.reduction}{self.dim}")
+        if self.rescore_candidates:
+            parts.append(f"rescore{self.rescore_candidates}")
+        return "-".join(parts)
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def training_sample(vectors: np.ndarray, max_rows: int = TRAIN_SAMPLE_ROWS, seed: int = 0) -> np.ndarray:
+    if len(vectors) <= max_rows:
+        return np.asarray(vectors, dtype=np.float32)
+    rows = np.sort(np.random.default_rng(seed).choice(len(vectors), max_rows, replace=False))
+    return np.asarray(vectors[rows], dtype=np.float32)
+
+
+# ---------- Dimensionality reduction ----------
+
+def fit_pca(vectors: np.ndarray, dim: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (mean, components) with components shaped (dim, original_dim)."""
+    sample = training_sample(vectors)
+    if dim > sample.shape[1]:
+        raise ValueError(f"PCA dimension {dim} exceeds vector dimension {sample.shape[1]}")
+    mean = sample.mean(axis=0)
+    centered = sample - mean
+    cov = centered.T @ centered / max(len(centered) - 1, 1)
+    eigvals, eigvecs = np.linalg.eigh(cov)
+    order = np.argsort(eigvals)[::-1][:dim]
+    return mean.astype(np.float32), eigvecs[:, order].T.astype(np.float32)
+
+
+def reduce_vectors(vectors: np.ndarray, settings: CompressionSettings,
+                   pca: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> np.ndarray:
+    """Apply the configured reduction and re-normalise so dot product stays cosine."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if settings.reduction == "none":
+        return vectors
+    if settings.reduction == "truncate":
+        return normalize_rows(vectors[:, :settings.dim])
+    mean, components = pca
+    return normalize_rows((vectors - mean) @ components.T)
+
+
+# ---------- Scalar quantisation ----------
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row int8 quantisation. Returns (codes, scales)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+# ---------- Product quantisation ----------
+
+def _kmeans(points: np.ndarray, n_centroids: int, iterations: int, rng) -> np.ndarray:
+    centroids = points[rng.choice(len(points), n_centroids, replace=False)].copy()
+    for _ in range(iterations):
+        dists = (points ** 2).sum(1)[:, None] - 2 * points @ centroids.T + (centroids ** 2).sum(1)[None, :]
+        assign = dists.argmin(axis=1)
+        counts = np.bincount(assign, minlength=n_centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, points)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Re-seed empty clusters from random points so every code stays usable
+        if not filled.all():
+            centroids[~filled] = points[rng.choice(len(points), int((~filled).sum()))]
+    return centroids
+
+
+def train_pq(vectors: np.ndarray, subvectors: int, seed: int = 0) -> np.ndarray:
+    """Train one k-means codebook per sub-space. Returns (subvectors, centroids, sub_dim)."""
+    sample = training_sample(vectors, seed=seed)
+    dim = sample.shape[1]
+    if dim % subvectors:
+        raise ValueError(f"Dimension {dim} is not divisible by {subvectors} PQ sub-vectors")
+    sub_dim = dim // subvectors
+    n_centroids = min(PQ_CENTROIDS, len(sample))
+    rng = np.random.default_rng(seed)
+
+    codebooks = np.empty((subvectors, n_centroids, sub_dim), dtype=np.float32)
+    for j in range(subvectors):
+        chunk = sample[:, j * sub_dim:(j + 1) * sub_dim]
+        codebooks[j] = _kmeans(chunk, n_centroids, PQ_TRAIN_ITERATIONS, rng)
+    return codebooks
+
+
+def encode_pq(vectors: np.ndarray, codebooks: np.ndarray) -> np.ndarray:
+    """Nearest-centroid code per sub-vector, shaped (rows, subvectors) uint8."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    subvectors, _, sub_dim = codebooks.shape
+    codes = np.empty((len(vectors), subvectors), dtype=np.uint8)
+    for j in range(subvectors):
+        chunk = vectors[:, j * sub_dim:(j + 1) * sub_dim]
+        book = codebooks[j]
+        dists = -2 * chunk @ book.T + (book ** 2).sum(1)[None, :]
+        codes[:, j] = dists.argmin(axis=1)
+    return codes
+
+
+def pq_lookup_tables(queries: np.ndarray, codebooks: np.ndarray) -> np.ndarray:
+    """Inner products of each query sub-vector with every centroid: (queries, subvectors, centroids)."""
+    subvectors, _, sub_dim = codebooks.shape
+    q = queries.reshape(len(queries), subvectors, sub_dim)
+    return np.einsum("qjd,jcd->qjc", q, codebooks)
+
+
+def pq_scores(tables: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    """Asymmetric distance computation: approximate inner products (queries, rows)."""
+    scores = np.zeros((tables.shape[0], len(codes)), dtype=np.float32)
+    for j in range(codes.shape[1]):
+        scores += tables[:, j, :][:, codes[:, j]]
+    return scores
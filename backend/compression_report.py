@@ -0,0 +1,136 @@
+"""
+Report memory saved vs. recall@k lost for each embedding compression setting.
+
+Source vectors come from an existing uncompressed (float32/float16, no
+reduction) NumPy index, so the corpus is embedded only once. Every setting is
+built into a scratch directory and compared against exact float32 search on
+the evaluation queries.
+
+    python backend/ingest.py --backend numpy --dtype float32
+    python backend/compression_report.py --k 8
+"""
+import sys
+import json
+import time
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from config.paths import NUMPY_INDEX_DIR
+from backend.compression import CompressionSettings
+from backend.vector_engine import NumpyVectorIndex, write_numpy_index
+from backend.benchmark_retrieval import load_queries, recall_at_k, percentile_ms, dir_size_mb
+
+
+def default_settings(dim: int) -> List[CompressionSettings]:
+    settings = [
+        CompressionSettings("float32"),
+        CompressionSettings("float16"),
+        CompressionSettings("int8"),
+    ]
+    for subvectors in (64, 32):
+        if dim % subvectors == 0:
+            settings.append(CompressionSettings("pq", pq_subvectors=subvectors))
+            settings.append(CompressionSettings("pq", pq_subvectors=subvectors, rescore_candidates=64))
+    half = dim // 2
+    if half >= 64:
+        settings.append(CompressionSettings("int8", reduction="pca", dim=half))
+        settings.append(CompressionSettings("float16", reduction="truncate", dim=half))
+    return settings
+
+
+def evaluate_setting(settings: CompressionSettings, vectors: np.ndarray, records: List[Dict],
+                     query_embs: np.ndarray, truth: np.ndarray, k: int, model_name: str) -> Dict:
+    with tempfile.TemporaryDirectory(prefix="compression_") as scratch:
+        start = time.perf_counter()
+        write_numpy_index(Path(scratch), vectors, records, compression=settings, embedding_model=model_name)
+        build_s = time.perf_counter() - start
+
+        index = NumpyVectorIndex(Path(scratch))
+        latencies, recalls = [], []
+        for qi, emb in enumerate(query_embs):
+            start = time.perf_counter()
+            row_ids, _ = index.top_k_indices(emb, k)
+            latencies.append(time.perf_counter() - start)
+            recalls.append(recall_at_k(row_ids[0].tolist(), truth[qi].tolist()))
+
+        footprint = index.footprint()
+        return {
+            "setting": settings.label(),
+            "compression": settings.to_dict(),
+            "build_s": round(build_s, 3),
+            "disk_mb": dir_size_mb(Path(scratch)),
+            "scanned_mb": round(footprint["scanned_bytes"] / 1024 / 1024, 3),
+            "rescore_mb": round(footprint["rescore_bytes"] / 1024 / 1024, 3),
+            "recall_at_k": round(float(np.mean(recalls)), 4),
+            "p50_ms": percentile_ms(latencies, 50),
+        }
+
+
+def build_report(source_dir: Path, k: int, n_queries: int) -> Dict:
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    source = NumpyVectorIndex(source_dir)
+    if source.compression.quantization not in ("float32", "float16") or source.compression.reduction != "none":
+        raise ValueError(f"Source index must be uncompressed float32/float16, got {source.compression.label()}")
+
+    vectors = np.asarray(source.vectors, dtype=np.float32)
+    model = HuggingFaceEmbeddings(
+        model_name=source.embedding_model,
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'normalize_embeddings': True}
+    )
+    queries = load_queries(n_queries)
+    query_embs = np.asarray(model.embed_documents(queries), dtype=np.float32)
+    truth = np.argsort(-(query_embs @ vectors.T), axis=1)[:, :k]
+
+    baseline_mb = vectors.shape[0] * vectors.shape[1] * 4 / 1024 / 1024
+    rows = []
+    for settings in default_settings(vectors.shape[1]):
+        print(f"🔄 Evaluating {settings.label()}...")
+        row = evaluate_setting(settings, vectors, source.records, query_embs, truth, k, source.embedding_model)
+        row["memory_saved_pct"] = round(100 * (1 - row["scanned_mb"] / baseline_mb), 1)
+        row["recall_lost"] = round(1.0 - row["recall_at_k"], 4)
+        rows.append(row)
+
+    return {
+        "k": k,
+        "queries": len(queries),
+        "rows": int(vectors.shape[0]),
+        "dim": int(vectors.shape[1]),
+        "float32_baseline_mb": round(baseline_mb, 3),
+        "settings": rows,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory vs. recall report for embedding compression.")
+    parser.add_argument("--source", type=Path, default=NUMPY_INDEX_DIR,
+                        help="Uncompressed NumPy index providing the source vectors")
+    parser.add_argument("--k", type=int, default=8, help="Top-k for recall (default: 8)")
+    parser.add_argument("--queries", type=int, default=100, help="Maximum number of eval queries (default: 100)")
+    parser.add_argument("--output", type=Path, default=None, help="Optional path to write the JSON report")
+    args = parser.parse_args()
+
+    report = build_report(args.source, args.k, args.queries)
+
+    print(f"\n📊 Compression report (float32 baseline {report['float32_baseline_mb']} MB, recall@{args.k})")
+    print(f"{'setting':<28}{'scanned MB':>12}{'disk MB':>10}{'saved %':>10}{'recall':>9}{'p50 ms':>9}")
+    for row in report["settings"]:
+        print(f"{row['setting']:<28}{row['scanned_mb']:>12}{row['disk_mb']:>10}"
+              f"{row['memory_saved_pct']:>10}{row['recall_at_k']:>9}{row['p50_ms']:>9}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
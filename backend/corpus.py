@@ -0,0 +1,184 @@
+"""
+Streaming access to the processed legal JSON corpus.
+
+The processed Acts are single JSON objects whose bulk lives in the "parts"
+array. Instead of `json.load`-ing whole files, `iter_legal_json` walks the
+top-level object incrementally and decodes one part at a time, so memory is
+bounded by the largest part rather than the whole corpus.
+"""
+import json
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+READ_CHUNK_SIZE = 64 * 1024
+_WHITESPACE = " \t\n\r"
+
+
+class _JsonStream:
+    """Minimal pull tokenizer over a text file, built on JSONDecoder.raw_decode."""
+
+    def __init__(self, fp, chunk_size: int = READ_CHUNK_SIZE):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.fp.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop the consumed prefix so the buffer only holds unread text
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' but found '{found or 'EOF'}'")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number ending exactly at the buffer edge may be truncated
+            if end == len(self.buf) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+
+def iter_top_level(path: Path, stream_key: str = "parts") -> Iterator[Tuple[str, object]]:
+    """
+    Yield (key, value) pairs of a top-level JSON object.
+    Items of the `stream_key` array are yielded one by one as (stream_key, item).
+    """
+    with open(path, "r", encoding="utf-8") as fp:
+        stream = _JsonStream(fp)
+        stream.expect("{")
+        if stream.peek() == "}":
+            return
+        while True:
+            key = stream.value()
+            stream.expect(":")
+            if key == stream_key and stream.peek() == "[":
+                stream.expect("[")
+                if stream.peek() != "]":
+                    while True:
+                        yield key, stream.value()
+                        if stream.peek() == ",":
+                            stream.expect(",")
+                            continue
+                        break
+                stream.expect("]")
+            else:
+                yield key, stream.value()
+
+            if stream.peek() == ",":
+                stream.expect(",")
+                continue
+            stream.expect("}")
+            return
+
+
+def preamble_entry(doc_title: str, preamble: str) -> Dict:
+    return {
+        "text": preamble.strip(),
+        "metadata": {
+            "document_title": doc_title,
+            "section": "Preamble"
+        }
+    }
+
+
+def flatten_part(doc_title: str, part: Dict) -> Iterator[Dict]:
+    """Each clause of a part becomes an entry with part/article metadata."""
+    pnum = part.get("part_number", "")
+    ptitle = part.get("part_title", "")
+    for article in part.get("articles", []):
+        anum = article.get("article_number", "")
+        atitle = article.get("article_title", "")
+        clauses = article.get("clauses", [])
+
+        for idx, clause in enumerate(clauses, start=1):
+            yield {
+                "text": clause.strip(),
+                "metadata": {
+                    "document_title": doc_title,
+                    "part_number": pnum,
+                    "part_title": ptitle,
+                    "article_number": anum,
+                    "article_title": atitle,
+                    "clause_index": idx,
+                    "section": "Clause"
+                }
+            }
+
+
+def flatten_legal_json(doc_title: str, js: Dict) -> List[Dict]:
+    """
+    Flatten legal JSON structure into distinct chunks for vector search.
+    """
+    entries = []
+
+    # Preamble
+    if js.get("preamble"):
+        entries.append(preamble_entry(doc_title, js["preamble"]))
+
+    # Parts and Articles
+    for part in js.get("parts", []):
+        entries.extend(flatten_part(doc_title, part))
+    return entries
+
+
+def iter_legal_json(doc_title: str, path: Path) -> Iterator[Dict]:
+    """Streaming equivalent of flatten_legal_json(doc_title, json.load(path))."""
+    for key, value in iter_top_level(path):
+        if key == "preamble" and value:
+            yield preamble_entry(doc_title, value)
+        elif key == "parts" and isinstance(value, dict):
+            yield from flatten_part(doc_title, value)
+
+
+def iter_corpus_entries(folder: Path) -> Iterator[Dict]:
+    """Yield clause entries for every JSON in the folder, one file at a time."""
+    folder = Path(folder)
+    if not folder.exists():
+        print(f"⚠️  Processed data directory not found: {folder}")
+        return
+    for f in sorted(folder.glob("*.json")):
+        try:
+            yield from iter_legal_json(f.stem, f)
+        except (ValueError, json.JSONDecodeError) as e:
+            print(f"⚠️  Failed to load {f.name}: {e}")
+
+
+def iter_batches(items: Iterable, batch_size: int) -> Iterator[List]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
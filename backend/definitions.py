@@ -0,0 +1,217 @@
+"""
+Index of terms defined in the Acts' "Definitions" articles.
+
+Almost every Act opens with a definitions section ("(a) "Workplace" means ...").
+`extract_definitions` pulls out each defined term and its clause, and ingest
+writes them to data/definitions.json. `DefinitionIndex` loads them into a
+character trie: exact lookup and prefix autocomplete (/define) take
+microseconds, and "what does X mean (under Y Act)?" questions are answered
+from the definition clause instead of vector search.
+
+    python backend/definitions.py --out data/definitions.json
+    python backend/definitions.py --complete "basic"
+"""
+import os
+import re
+import sys
+import json
+import argparse
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from backend.corpus import iter_corpus_entries
+
+DEFINITIONS_FILE = "definitions.json"
+_DEFINITION_ARTICLE_RE = re.compile(r"definition", re.IGNORECASE)
+# "(a) "Court" means", "(h)5 "Income" means" (footnote digits), ""Bank" or "Banker" includes"
+_DEFINED_TERMS_RE = re.compile(
+    r"^\s*(?:\(\s*[0-9a-z]{1,5}\s*\)[\s\dº]*)*"
+    r"(?P<terms>(?:[\"“][^\"“”]{1,80}[\"”']\s*(?:,|or|and|/)?\s*)+)"
+    r"\s*(?:shall\s+)?(?:means?|includes?|refers?\s+to|denotes)\b",
+    re.IGNORECASE,
+)
+_TERM_RE = re.compile(r"[\"“]([^\"“”]{1,80})[\"”']")
+_LEADING_MARKER_RE = re.compile(r"^\s*\(\s*([0-9a-z]{1,5})\s*\)", re.IGNORECASE)
+
+# "What does X mean", "meaning of X", "define X", "what is X as defined"
+_QUESTION_RES = [
+    re.compile(r"\bwhat\s+(?:does|do)\s+(?:the\s+)?(?:term\s+|word\s+)?(?P<term>.+?)\s+mean\b"),
+    re.compile(r"\b(?:meaning|definition)\s+of\s+(?:the\s+)?(?:term\s+|word\s+)?(?P<term>.+?)"
+               r"(?=\s+(?:under|in|as\s+per|according\s+to)\b|\s*[?.!]|$)"),
+    re.compile(r"^\s*define\s+(?:the\s+)?(?:term\s+|word\s+)?(?P<term>.+?)"
+               r"(?=\s+(?:under|in|as\s+per|according\s+to)\b|\s*[?.!]|$)"),
+    re.compile(r"^\s*(?:what|who)\s+(?:is|are)\s+(?:an?\s+|the\s+)?(?P<term>.+?)\s+(?:as\s+)?defined\b"),
+]
+# "What is X under the Y Act": only a definition question when the query names an Act
+# ("what is a contract in nepal" is a question about contract law)
+_ACT_SCOPED_QUESTION_RE = re.compile(r"^\s*(?:what|who)\s+(?:is|are)\s+(?:an?\s+|the\s+)?(?P<term>.+?)"
+                                     r"\s+(?:under|in|as\s+per|according\s+to)\s+(?:the\s+)?[a-z]")
+
+
+def normalize_term(term: str) -> str:
+    term = term.lower().strip(" \"'“”‘’?.!,;:")
+    term = re.sub(r"^(?:an?|the)\s+", "", term)
+    return re.sub(r"\s+", " ", term)
+
+
+def defined_terms(text: str) -> List[str]:
+    match = _DEFINED_TERMS_RE.match(text or "")
+    if not match:
+        return []
+    return [t.strip() for t in _TERM_RE.findall(match.group("terms")) if t.strip()]
+
+
+def extract_definitions(entries: Iterable[Dict]) -> List[Dict]:
+    """One record per (term, clause) from the clauses of definitions articles."""
+    definitions = []
+    for entry in entries:
+        meta = entry["metadata"]
+        if meta.get("section") != "Clause" or not _DEFINITION_ARTICLE_RE.search(meta.get("article_title", "")):
+            continue
+        for term in defined_terms(entry["text"]):
+            marker = _LEADING_MARKER_RE.match(entry["text"])
+            definitions.append({
+                "term": term,
+                "marker": marker.group(1).lower() if marker else "",
+                "text": entry["text"],
+                "metadata": meta,
+            })
+    return definitions
+
+
+def write_definitions(processed_dir: Path, out_path: Path) -> int:
+    definitions = extract_definitions(iter_corpus_entries(processed_dir))
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(definitions, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, out_path)
+    return len(definitions)
+
+
+def load_definitions(path: Path, processed_dir: Optional[Path] = None) -> List[Dict]:
+    """The ingested definitions file, else extracted from the processed JSONs on the spot."""
+    path = Path(path)
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    if processed_dir is not None and Path(processed_dir).exists():
+        return extract_definitions(iter_corpus_entries(processed_dir))
+    return []
+
+
+class DefinitionIndex:
+    """Character trie of normalized terms; each terminal node lists the definitions of that term."""
+
+    _END = "\0"
+
+    def __init__(self, definitions: List[Dict], source_fn=None):
+        self.definitions = definitions
+        self.sources = [source_fn(d["text"], d["metadata"]) if source_fn else {"text": d["text"], **d["metadata"]}
+                        for d in definitions]
+        self.root: Dict = {}
+        for i, definition in enumerate(definitions):
+            node = self.root
+            for char in normalize_term(definition["term"]):
+                node = node.setdefault(char, {})
+            node.setdefault(self._END, []).append(i)
+
+    def __len__(self) -> int:
+        return len(self.definitions)
+
+    def _node(self, prefix: str) -> Optional[Dict]:
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return None
+        return node
+
+    def lookup(self, term: str, documents: Optional[List[str]] = None) -> List[int]:
+        """Ids of the definitions of `term` (singular/plural tolerant), optionally in the given Acts."""
+        term = normalize_term(term)
+        ids = []
+        for candidate in (term, term[:-1] if term.endswith("s") else term + "s"):
+            node = self._node(candidate)
+            if node is not None and self._END in node:
+                ids = node[self._END]
+                break
+        if documents:
+            ids = [i for i in ids if self.definitions[i]["metadata"]["document_title"] in documents]
+        return ids
+
+    def complete(self, prefix: str, limit: int = 10) -> List[Dict]:
+        """Defined terms starting with `prefix`, shortest first, with the Acts defining them."""
+        prefix = normalize_term(prefix)
+        node = self._node(prefix)
+        if node is None:
+            return []
+        found = []
+        stack = [(prefix, node)]
+        while stack:
+            text, node = stack.pop()
+            for char, child in node.items():
+                if char == self._END:
+                    found.append((text, child))
+                else:
+                    stack.append((text + char, child))
+        found.sort(key=lambda item: (len(item[0]), item[0]))
+        return [{"term": self.definitions[ids[0]]["term"],
+                 "documents": sorted({self.definitions[i]["metadata"]["document_title"] for i in ids})}
+                for _, ids in found[:limit]]
+
+    def entry(self, i: int) -> Dict:
+        definition = self.definitions[i]
+        meta = definition["metadata"]
+        return {
+            "term": definition["term"],
+            "document_title": meta["document_title"],
+            "article_number": meta.get("article_number", ""),
+            "clause": definition["marker"],
+            "text": definition["text"],
+        }
+
+    def match_question(self, query: str, documents: Optional[List[str]] = None) -> Optional[Dict]:
+        """
+        For a definition question about a defined term, {"term", "ids"}: the term's definitions,
+        restricted to `documents` (the Acts the query names) when given. "What is X under/in ..."
+        only counts when it names an Act. None otherwise.
+        """
+        lowered = query.lower().strip()
+        patterns = _QUESTION_RES + ([_ACT_SCOPED_QUESTION_RE] if documents else [])
+        for pattern in patterns:
+            match = pattern.search(lowered)
+            if not match:
+                continue
+            ids = self.lookup(match.group("term"), documents)
+            if ids:
+                return {"term": self.definitions[ids[0]]["term"], "ids": ids}
+        return None
+
+    def stats(self) -> Dict:
+        return {"definitions": len(self.definitions),
+                "terms": len({normalize_term(d["term"]) for d in self.definitions})}
+
+
+def main():
+    from config.paths import PROCESSED_DIR, DATA_DIR
+
+    parser = argparse.ArgumentParser(description="Extract and query the defined terms of the processed Acts")
+    parser.add_argument("--out", type=Path, default=DATA_DIR / DEFINITIONS_FILE)
+    parser.add_argument("--complete", default=None, help="Print terms starting with this prefix instead")
+    args = parser.parse_args()
+
+    if args.complete is not None:
+        index = DefinitionIndex(load_definitions(args.out, PROCESSED_DIR))
+        for item in index.complete(args.complete, limit=20):
+            print(f"{item['term']:40s} {', '.join(item['documents'])}")
+        return 0
+    count = write_definitions(PROCESSED_DIR, args.out)
+    print(f"📖 {count} definitions written to {args.out}")
+    return 0 if count else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,429 @@
+"""
+Production PDF -> structured JSON extraction (replaces the notebook loop).
+
+    python backend/extract_pdfs.py --input data/raw --concurrency 4
+
+Pipeline per PDF:
+1. PyMuPDF extracts page text locally (in worker processes); the document
+   title and preamble are taken from the first pages without the LLM, and
+   blank pages are dropped.
+2. Pages are grouped into chunks of --chunk-size; each chunk's cache key is a
+   hash of its page contents, prompt version and model, so re-runs only send
+   changed page ranges to Gemini.
+3. Uncached chunks are extracted concurrently (bounded thread pool). Chunks
+   with a text layer are sent as text, scanned chunks as PDF bytes.
+4. Chunk JSONs are merged in page order and written to processeddata/.
+"""
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List
+
+from dotenv import load_dotenv
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from config.paths import DATA_DIR, PROCESSED_DIR
+
+EXTRACTION_MODEL = "gemini-2.5-flash"
+CHUNK_SIZE = 40  # pages per chunk, as in the notebook pipeline
+PROMPT_VERSION = "1"
+CACHE_DIR = DATA_DIR / "cache" / "extraction"
+MAX_API_ATTEMPTS = 3
+
+PROMPT = """
+You are an AI assistant for legal document structuring and retrieval.
+
+Task:
+Extract the full *hierarchical citation structure* from the attached legal document chunk and return it as valid JSON.
+
+The structure must reflect:
+- Parts (with their number + title)
+- Articles (number, title, clauses if any)
+- Clauses or sub-clauses under each Article
+- Schedules (if any)
+- The preamble (if found)
+
+JSON Schema:
+{
+  "document_title": str,
+  "preamble": str,
+  "parts": [
+    {
+      "part_number": str,
+      "part_title": str,
+      "articles": [
+        {
+          "article_number": str,
+          "article_title": str,
+          "clauses": [str]
+        }
+      ]
+    }
+  ],
+  "schedules": [
+    {
+      "schedule_number": str,
+      "schedule_title": str
+    }
+  ]
+}
+
+Rules:
+- Output ONLY JSON. No commentary, no markdown.
+- If a value doesn't exist, use "" or [].
+- Maintain exact hierarchical order.
+CRITICAL: Return valid JSON or "{}" — never text commentary.
+"""
+
+PART_RE = re.compile(r"^(Part|PART|Chapter|CHAPTER)[\s\-–]*([IVXLC\d]+)\s*[:.\-–]?\s*(.*)$")
+ARTICLE_RE = re.compile(r"^(\d+[A-Z]?\.)\s+(.+?[:.\-–])\s*(.*)$")
+CLAUSE_RE = re.compile(r"^\(\d+[a-z]?\)\s+")
+
+
+# ============================================================
+# LOCAL (PyMuPDF) EXTRACTION
+# ============================================================
+
+def read_pdf_pages(pdf_path: str, chunk_size: int) -> Dict:
+    """Extract page texts and per-chunk content hashes. Runs in a worker process."""
+    import fitz  # PyMuPDF
+
+    started = time.perf_counter()
+    pages = []
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            text = page.get_text("text")
+            digest = hashlib.sha256(text.encode("utf-8"))
+            digest.update(page.read_contents())
+            blank = not text.strip() and not page.get_images()
+            pages.append({"number": page.number, "text": text, "hash": digest.hexdigest(), "blank": blank})
+
+        chunks = []
+        non_blank = [p for p in pages if not p["blank"]]
+        for start in range(0, len(non_blank), chunk_size):
+            group = non_blank[start:start + chunk_size]
+            first, last = group[0]["number"], group[-1]["number"]
+            has_text = all(p["text"].strip() for p in group)
+            chunk = {
+                "first_page": first + 1,
+                "last_page": last + 1,
+                "page_hashes": [p["hash"] for p in group],
+                "text": "\n".join(p["text"] for p in group) if has_text else "",
+                "pdf_bytes": None,
+            }
+            if not has_text:
+                # Scanned pages: the model needs to see the rendered PDF
+                sub = fitz.open()
+                sub.insert_pdf(doc, from_page=first, to_page=last)
+                chunk["pdf_bytes"] = sub.tobytes(garbage=3, deflate=True)
+                sub.close()
+            chunks.append(chunk)
+
+    return {
+        "pages": len(pages),
+        "chunks": chunks,
+        "title": guess_title(pages),
+        "preamble": find_preamble(pages),
+        "read_s": time.perf_counter() - started,
+    }
+
+
+def guess_title(pages: List[Dict]) -> str:
+    for page in pages[:2]:
+        for line in page["text"].splitlines():
+            line = line.strip()
+            if re.search(r"\b(Act|Constitution|Code)\b", line) and len(line) < 120:
+                return line
+    return ""
+
+
+def find_preamble(pages: List[Dict]) -> str:
+    """The 'Whereas ... has enacted this Act' paragraph near the start of the document."""
+    head = " ".join(" ".join(p["text"].split()) for p in pages[:3])
+    match = re.search(r"(Whereas\b.*?(?:enacted|promulgated)[^.]*\.)", head)
+    return match.group(1).strip() if match else ""
+
+
+def structure_locally(text: str) -> Dict:
+    """Regex structurer used with --local-only (no LLM)."""
+    parts: List[Dict] = []
+    part = article = None
+    for raw_line in text.splitlines():
+        line = " ".join(raw_line.split())
+        if not line:
+            continue
+        part_match = PART_RE.match(line)
+        if part_match:
+            part = {"part_number": f"{part_match.group(1).title()}-{part_match.group(2)}",
+                    "part_title": part_match.group(3), "articles": []}
+            parts.append(part)
+            article = None
+            continue
+        article_match = ARTICLE_RE.match(line)
+        if article_match:
+            if part is None:
+                part = {"part_number": "", "part_title": "", "articles": []}
+                parts.append(part)
+            article = {"article_number": article_match.group(1),
+                       "article_title": article_match.group(2), "clauses": []}
+            part["articles"].append(article)
+            if article_match.group(3):
+                article["clauses"].append(article_match.group(3))
+            continue
+        if article is None:
+            continue
+        if CLAUSE_RE.match(line) or not article["clauses"]:
+            article["clauses"].append(line)
+        else:
+            article["clauses"][-1] += " " + line
+    return {"document_title": "", "preamble": "", "parts": parts, "schedules": []}
+
+
+# ============================================================
+# LLM EXTRACTION WITH CACHE
+# ============================================================
+
+def chunk_cache_key(chunk: Dict, model: str, mode: str) -> str:
+    digest = hashlib.sha256(f"{PROMPT_VERSION}|{model}|{mode}".encode("utf-8"))
+    for page_hash in chunk["page_hashes"]:
+        digest.update(page_hash.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def clean_json(raw: str) -> str:
+    """Extract valid JSON block from model output."""
+    match = re.search(r"\{.*\}", raw or "", re.DOTALL)
+    return match.group(0).strip() if match else (raw or "").strip()
+
+
+def call_with_backoff(fn):
+    for attempt in range(MAX_API_ATTEMPTS):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == MAX_API_ATTEMPTS - 1:
+                raise
+            delay = 2 ** attempt
+            print(f"⚠️  Gemini call failed ({e}), retrying in {delay}s...")
+            time.sleep(delay)
+
+
+def extract_chunk_llm(client, chunk: Dict, model: str) -> Dict:
+    from google.genai import types
+
+    if chunk["text"]:
+        contents = [PROMPT, f"Document text (pages {chunk['first_page']}-{chunk['last_page']}):\n{chunk['text']}"]
+    else:
+        contents = [types.Part.from_bytes(data=chunk["pdf_bytes"], mime_type="application/pdf"), PROMPT]
+
+    resp = call_with_backoff(lambda: client.models.generate_content(model=model, contents=contents))
+    raw = clean_json(resp.text)
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError:
+        # Retry once with strict "fix JSON" instruction
+        retry_prompt = "Rewrite ONLY this into valid JSON according to schema:\n" + raw
+        retry = call_with_backoff(lambda: client.models.generate_content(model=model, contents=[retry_prompt]))
+        return json.loads(clean_json(retry.text))
+
+
+def extract_chunk(client, chunk: Dict, model: str, local_only: bool) -> Dict:
+    """Return {"json", "cached"} for one chunk, consulting the on-disk cache first."""
+    mode = "local" if local_only or not client else "llm"
+    key = chunk_cache_key(chunk, model, mode)
+    cache_path = CACHE_DIR / f"{key}.json"
+    if cache_path.exists():
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return {"json": json.load(f), "cached": True}
+
+    if mode == "local":
+        result = structure_locally(chunk["text"])
+    else:
+        result = extract_chunk_llm(client, chunk, model)
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False)
+    os.replace(tmp_path, cache_path)
+    return {"json": result, "cached": False}
+
+
+def merge_jsons(json_list: List[Dict]) -> Dict:
+    """Merge chunk JSONs in page order (deduplicate by part/article, keep clause order)."""
+    json_list = [js for js in json_list if js]
+    if not json_list:
+        return {}
+
+    base = {k: v for k, v in json_list[0].items() if k not in ("parts", "schedules")}
+    parts: Dict[str, Dict] = {}
+    schedules: Dict[str, Dict] = {}
+
+    for js in json_list:
+        for part in js.get("parts", []):
+            pnum = part.get("part_number", "")
+            if pnum not in parts:
+                parts[pnum] = {**part, "articles": []}
+            existing = {a.get("article_number", ""): a for a in parts[pnum]["articles"]}
+            for art in part.get("articles", []):
+                anum = art.get("article_number", "")
+                if anum in existing:
+                    merged = existing[anum].get("clauses", []) + art.get("clauses", [])
+                    existing[anum]["clauses"] = list(dict.fromkeys(merged))
+                else:
+                    parts[pnum]["articles"].append(art)
+                    existing[anum] = art
+        for sch in js.get("schedules", []):
+            schedules.setdefault(sch.get("schedule_number", ""), sch)
+
+    base["parts"] = list(parts.values())
+    base["schedules"] = list(schedules.values())
+    return base
+
+
+# ============================================================
+# COMMAND
+# ============================================================
+
+def get_client(local_only: bool):
+    if local_only:
+        return None
+    load_dotenv(PROJECT_ROOT / ".env")
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        print("⚠️  GEMINI_API_KEY not set, falling back to local-only extraction.")
+        return None
+    from google import genai
+    return genai.Client(api_key=api_key)
+
+
+def timed_extract_chunk(client, chunk: Dict, model: str, local_only: bool) -> Dict:
+    """extract_chunk with its own start/finish times; errors are returned, not raised."""
+    started = time.perf_counter()
+    try:
+        result = extract_chunk(client, chunk, model, local_only)
+        return {**result, "started": started, "finished": time.perf_counter()}
+    except Exception as e:
+        return {"error": e, "started": started, "finished": time.perf_counter()}
+
+
+def extract_all(pdf_paths: List[Path], output_dir: Path, chunk_size: int, workers: int,
+                concurrency: int, model: str, local_only: bool) -> List[Dict]:
+    """Extract every PDF; a document with a failed read or chunk is reported and not written."""
+    client = get_client(local_only)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    reports = []
+
+    with ProcessPoolExecutor(max_workers=workers) as readers, \
+            ThreadPoolExecutor(max_workers=concurrency) as extractors:
+        read_futures = {readers.submit(read_pdf_pages, str(p), chunk_size): p for p in pdf_paths}
+        docs = {}
+        for future in as_completed(read_futures):
+            pdf_path = read_futures[future]
+            try:
+                docs[pdf_path] = {"local": future.result()}
+            except Exception as e:
+                print(f"❌ Failed to read {pdf_path.name}: {e}")
+                reports.append({"document": pdf_path.name, "written": False, "error": str(e)})
+                continue
+            local = docs[pdf_path]["local"]
+            docs[pdf_path]["futures"] = [
+                extractors.submit(timed_extract_chunk, client, chunk, model, local_only)
+                for chunk in local["chunks"]
+            ]
+
+        for pdf_path, doc in docs.items():
+            local = doc["local"]
+            results = [future.result() for future in doc["futures"]]
+            partials, cached, failed = [], 0, 0
+            for chunk, result in zip(local["chunks"], results):
+                if "error" in result:
+                    failed += 1
+                    print(f"⚠️  {pdf_path.name} pages {chunk['first_page']}-{chunk['last_page']} "
+                          f"failed: {result['error']}")
+                    continue
+                cached += result["cached"]
+                partials.append(result["json"])
+
+            # Wall time of this document's own chunks, not of the whole batch
+            chunk_s = (max(r["finished"] for r in results) - min(r["started"] for r in results)) if results else 0.0
+            elapsed = local["read_s"] + chunk_s
+            report = {
+                "document": pdf_path.name,
+                "pages": local["pages"],
+                "chunks": len(local["chunks"]),
+                "cached_chunks": cached,
+                "failed_chunks": failed,
+                "seconds": round(elapsed, 2),
+                "pages_per_s": round(local["pages"] / elapsed, 2) if elapsed else 0.0,
+                "written": False,
+            }
+            reports.append(report)
+
+            out_path = output_dir / f"{pdf_path.stem}.json"
+            if failed:
+                # Partial output would silently replace a good processed JSON
+                print(f"❌ {pdf_path.name}: {failed}/{len(local['chunks'])} chunks failed, "
+                      f"{out_path.name} left unchanged")
+                continue
+
+            merged = merge_jsons(partials)
+            merged["document_title"] = merged.get("document_title") or local["title"] or pdf_path.stem
+            if local["preamble"]:
+                merged["preamble"] = local["preamble"]
+
+            with open(out_path, "w", encoding="utf-8") as f:
+                json.dump(merged, f, indent=2, ensure_ascii=False)
+            report["written"] = True
+            print(f"✅ {pdf_path.name}: {local['pages']} pages, {len(local['chunks'])} chunks "
+                  f"({cached} cached) in {elapsed:.1f}s -> {out_path.name}")
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract structured legal JSON from PDFs.")
+    parser.add_argument("--input", type=Path, default=DATA_DIR / "raw", help="Folder containing PDFs")
+    parser.add_argument("--output", type=Path, default=PROCESSED_DIR, help="Folder for structured JSON")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help=f"Pages per chunk (default: {CHUNK_SIZE})")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1),
+                        help="Processes for local PyMuPDF extraction")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent Gemini requests (default: 4)")
+    parser.add_argument("--model", default=EXTRACTION_MODEL, help=f"Gemini model (default: {EXTRACTION_MODEL})")
+    parser.add_argument("--local-only", action="store_true", help="Structure text locally without the LLM")
+    parser.add_argument("--report", type=Path, default=None, help="Optional path to write the throughput report")
+    args = parser.parse_args()
+
+    pdf_paths = sorted(args.input.glob("*.pdf"))
+    if not pdf_paths:
+        print(f"⚠️ No PDF files found in {args.input}")
+        return 1
+
+    print(f"🚀 Extracting {len(pdf_paths)} PDFs ({args.workers} readers, {args.concurrency} concurrent requests)...")
+    started = time.perf_counter()
+    reports = extract_all(pdf_paths, args.output, args.chunk_size, args.workers,
+                          args.concurrency, args.model, args.local_only)
+    total_pages = sum(r.get("pages", 0) for r in reports)
+    elapsed = time.perf_counter() - started
+    print(f"📊 {total_pages} pages in {elapsed:.1f}s ({total_pages / elapsed if elapsed else 0:.1f} pages/s)")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"documents": reports, "total_pages": total_pages, "seconds": round(elapsed, 2)}, f, indent=2)
+
+    failed = [r["document"] for r in reports if not r["written"]]
+    if failed:
+        print(f"❌ {len(failed)} document(s) not written, re-run to retry: {', '.join(sorted(failed))}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
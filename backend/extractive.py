@@ -0,0 +1,160 @@
+"""
+Extractive answers: the most relevant sentences of the retrieved clauses,
+quoted with their document/part/article/clause references, without an LLM.
+
+Sentences are scored by cosine similarity to the query embedding (the same
+local encoder used for retrieval) plus query-term overlap, so an answer takes
+a few milliseconds on CPU. Sentence embeddings are cached per clause. When the
+encoder is unavailable too, the term overlap alone ranks the sentences.
+
+Used when both Gemini models fail, when the generation pool is full, and for
+/chat requests with mode="fast".
+"""
+import re
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from backend.caches import TTLCache
+from backend.citations import provision_unit
+from backend.vector_engine import clause_key
+
+# Clause text splits on sentence ends, semicolons and the colon before an enumerated list
+_SPLIT_RE = re.compile(r"(?<=[.;])\s+(?=[A-Z(\"“])|(?<=:)\s*(?=\([0-9a-z]{1,4}\)\s)|;\s*(?=\([0-9a-z]{1,4}\)\s)")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "the", "of", "to", "in", "on", "for", "and", "or", "is", "are", "be", "by", "with", "as", "at",
+    "what", "which", "who", "whom", "how", "when", "where", "why", "does", "do", "can", "shall", "may",
+    "under", "law", "laws", "nepal", "act", "about", "any", "this", "that", "it", "my", "i", "me", "there",
+}
+MIN_SENTENCE_WORDS = 4
+MAX_SENTENCE_CHARS = 500
+SEMANTIC_WEIGHT = 0.75
+LEXICAL_WEIGHT = 0.25
+# Small preference for clauses the retriever ranked higher
+RANK_PENALTY = 0.01
+# Below these best-sentence scores nothing retrieved answers the question: no answer is better than a weak one
+MIN_SEMANTIC_SCORE = 0.35
+MIN_LEXICAL_SCORE = 0.125
+
+EXTRACTIVE_NOTE = ("_Quoted directly from the retrieved provisions; the AI summary is not available for "
+                   "this answer._")
+
+
+def split_sentences(text: str) -> List[str]:
+    sentences = []
+    for piece in _SPLIT_RE.split(text or ""):
+        piece = piece.strip(" ;,-")
+        if len(piece.split()) >= MIN_SENTENCE_WORDS:
+            sentences.append(piece if len(piece) <= MAX_SENTENCE_CHARS else piece[:MAX_SENTENCE_CHARS] + "…")
+    return sentences
+
+
+def terms(text: str) -> set:
+    return {w.rstrip("s") if len(w) > 3 else w for w in _WORD_RE.findall(text.lower()) if w not in _STOPWORDS}
+
+
+def reference(src: Dict) -> str:
+    parts = [src.get("document_title", "")]
+    part = str(src.get("part_number") or "")
+    if part:
+        # Some Acts number parts as "Chapter-9"
+        parts.append(part if part[0].isalpha() else f"Part {part}")
+    if src.get("article_number"):
+        parts.append(f"{provision_unit(src.get('document_title', ''))} {str(src['article_number']).rstrip('.')}")
+    if src.get("clause_index"):
+        parts.append(f"Clause {src['clause_index']}")
+    return ", ".join(p for p in parts if p)
+
+
+class ExtractiveAnswerer:
+    """
+    `embed_documents(texts) -> vectors` and `embed_query(text) -> vector` are the retrieval
+    encoder's (normalized) embeddings; either may raise, in which case scoring is lexical.
+    """
+
+    def __init__(self, embed_documents: Optional[Callable[[List[str]], Sequence]] = None,
+                 embed_query: Optional[Callable[[str], Sequence]] = None, max_sentences: int = 3,
+                 cache_size: int = 4096, min_score: float = MIN_SEMANTIC_SCORE):
+        self.embed_documents = embed_documents
+        self.embed_query = embed_query
+        self.max_sentences = max_sentences
+        self.min_score = min_score
+        self.sentence_cache = TTLCache("extractive_sentences", maxsize=cache_size, ttl=86400.0)
+        self.answers = 0
+        self.lexical_only = 0
+        self.weak_matches = 0
+
+    def _sentence_vectors(self, clause_id: str, sentences: List[str]) -> np.ndarray:
+        vectors = self.sentence_cache.get(clause_id)
+        if vectors is None:
+            vectors = np.asarray(self.embed_documents(sentences), dtype=np.float32)
+            self.sentence_cache.set(clause_id, vectors)
+        return vectors
+
+    def rank(self, query: str, sources: List[Dict]) -> List[Dict]:
+        """Every sentence of the sources, best first, as {"text", "source", "score", "semantic"}."""
+        candidates = []
+        for rank, src in enumerate(sources):
+            for sentence in split_sentences(src.get("text", "")):
+                candidates.append({"text": sentence, "source": rank, "score": -RANK_PENALTY * rank,
+                                   "semantic": False})
+        if not candidates:
+            return []
+
+        query_terms = terms(query)
+        if query_terms:
+            for cand in candidates:
+                cand["score"] += LEXICAL_WEIGHT * len(query_terms & terms(cand["text"])) / len(query_terms)
+
+        try:
+            if self.embed_documents is None or self.embed_query is None:
+                raise RuntimeError("no encoder")
+            query_vec = np.asarray(self.embed_query(query), dtype=np.float32)
+            offset = 0
+            for rank, src in enumerate(sources):
+                count = sum(1 for c in candidates if c["source"] == rank)
+                if not count:
+                    continue
+                group = candidates[offset:offset + count]
+                vectors = self._sentence_vectors(clause_key(src), [c["text"] for c in group])
+                for cand, similarity in zip(group, vectors @ query_vec):
+                    cand["score"] += SEMANTIC_WEIGHT * float(similarity)
+                    cand["semantic"] = True
+                offset += count
+        except Exception as e:
+            self.lexical_only += 1
+            print(f"⚠️ Extractive scoring without embeddings: {e}")
+
+        return sorted(candidates, key=lambda c: c["score"], reverse=True)
+
+    def answer(self, query: str, sources: List[Dict]) -> Optional[str]:
+        """Cited answer in the generator's format, or None when no sentence is a convincing match."""
+        ranked = self.rank(query, sources)
+        if not ranked:
+            return None
+        if ranked[0]["score"] < (self.min_score if ranked[0]["semantic"] else MIN_LEXICAL_SCORE):
+            self.weak_matches += 1
+            return None
+        chosen, seen = [], set()
+        for cand in ranked:
+            key = cand["text"].lower()
+            if key not in seen:
+                seen.add(key)
+                chosen.append(cand)
+            if len(chosen) == self.max_sentences:
+                break
+
+        # Citation numbers follow the order of the sources list returned with the answer
+        lines = [f"- {c['text']} [{c['source'] + 1}] — *{reference(sources[c['source']])}*" for c in chosen]
+        self.answers += 1
+        return (f"**Short Answer**: {chosen[0]['text']} [{chosen[0]['source'] + 1}]\n\n"
+                f"**What the Law Says**:\n" + "\n".join(lines) + f"\n\n{EXTRACTIVE_NOTE}")
+
+    def clear(self):
+        """Forget cached sentence embeddings (after the encoder changes)."""
+        self.sentence_cache.clear()
+
+    def stats(self) -> Dict:
+        return {"answers": self.answers, "lexical_only": self.lexical_only, "weak_matches": self.weak_matches,
+                "sentence_cache": self.sentence_cache.stats()}
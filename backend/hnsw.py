@@ -0,0 +1,73 @@
+"""
+HNSW parameters for the Chroma collections.
+
+Chroma reads them from the collection metadata when the collection is created
+("hnsw:space", "hnsw:M", "hnsw:construction_ef", "hnsw:search_ef") and applies
+them to every build and query, so the backend picks them up without any
+configuration. backend/tune_hnsw.py measures candidate settings and writes the
+chosen ones to hnsw_params.json, which ingest.py uses for new collections.
+"""
+import os
+import json
+from pathlib import Path
+from typing import Dict, Optional
+
+SPACES = ("cosine", "ip", "l2")
+HNSW_PARAMS_FILE = Path(__file__).resolve().parent.parent / "hnsw_params.json"
+
+
+class HnswParams:
+    """Build (M, ef_construction) and search (ef_search) settings of one HNSW index."""
+
+    def __init__(self, space: str = "cosine", M: int = 16, ef_construction: int = 100, ef_search: int = 100):
+        if space not in SPACES:
+            raise ValueError(f"Unsupported space '{space}', expected one of {SPACES}")
+        self.space = space
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+
+    def metadata(self) -> Dict:
+        return {
+            "hnsw:space": self.space,
+            "hnsw:M": self.M,
+            "hnsw:construction_ef": self.ef_construction,
+            "hnsw:search_ef": self.ef_search,
+        }
+
+    @classmethod
+    def from_metadata(cls, metadata: Optional[Dict]) -> Optional["HnswParams"]:
+        """Parameters recorded on a collection; None when it was built with Chroma's defaults."""
+        metadata = metadata or {}
+        if not any(key.startswith("hnsw:") for key in metadata):
+            return None
+        return cls(space=metadata.get("hnsw:space", "l2"), M=metadata.get("hnsw:M", 16),
+                   ef_construction=metadata.get("hnsw:construction_ef", 100),
+                   ef_search=metadata.get("hnsw:search_ef", 10))
+
+    def to_dict(self) -> Dict:
+        return {"space": self.space, "M": self.M, "ef_construction": self.ef_construction,
+                "ef_search": self.ef_search}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "HnswParams":
+        return cls(space=data.get("space", "cosine"), M=int(data.get("M", 16)),
+                   ef_construction=int(data.get("ef_construction", 100)),
+                   ef_search=int(data.get("ef_search", 100)))
+
+    def label(self) -> str:
+        return f"{self.space}-M{self.M}-efc{self.ef_construction}-ef{self.ef_search}"
+
+
+def load_hnsw_params(path: Optional[Path] = None) -> Optional[HnswParams]:
+    """Tuned parameters from HNSW_PARAMS (or hnsw_params.json); None keeps Chroma's defaults."""
+    path = Path(path or os.getenv("HNSW_PARAMS", str(HNSW_PARAMS_FILE)))
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return HnswParams.from_dict(json.load(f)["params"])
+
+
+def save_hnsw_params(params: HnswParams, path: Path, measured: Optional[Dict] = None):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"params": params.to_dict(), "measured": measured or {}}, f, indent=2)
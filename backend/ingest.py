@@ -2,6 +2,10 @@ import os
 import sys
 import json
 import uuid
+import time
+import shutil
+import argparse
+from collections import defaultdict
 from pathlib import Path
 from typing import List, Dict, Optional
 from tqdm import tqdm
@@ -13,7 +17,6 @@ sys.path.append(str(PROJECT_ROOT))
 
 # Attempt to import necessary libraries, handle missing ones gracefully
 try:
-    import fitz  # PyMuPDF
     from langchain_text_splitters import RecursiveCharacterTextSplitter
     from langchain_huggingface import HuggingFaceEmbeddings
     from langchain_chroma import Chroma
@@ -26,15 +29,27 @@ except ImportError as e:
 
 # Configuration from paths or defaults
 try:
-    from config.paths import DATA_DIR, PROCESSED_DIR, VECTORSTORE_DIR
+    from config.paths import DATA_DIR, PROCESSED_DIR, VECTORSTORE_DIR, NUMPY_INDEX_DIR
 except ImportError:
     # Fallback default paths if config module not found
     DATA_DIR = PROJECT_ROOT / "data"
     PROCESSED_DIR = DATA_DIR / "processed"
     VECTORSTORE_DIR = PROJECT_ROOT / "chroma_db"
+    NUMPY_INDEX_DIR = PROJECT_ROOT / "numpy_index"
+
+from backend.vector_engine import NumpyIndexWriter
+from backend.corpus import iter_corpus_entries, iter_batches
+from backend.memstats import peak_rss_mb
+from backend.compression import CompressionSettings, QUANTIZATIONS, REDUCTIONS
+from backend.snapshots import publish_snapshot
+from backend.definitions import write_definitions, DEFINITIONS_FILE
+from backend.hnsw import load_hnsw_params
+from backend.shards import (shard_name, collection_name, is_sharded, read_shard_manifest,
+                            update_shard_manifest, replace_dir)
 
 EMBEDDING_MODEL = "BAAI/bge-large-en-v1.5"
 COLLECTION_NAME = "legal_docs"
+EMBED_BATCH_SIZE = 64
 
 # Load environment variables
 load_dotenv(PROJECT_ROOT / ".env")
@@ -67,99 +82,261 @@ def load_json_files(folder: Path) -> List[tuple]:
             print(f"⚠️  Failed to load {f.name}: {e}")
     return data
 
-def flatten_legal_json(doc_title: str, js: Dict) -> List[Dict]:
-    """
-    Flatten legal JSON structure into distinct chunks for vector search.
-    """
-    entries = []
-
-    # Preamble
-    if js.get("preamble"):
-        entries.append({
-            "text": js["preamble"].strip(),
-            "metadata": {
-                "document_title": doc_title,
-                "section": "Preamble"
-            }
-        })
-
-    # Parts and Articles
-    for part in js.get("parts", []):
-        pnum = part.get("part_number", "")
-        ptitle = part.get("part_title", "")
-        for article in part.get("articles", []):
-            anum = article.get("article_number", "")
-            atitle = article.get("article_title", "")
-            clauses = article.get("clauses", [])
-
-            for idx, clause in enumerate(clauses, start=1):
-                entries.append({
-                    "text": clause.strip(),
-                    "metadata": {
-                        "document_title": doc_title,
-                        "part_number": pnum,
-                        "part_title": ptitle,
-                        "article_number": anum,
-                        "article_title": atitle,
-                        "clause_index": idx,
-                        "section": "Clause"
-                    }
-                })
-    return entries
-
-def create_vector_store(persist_dir: Path):
-    """Rebuild the ChromaDB vector store from processed JSON data."""
-    print("📚 Loading processed JSONs from:", PROCESSED_DIR)
-    data = load_json_files(PROCESSED_DIR)
-
-    if not data:
-        print("❌ No data found to ingest. Ensure 'data/processed' contains valid JSON files.")
-        return
+def get_embeddings_model(model_name: str = EMBEDDING_MODEL) -> HuggingFaceEmbeddings:
+    """Local HuggingFace embeddings, normalised so dot product == cosine."""
+    return HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'normalize_embeddings': True}
+    )
 
-    all_entries = []
-    for doc_name, js in tqdm(data, desc="Flattening documents"):
-        all_entries.extend(flatten_legal_json(doc_name, js))
+def report_progress(label: str, entries: int, started: float):
+    elapsed = time.perf_counter() - started
+    rate = entries / elapsed if elapsed > 0 else 0.0
+    print(f"📈 {label}: {entries} entries in {elapsed:.1f}s ({rate:.1f} clauses/s), peak RSS {peak_rss_mb()} MB")
 
-    print(f"🧩 Total {len(all_entries)} text entries to embed")
+def hnsw_collection_metadata() -> Optional[Dict]:
+    """HNSW settings chosen by backend/tune_hnsw.py, stored on new collections (None: Chroma defaults)."""
+    params = load_hnsw_params()
+    if params is None:
+        return None
+    print(f"🔧 HNSW parameters: {params.label()}")
+    return params.metadata()
 
-    # Initialize ChromaDB Client
-    # Note: Using langchain-chroma wrapper for easier integration with standard embeddings
-    
+def create_vector_store(persist_dir: Path, batch_size: int = EMBED_BATCH_SIZE,
+                        model_name: str = EMBEDDING_MODEL) -> bool:
+    """Rebuild the ChromaDB vector store from processed JSON data, one batch at a time."""
+    print("📚 Streaming processed JSONs from:", PROCESSED_DIR)
     print(f"🔄 Initializing Vector Store at {persist_dir}...")
     
     # We use HuggingFace embeddings as per notebook configuration
-    embeddings = HuggingFaceEmbeddings(
-        model_name=EMBEDDING_MODEL,
-        model_kwargs={'device': 'cpu'},
-        encode_kwargs={'normalize_embeddings': True}
-    )
+    embeddings = get_embeddings_model(model_name)
+    hnsw = hnsw_collection_metadata()
 
     try:
-        # Check if directory exists and clean it if you want strict rebuild, 
-        # but Chroma handles persistence. 
-        # We can just create execution using from_texts.
-        
-        # Extract texts and metadatas
-        texts = [e["text"] for e in all_entries]
-        metadatas = [e["metadata"] for e in all_entries]
-        
-        # Batch processing might be needed for large datasets, 
-        # but langchain Chroma wrapper handles batching usually. 
-        # If dataset is huge, consider manual batching.
-        
-        vectordb = Chroma.from_texts(
-            texts=texts,
-            embedding=embeddings,
-            metadatas=metadatas,
+        vectordb = Chroma(
+            collection_name=COLLECTION_NAME,
+            embedding_function=embeddings,
             persist_directory=str(persist_dir),
-            collection_name=COLLECTION_NAME
+            collection_metadata=hnsw
         )
-        
+
+        # Only one batch of texts, metadatas and vectors is alive at a time
+        started = time.perf_counter()
+        total = 0
+        for batch in tqdm(iter_batches(iter_corpus_entries(PROCESSED_DIR), batch_size), desc="Embedding batches"):
+            vectordb.add_texts(
+                texts=[e["text"] for e in batch],
+                metadatas=[e["metadata"] for e in batch]
+            )
+            total += len(batch)
+
+        if not total:
+            print("❌ No data found to ingest. Ensure 'data/processed' contains valid JSON files.")
+            return False
+
+        report_progress("Chroma ingest", total, started)
         print(f"✅ Vector store successfully created at: {persist_dir}")
         print(f"📊 Collection '{COLLECTION_NAME}' is ready.")
+        return True
         
     except Exception as e:
         print(f"❌ Failed to create vector store: {e}")
+        return False
+
+def create_numpy_index(out_dir: Path, compression: Optional[CompressionSettings] = None,
+                       model_name: str = EMBEDDING_MODEL, batch_size: int = EMBED_BATCH_SIZE) -> bool:
+    """Build the memory-mapped NumPy exact-search index from processed JSON data, streaming."""
+    compression = compression or CompressionSettings()
+    print("📚 Streaming processed JSONs from:", PROCESSED_DIR)
+    print(f"🔄 Embedding with {model_name}...")
+    embeddings = get_embeddings_model(model_name)
+
+    writer = NumpyIndexWriter(out_dir, compression=compression, embedding_model=model_name)
+    started = time.perf_counter()
+    for batch in tqdm(iter_batches(iter_corpus_entries(PROCESSED_DIR), batch_size), desc="Embedding batches"):
+        writer.add(embeddings.embed_documents([e["text"] for e in batch]), batch)
+
+    if not writer.rows:
+        writer.discard()
+        print("❌ No data found to ingest. Ensure 'data/processed' contains valid JSON files.")
+        return False
+
+    report_progress("Embedding", writer.rows, started)
+    writer.close()
+    report_progress("NumPy ingest", writer.rows, started)
+    print(f"✅ NumPy index ({compression.label()}) written to: {out_dir}")
+    return True
+
+def iter_shard_batches(batch_size: int, only: Optional[List[str]] = None):
+    """Corpus batches (restricted to the `only` Acts) grouped as {shard: entries}, with the batch."""
+    wanted = {shard_name(title) for title in only} if only else None
+    entries = (e for e in iter_corpus_entries(PROCESSED_DIR)
+               if wanted is None or shard_name(e["metadata"]["document_title"]) in wanted)
+    for batch in iter_batches(entries, batch_size):
+        groups = defaultdict(list)
+        for i, e in enumerate(batch):
+            groups[shard_name(e["metadata"]["document_title"])].append(i)
+        yield batch, groups
+
+def drop_stale_shards(out_dir: Path, built: Dict, backend: str, client=None):
+    """After a full rebuild, remove shards of Acts that are no longer in the corpus."""
+    if not is_sharded(out_dir):
+        return
+    for name in set(read_shard_manifest(out_dir)["shards"]) - set(built):
+        print(f"🗑️  Removing stale shard {name}")
+        if backend == "numpy":
+            shutil.rmtree(out_dir / name, ignore_errors=True)
+        else:
+            try:
+                client.delete_collection(collection_name(name))
+            except Exception:
+                pass
+
+def create_sharded_numpy_index(out_dir: Path, compression: Optional[CompressionSettings] = None,
+                               model_name: str = EMBEDDING_MODEL, batch_size: int = EMBED_BATCH_SIZE,
+                               only: Optional[List[str]] = None) -> bool:
+    """One NumPy index per Act under out_dir/<shard>; with `only`, rebuild just those Acts."""
+    compression = compression or CompressionSettings()
+    print("📚 Streaming processed JSONs from:", PROCESSED_DIR)
+    print(f"🔄 Embedding with {model_name} into per-Act shards...")
+    embeddings = get_embeddings_model(model_name)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    # Each shard spools to its own staging directory; the live shard is replaced only when complete
+    writers, titles = {}, {}
+    started = time.perf_counter()
+    for batch, groups in tqdm(iter_shard_batches(batch_size, only), desc="Embedding batches"):
+        vectors = embeddings.embed_documents([e["text"] for e in batch])
+        for name, rows in groups.items():
+            if name not in writers:
+                staging = out_dir / f".{name}.building"
+                shutil.rmtree(staging, ignore_errors=True)
+                writers[name] = NumpyIndexWriter(staging, compression=compression, embedding_model=model_name)
+                titles[name] = batch[rows[0]]["metadata"]["document_title"]
+            writers[name].add([vectors[i] for i in rows], [batch[i] for i in rows])
+
+    if not writers:
+        print("❌ No matching data found to ingest. Check 'data/processed' and --only.")
+        return False
+
+    report_progress("Embedding", sum(w.rows for w in writers.values()), started)
+    built = {}
+    for name, writer in writers.items():
+        writer.close()
+        replace_dir(writer.out_dir, out_dir / name)
+        built[name] = {"document_title": titles[name], "rows": writer.rows}
+        print(f"   🧩 {name}: {writer.rows} clauses")
+    if not only:
+        drop_stale_shards(out_dir, built, "numpy")
+    update_shard_manifest(out_dir, "numpy", model_name, built, replace_all=not only)
+    report_progress("Sharded NumPy ingest", sum(b["rows"] for b in built.values()), started)
+    print(f"✅ {len(built)} NumPy shards ({compression.label()}) written to: {out_dir}")
+    return True
+
+def create_sharded_vector_store(persist_dir: Path, batch_size: int = EMBED_BATCH_SIZE,
+                                model_name: str = EMBEDDING_MODEL, only: Optional[List[str]] = None) -> bool:
+    """One Chroma collection per Act in persist_dir; with `only`, rebuild just those Acts."""
+    print("📚 Streaming processed JSONs from:", PROCESSED_DIR)
+    print(f"🔄 Initializing sharded Vector Store at {persist_dir}...")
+    embeddings = get_embeddings_model(model_name)
+    hnsw = hnsw_collection_metadata()
+
+    try:
+        client = chromadb.PersistentClient(path=str(persist_dir))
+        stores, built = {}, {}
+        started = time.perf_counter()
+        for batch, groups in tqdm(iter_shard_batches(batch_size, only), desc="Embedding batches"):
+            for name, rows in groups.items():
+                if name not in stores:
+                    # A shard is rebuilt from scratch: drop the old collection first
+                    try:
+                        client.delete_collection(collection_name(name))
+                    except Exception:
+                        pass
+                    stores[name] = Chroma(client=client, collection_name=collection_name(name),
+                                          embedding_function=embeddings, collection_metadata=hnsw)
+                    built[name] = {"document_title": batch[rows[0]]["metadata"]["document_title"], "rows": 0}
+                stores[name].add_texts(texts=[batch[i]["text"] for i in rows],
+                                       metadatas=[batch[i]["metadata"] for i in rows])
+                built[name]["rows"] += len(rows)
+
+        if not built:
+            print("❌ No matching data found to ingest. Check 'data/processed' and --only.")
+            return False
+
+        if not only:
+            drop_stale_shards(persist_dir, built, "chroma", client)
+        update_shard_manifest(persist_dir, "chroma", model_name, built, replace_all=not only)
+        report_progress("Sharded Chroma ingest", sum(b["rows"] for b in built.values()), started)
+        for name, info in built.items():
+            print(f"   🧩 {collection_name(name)}: {info['rows']} clauses")
+        print(f"✅ {len(built)} Chroma shards written to: {persist_dir}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Failed to create sharded vector store: {e}")
+        return False
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build the MyPocketLawyer retrieval index.")
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default="chroma",
+                        help="Vector store to build (default: chroma)")
+    parser.add_argument("--dtype", choices=QUANTIZATIONS, default="float16",
+                        help="Storage/quantization of the NumPy index (default: float16)")
+    parser.add_argument("--reduce", choices=REDUCTIONS, default="none",
+                        help="Dimensionality reduction before quantization (default: none)")
+    parser.add_argument("--dim", type=int, default=None,
+                        help="Target dimension for --reduce pca/truncate")
+    parser.add_argument("--pq-subvectors", type=int, default=64,
+                        help="Number of product-quantization sub-vectors (default: 64)")
+    parser.add_argument("--rescore", type=int, default=0,
+                        help="Re-score this many pq candidates exactly against float16 vectors (default: off)")
+    parser.add_argument("--model", default=EMBEDDING_MODEL,
+                        help="Embedding model for the index; must match the backend's query encoder")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE,
+                        help=f"Clauses embedded and written per batch (default: {EMBED_BATCH_SIZE})")
+    parser.add_argument("--out", type=Path, default=None,
+                        help="Output directory (defaults to chroma_db/ or numpy_index/)")
+    parser.add_argument("--shard-by-act", action="store_true",
+                        help="Build one index (NumPy) or collection (Chroma) per document_title")
+    parser.add_argument("--only", action="append", default=None, metavar="ACT",
+                        help="With --shard-by-act: rebuild only this Act (title or shard name; repeatable)")
+    parser.add_argument("--publish", action="store_true",
+                        help="Pack the built index as a versioned snapshot the backend can hot-swap")
+    parser.add_argument("--snapshot-version", default=None,
+                        help="Version label for --publish (default: UTC timestamp)")
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    create_vector_store(VECTORSTORE_DIR)
+    args = parse_args()
+    if args.only and not args.shard_by_act:
+        print("❌ --only requires --shard-by-act.")
+        sys.exit(2)
+    if args.backend == "numpy":
+        compression = CompressionSettings(
+            quantization=args.dtype, reduction=args.reduce, dim=args.dim,
+            pq_subvectors=args.pq_subvectors, rescore_candidates=args.rescore
+        )
+        out_dir = args.out or NUMPY_INDEX_DIR
+        if args.shard_by_act:
+            built = create_sharded_numpy_index(out_dir, compression=compression, model_name=args.model,
+                                               batch_size=args.batch_size, only=args.only)
+        else:
+            built = create_numpy_index(out_dir, compression=compression,
+                                       model_name=args.model, batch_size=args.batch_size)
+    else:
+        out_dir = args.out or VECTORSTORE_DIR
+        if args.shard_by_act:
+            built = create_sharded_vector_store(out_dir, batch_size=args.batch_size,
+                                                model_name=args.model, only=args.only)
+        else:
+            built = create_vector_store(out_dir, batch_size=args.batch_size, model_name=args.model)
+
+    if not built:
+        sys.exit(1)
+    # Defined terms for the backend's /define and "what does X mean" fast path
+    print(f"📖 {write_definitions(PROCESSED_DIR, DATA_DIR / DEFINITIONS_FILE)} definitions written to "
+          f"{DATA_DIR / DEFINITIONS_FILE}")
+    if args.publish:
+        publish_snapshot(out_dir, args.backend, args.model, version=args.snapshot_version)
@@ -1,17 +1,47 @@
 # backend/main.py
 import os
 import re
+import sys
+import time
+import signal
+import inspect
+import threading
+import tracemalloc
 from pathlib import Path
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, HTTPException, Request, Depends
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
-from typing import List, Dict
+from typing import List, Dict, Optional
 import chromadb
 from google import genai
 from fastapi.middleware.cors import CORSMiddleware
 
+# Make the project root importable when launched as `uvicorn main:app` from backend/
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from backend.vector_engine import load_numpy_index, clause_key
+from backend.snapshots import IndexHolder, SnapshotWatcher, LoadedIndex
+from backend.shards import ShardedIndex, is_sharded, open_sharded_index
+from backend.admin import require_admin, ADMIN_TOKEN_HEADER
+from backend.memstats import smaps_rollup, process_tree_report
+from backend.admission import AdmissionController, Overloaded
+from backend.caches import TTLCache, normalize_query
+from backend.sessions import make_session_store, valid_session_id, classify_follow_up, make_turn, merge_sources
+from backend.prompt_cache import make_prompt_cache, HotClauses, format_clause
+from backend.static_assets import StaticIndex, MIN_COMPRESS_BYTES
+from backend.query_log import make_query_logger, timed
+from backend.prewarm import seed_caches
+from backend.citations import ProvisionIndex, MAX_CITED_CLAUSES, provision_unit
+from backend.definitions import DefinitionIndex, load_definitions
+from backend.memory_governor import make_memory_governor
+from backend.hnsw import HnswParams
+from backend.extractive import ExtractiveAnswerer
+from backend.profiling import (profile_call, ContinuousProfiler, list_profiles, start_tracemalloc,
+                               allocation_report)
+
 # ---- Environment and setup ----
 load_dotenv()
 API_KEY = os.getenv("GEMINI_API_KEY")
@@ -24,9 +54,28 @@ BASE_DIR = Path(__file__).resolve().parent
 VECTORSTORE_DIR = BASE_DIR.parent / "chroma_db"
 COLLECTION_NAME = "legal_docs"
 
+# Retrieval backend: "chroma" (persistent HNSW) or "numpy" (memory-mapped exact search)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").strip().lower()
+NUMPY_INDEX_DIR = Path(os.getenv("NUMPY_INDEX_DIR", str(BASE_DIR.parent / "numpy_index")))
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Prebuilt index snapshots (see backend/snapshots.py). INDEX_SNAPSHOT is a version or
+# "latest"; when set it takes precedence over VECTOR_BACKEND's on-disk index.
+INDEX_SNAPSHOT = os.getenv("INDEX_SNAPSHOT", "").strip()
+SNAPSHOTS_DIR = Path(os.getenv("SNAPSHOTS_DIR", str(BASE_DIR.parent / "snapshots")))
+SNAPSHOT_CACHE_DIR = Path(os.getenv("SNAPSHOT_CACHE_DIR", str(BASE_DIR.parent / "index_cache")))
+SNAPSHOT_WATCH_SECONDS = float(os.getenv("SNAPSHOT_WATCH_SECONDS", "0"))
+
+# Profiling (admin only). TRACEMALLOC=<frames> traces allocations from import time, so the
+# encoder and index loads are attributed; PROFILE_CONTINUOUS=1 writes sampled stacks to PROFILE_DIR.
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", str(BASE_DIR.parent / "profiles")))
+PROFILE_CONTINUOUS = os.getenv("PROFILE_CONTINUOUS", "0") == "1"
+if int(os.getenv("TRACEMALLOC", "0") or 0) > 0:
+    start_tracemalloc(int(os.getenv("TRACEMALLOC")))
+
 app = FastAPI(
     title="MyPocketLawyer - Legal Assistant (Stateless)",
-    description="Gemini-powered stateless legal assistant using Chroma for retrieval.",
+    description="Gemini-powered legal assistant using Chroma for retrieval. Stateless unless a session_id is sent.",
     version="3.0.0"
 )
 
@@ -37,36 +86,128 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# JSON API responses (sources lists get large). Static files arrive already compressed; the
+# thresholds match backend/static_assets.py so their identity variants are never re-encoded.
+if "exclude_content_types" in inspect.signature(GZipMiddleware.__init__).parameters:
+    from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES
+    app.add_middleware(GZipMiddleware, minimum_size=MIN_COMPRESS_BYTES,
+                       exclude_content_types=DEFAULT_EXCLUDED_CONTENT_TYPES + ("image/*",))
+else:
+    # Older Starlette has no content-type exclusions; it still passes responses that already
+    # carry a Content-Encoding through untouched, so only incompressible identity assets are re-encoded
+    app.add_middleware(GZipMiddleware, minimum_size=MIN_COMPRESS_BYTES)
 
 # ---------- Request model ----------
 class ChatRequest(BaseModel):
     query: str
     k: int = 8
+    # Client's time budget; requests that cannot be answered in time are rejected early
+    deadline_ms: Optional[int] = None
+    # Optional client-generated id (8-64 chars of [A-Za-z0-9_-]) enabling follow-up questions
+    session_id: Optional[str] = None
+    # "fast": no LLM calls, the answer is quoted from the retrieved clauses (backend/extractive.py)
+    mode: Optional[str] = None
+
+
+# ---------- Admission control & caches ----------
+admission = AdmissionController()
+rewrite_cache = TTLCache("rewrite", maxsize=4096, ttl=float(os.getenv("REWRITE_CACHE_TTL", "86400")))
+retrieval_cache = TTLCache("retrieval", maxsize=2048, ttl=float(os.getenv("RETRIEVAL_CACHE_TTL", "3600")))
+answer_cache = TTLCache("answer", maxsize=1024, ttl=float(os.getenv("ANSWER_CACHE_TTL", "3600")))
+session_store = make_session_store(BASE_DIR.parent / "data" / "sessions.sqlite3")
+# Static prompt prefixes (and the most retrieved clauses) are sent as provider-side cached content
+prompt_cache = make_prompt_cache(client)
+# Off by default: pinned clauses put unrelated provisions in front of the model on every answer
+hot_clauses = HotClauses(top_n=int(os.getenv("HOT_CLAUSES", "0")))
+# Every /chat outcome, for backend/prewarm.py (QUERY_LOG=0 disables)
+query_logger = make_query_logger(BASE_DIR.parent / "data" / "query_log")
+FAQ_STORE = Path(os.getenv("FAQ_STORE", str(BASE_DIR.parent / "data" / "faq_answers.json")))
+FAQ_TTL = float(os.getenv("FAQ_TTL", "86400"))
+# RSS budget (MEMORY_BUDGET_MB) with cache eviction and idle unloading, see backend/memory_governor.py
+memory_governor = make_memory_governor()
+ENCODER_IDLE_UNLOAD_S = float(os.getenv("ENCODER_IDLE_UNLOAD_S", "0"))
+CHROMA_IDLE_UNLOAD_S = float(os.getenv("CHROMA_IDLE_UNLOAD_S", "0"))
+# Answer extractively instead of shedding when the generation pool is full (EXTRACTIVE_ON_OVERLOAD=0 sheds)
+EXTRACTIVE_ON_OVERLOAD = os.getenv("EXTRACTIVE_ON_OVERLOAD", "1") == "1"
+# Explicit citations ("Section 47 of the Labour Act") are looked up directly (CITATION_LOOKUP=0 disables)
+PROCESSED_DIR = Path(os.getenv("PROCESSED_DIR", str(BASE_DIR.parent / "processeddata")))
+CITATION_LOOKUP = os.getenv("CITATION_LOOKUP", "1") == "1"
+# "What does X mean" questions are answered from the Acts' definitions articles (DEFINITION_LOOKUP=0
+# disables); DEFINITION_DIRECT=0 still sends a uniquely defined term through the LLM
+DEFINITIONS_PATH = Path(os.getenv("DEFINITIONS_PATH", str(BASE_DIR.parent / "data" / "definitions.json")))
+DEFINITION_LOOKUP = os.getenv("DEFINITION_LOOKUP", "1") == "1"
+DEFINITION_DIRECT = os.getenv("DEFINITION_DIRECT", "1") == "1"
+
+# Number of reverse proxies in front of the backend that append to X-Forwarded-For (0: use the peer address)
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+
+def client_identity(request: Request) -> str:
+    """
+    Rate-limit key: the address the outermost trusted proxy saw, else the peer address.
+    Only the right-hand TRUSTED_PROXY_HOPS entries of X-Forwarded-For were written by our proxies;
+    anything to their left (and X-Client-Id style headers) is client-controlled.
+    """
+    if TRUSTED_PROXY_HOPS > 0:
+        hops = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+        if len(hops) >= TRUSTED_PROXY_HOPS:
+            return hops[-TRUSTED_PROXY_HOPS]
+    return request.client.host if request.client else "unknown"
 
 
 # ---------- Embedding helper ----------
-# Lazy-load embedding model to reduce startup memory usage
-embedding_model = None
-
-def get_embedding_model():
-    """Lazy-load the embedding model only when needed"""
-    global embedding_model
-    if embedding_model is None:
-        print("🔄 Loading embedding model on CPU...")
-        from langchain_huggingface import HuggingFaceEmbeddings
-        # Use a smaller, more memory-efficient model
-        embedding_model = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2",
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True}
-        )
-    return embedding_model
+# Lazy-load embedding model to reduce startup memory usage.
+# Keyed by model name so a snapshot built with another encoder can be warmed before it goes live.
+embedding_models = {}
+
+def get_embedding_model_name() -> str:
+    """The query encoder must match the one the index was built with."""
+    if os.getenv("EMBEDDING_MODEL"):
+        return os.getenv("EMBEDDING_MODEL")
+    if index_holder is not None:
+        snapshot = index_holder.current()
+        if snapshot is not None and snapshot.embedding_model:
+            return snapshot.embedding_model
+    elif VECTOR_BACKEND == "numpy":
+        index = get_numpy_index()
+        if index.embedding_model:
+            return index.embedding_model
+    # Use a smaller, more memory-efficient model
+    return DEFAULT_EMBEDDING_MODEL
 
-def get_query_embedding(text: str):
+embedding_lock = threading.Lock()
+
+def get_embedding_model(model_name: str = None):
+    """Lazy-load the embedding model only when needed (again after the memory governor unloaded it)"""
+    model_name = model_name or get_embedding_model_name()
+    model = embedding_models.get(model_name)
+    if model is None:
+        with embedding_lock:
+            if model_name not in embedding_models:
+                print(f"🔄 Loading embedding model {model_name} on CPU...")
+                from langchain_huggingface import HuggingFaceEmbeddings
+                with memory_governor.loading("encoder"):
+                    embedding_models[model_name] = HuggingFaceEmbeddings(
+                        model_name=model_name,
+                        model_kwargs={'device': 'cpu'},
+                        encode_kwargs={'normalize_embeddings': True}
+                    )
+            model = embedding_models[model_name]
+    return model
+
+def get_query_embedding(text: str, model_name: str = None):
     # Use the local model to get query embedding
-    model = get_embedding_model()
+    model = get_embedding_model(model_name)
+    memory_governor.touch("encoder")
     return model.embed_query(text)
 
+# No-LLM answers from the retrieved clauses: the outage fallback and mode="fast"
+extractive_answerer = ExtractiveAnswerer(
+    embed_documents=lambda texts: get_embedding_model().embed_documents(texts),
+    embed_query=get_query_embedding,
+    # Encoders differ in how similar unrelated text looks; raise it for bge-style models
+    min_score=float(os.getenv("EXTRACTIVE_MIN_SCORE", "0.35")),
+)
+
 
 # ---------- Small-talk guard ----------
 SMALL_TALK = {
@@ -81,8 +222,8 @@ def is_small_talk(query: str) -> bool:
 
 
 # ---------- Classification & Query Rewriting ----------
-def classify_and_rewrite_query(query: str) -> (bool, str):
-    prompt = f"""
+# Static prefix first, query last: the prefix can be served from the prompt cache
+CLASSIFY_INSTRUCTIONS = """
 You are a legal query processing agent for a Nepali law RAG system. Perform TWO tasks:
 
 **TASK 1: DOMAIN CLASSIFICATION**
@@ -98,18 +239,17 @@ Include: jurisdiction (Nepal), legal topic, and core intent.
 **OUTPUT FORMAT:**
 IS_LEGAL: [YES/NO]
 REWRITTEN_QUERY: [rewritten query or "N/A" if non-legal]
+"""
 
+def classify_and_rewrite_query(query: str) -> (bool, str):
+    suffix = f"""
 **USER QUERY:**
 {query}
 
 **YOUR RESPONSE:**
 """
     try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt
-        )
-        result_text = (response.text or "").strip()
+        result_text = (prompt_cache.generate("gemini-2.5-flash", "classify", CLASSIFY_INSTRUCTIONS, suffix) or "").strip()
 
         is_legal = False
         rewritten_query = ""
@@ -135,46 +275,223 @@ REWRITTEN_QUERY: [rewritten query or "N/A" if non-legal]
 
 
 # ---------- Retrieval ----------
-def retrieve_top_k(rewritten_query: str, k: int = 4):
-    client_chroma = chromadb.PersistentClient(path=str(VECTORSTORE_DIR))
+# Both stores are opened once per process instead of on every request.
+chroma_collection = None
+numpy_index = None
+
+def get_chroma_collection():
+    global chroma_collection
+    if chroma_collection is None:
+        if is_sharded(VECTORSTORE_DIR):
+            # Built with ingest.py --shard-by-act: one collection per Act
+            chroma_collection = open_sharded_index(VECTORSTORE_DIR)
+            return chroma_collection
+        client_chroma = chromadb.PersistentClient(path=str(VECTORSTORE_DIR))
+        try:
+            chroma_collection = client_chroma.get_collection(name=COLLECTION_NAME)
+        except Exception:
+            raise HTTPException(status_code=404, detail=f"Collection '{COLLECTION_NAME}' not found.")
+        # Chroma applies the HNSW settings stored on the collection (see backend/tune_hnsw.py)
+        hnsw = HnswParams.from_metadata(chroma_collection.metadata)
+        print(f"🔧 HNSW: {hnsw.label() if hnsw else 'Chroma defaults'}")
+    return chroma_collection
+
+def get_numpy_index():
+    global numpy_index
+    if numpy_index is None:
+        if is_sharded(NUMPY_INDEX_DIR):
+            numpy_index = open_sharded_index(NUMPY_INDEX_DIR)
+            return numpy_index
+        numpy_index = load_numpy_index(NUMPY_INDEX_DIR)
+        if numpy_index is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"NumPy index not found at {NUMPY_INDEX_DIR}. Run 'python backend/ingest.py --backend numpy'."
+            )
+        print(f"📦 Loaded NumPy index: {numpy_index.size} rows x {numpy_index.dim} ({numpy_index.compression.label()})")
+    return numpy_index
+
+def format_source(doc: str, meta: Dict) -> Dict:
+    return {
+        "text": doc,
+        "document_title": meta.get("document_title", "Unknown"),
+        "part_number": meta.get("part_number", ""),
+        "part_title": meta.get("part_title", ""),
+        "article_number": meta.get("article_number", ""),
+        "article_title": meta.get("article_title", ""),
+        "clause_index": meta.get("clause_index", ""),
+        "section": meta.get("section", "")
+    }
+
+# Built before the pre-fork so every worker shares it; the processed JSONs ship with the image
+provision_index = None
+if CITATION_LOOKUP and PROCESSED_DIR.exists():
+    provision_index = ProvisionIndex.build(PROCESSED_DIR, source_fn=format_source)
+    print(f"📑 Provision index: {provision_index.stats()}")
+definition_index = None
+if DEFINITION_LOOKUP:
+    definition_index = DefinitionIndex(load_definitions(DEFINITIONS_PATH, PROCESSED_DIR), source_fn=format_source)
+    print(f"📖 Definition index: {definition_index.stats()}")
+
+# ---------- Snapshot hot-swap ----------
+def prepare_snapshot(snapshot: LoadedIndex):
+    """Runs before a snapshot goes live: warm its encoder and drop encoders no longer needed."""
+    if os.getenv("EMBEDDING_MODEL"):
+        return
+    model_name = snapshot.embedding_model or DEFAULT_EMBEDDING_MODEL
+    get_embedding_model(model_name)
+    for name in list(embedding_models):
+        if name != model_name:
+            embedding_models.pop(name, None)
+    # Cached sentence embeddings belong to the previous encoder
+    extractive_answerer.clear()
+
+index_holder = None
+snapshot_watcher = None
+if INDEX_SNAPSHOT:
+    index_holder = IndexHolder(SNAPSHOTS_DIR, SNAPSHOT_CACHE_DIR, prepare=prepare_snapshot)
     try:
-        collection = client_chroma.get_collection(name=COLLECTION_NAME)
-    except Exception:
-        raise HTTPException(status_code=404, detail=f"Collection '{COLLECTION_NAME}' not found.")
+        index_holder.swap_to(None if INDEX_SNAPSHOT == "latest" else INDEX_SNAPSHOT)
+    except Exception as e:
+        print(f"⚠️ Could not load index snapshot '{INDEX_SNAPSHOT}': {e}")
+
+@app.on_event("startup")
+def start_snapshot_watcher():
+    # Started per server process: threads do not survive the pre-fork in backend/serve.py
+    global snapshot_watcher
+    if index_holder is not None and SNAPSHOT_WATCH_SECONDS > 0 and snapshot_watcher is None:
+        snapshot_watcher = SnapshotWatcher(index_holder, SNAPSHOT_WATCH_SECONDS)
+        snapshot_watcher.start()
 
-    query_emb = get_query_embedding(rewritten_query)
+@app.on_event("startup")
+def load_faq_answers():
+    """Seed the caches from backend/prewarm.py's FAQ store (per worker, after the index is loaded)."""
+    seeded = seed_caches(FAQ_STORE, current_index_version(), rewrite_cache, retrieval_cache, answer_cache, FAQ_TTL,
+                         route=shard_route)
+    if seeded:
+        print(f"🔥 Prewarmed caches with {seeded} FAQ answers from {FAQ_STORE}")
+    return seeded
+
+# ---------- Memory governor ----------
+def release_chroma_collection():
+    """Drop the collection (and chromadb's cached clients); get_chroma_collection reopens it."""
+    global chroma_collection
+    chroma_collection = None
+    try:
+        from chromadb.api.client import SharedSystemClient
+        SharedSystemClient.clear_system_cache()
+    except (ImportError, AttributeError):
+        pass
 
-    results = collection.query(
+def store_footprint_mb(store) -> float:
+    if isinstance(store, ShardedIndex):
+        return sum(store_footprint_mb(shard.store) for shard in store.shards.values())
+    footprint = getattr(store, "footprint", None)
+    return sum(footprint().values()) / 1024 / 1024 if footprint else 0.0
+
+def hnsw_files_mb(directory: Path) -> float:
+    # Chroma keeps each HNSW segment's .bin files in memory once the collection is queried
+    return sum(p.stat().st_size for p in directory.glob("**/*.bin")) / 1024 / 1024
+
+def live_store():
+    if index_holder is not None:
+        snapshot = index_holder.current()
+        return snapshot.store if snapshot is not None else None
+    return numpy_index if VECTOR_BACKEND == "numpy" else chroma_collection
+
+# Cheapest to rebuild first: sentence embeddings and a retrieval are local encoder work, a rewrite a Flash call, an answer a Pro call
+for cost, cache in enumerate((extractive_answerer.sentence_cache, retrieval_cache, rewrite_cache, answer_cache)):
+    memory_governor.register(f"{cache.name}_cache", "cache", cost=cost,
+                             size_mb=lambda cache=cache: cache.approx_bytes() / 1024 / 1024,
+                             release=lambda cache=cache: cache.trim(0.5))
+if index_holder is None and VECTOR_BACKEND == "chroma":
+    memory_governor.register("index", "index", cost=5, idle_s=CHROMA_IDLE_UNLOAD_S,
+                             size_mb=lambda: hnsw_files_mb(VECTORSTORE_DIR),
+                             loaded=lambda: chroma_collection is not None, release=release_chroma_collection)
+else:
+    # Memory-mapped: clean pages the kernel can drop by itself, so tracked but never released
+    memory_governor.register("index", "index", size_mb=lambda: store_footprint_mb(live_store()),
+                             loaded=lambda: live_store() is not None)
+memory_governor.register("encoder", "model", cost=10, idle_s=ENCODER_IDLE_UNLOAD_S,
+                         loaded=lambda: bool(embedding_models), release=embedding_models.clear)
+
+@app.on_event("startup")
+def start_memory_governor():
+    memory_governor.start()
+
+continuous_profiler = None
+
+@app.on_event("startup")
+def start_continuous_profiler():
+    global continuous_profiler
+    if PROFILE_CONTINUOUS and continuous_profiler is None:
+        continuous_profiler = ContinuousProfiler(
+            PROFILE_DIR,
+            interval_s=float(os.getenv("PROFILE_INTERVAL_MS", "20")) / 1000,
+            window_s=float(os.getenv("PROFILE_WINDOW_S", "60")),
+            keep=int(os.getenv("PROFILE_KEEP", "120")),
+        )
+        continuous_profiler.start()
+
+def get_live_snapshot() -> LoadedIndex:
+    snapshot = index_holder.current()
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail=f"No index snapshot loaded from {SNAPSHOTS_DIR}.")
+    return snapshot
+
+def search_store(backend: str, store, query_emb, k: int, query_text: str = "", report: Optional[Dict] = None):
+    if isinstance(store, ShardedIndex):
+        # Fan out to the Acts the query names (or all of them) and merge by score
+        return [format_source(hit["text"], hit["metadata"]) for hit in store.search(query_emb, k, query_text, report)]
+    if backend == "numpy":
+        return [format_source(hit["text"], hit["metadata"]) for hit in store.search(query_emb, k)]
+
+    results = store.query(
         query_embeddings=[query_emb],
         n_results=k
     )
+    return [format_source(doc, meta) for doc, meta in zip(results["documents"][0], results["metadatas"][0])]
+
+def shard_route(route_text: str) -> tuple:
+    """Acts the user's own text names: they narrow a sharded search, so they are part of the retrieval key."""
+    store = live_store()
+    return tuple(sorted(set(store.matcher.find(route_text)))) if isinstance(store, ShardedIndex) else ()
 
-    output = []
-    for doc, meta in zip(results["documents"][0], results["metadatas"][0]):
-        output.append({
-            "text": doc,
-            "document_title": meta.get("document_title", "Unknown"),
-            "part_number": meta.get("part_number", ""),
-            "part_title": meta.get("part_title", ""),
-            "article_number": meta.get("article_number", ""),
-            "article_title": meta.get("article_title", ""),
-            "clause_index": meta.get("clause_index", "")
-        })
-    return output
+def retrieve_top_k(rewritten_query: str, k: int = 4, timings: Optional[Dict] = None, route_text: str = ""):
+    # Embeds the rewrite; a sharded index is narrowed only by the Acts `route_text` (the user's
+    # words, never the LLM rewrite) names. Per-shard latencies land in timings["shards"]
+    report = {} if timings is not None else None
+    memory_governor.touch("index")
+    if index_holder is not None:
+        # One reference for the whole request: a concurrent swap cannot change it mid-search
+        snapshot = get_live_snapshot()
+        query_emb = get_query_embedding(rewritten_query, snapshot.embedding_model or None)
+        sources = search_store(snapshot.backend, snapshot.store, query_emb, k, route_text, report)
+    elif VECTOR_BACKEND == "numpy":
+        sources = search_store("numpy", get_numpy_index(), get_query_embedding(rewritten_query), k,
+                               route_text, report)
+    else:
+        collection = get_chroma_collection()
+        query_emb = get_query_embedding(rewritten_query)
+        sources = search_store("chroma", collection, query_emb, k, route_text, report)
+    if report:
+        timings["shards"] = report
+    return sources
+
+
+def warm_up():
+    """Load the index and query encoder now rather than on the first request (pre-fork preload)."""
+    if index_holder is None and VECTOR_BACKEND == "numpy":
+        get_numpy_index()
+    # Chroma's client keeps SQLite handles that must not cross fork(), so with
+    # VECTOR_BACKEND=chroma each worker opens the collection on first use.
+    get_query_embedding("warm up")
 
 
 # ---------- Answer Generation ----------
-def generate_legal_answer(query: str, sources: list):
-    context_text = "\n\n".join([
-        f"📘 Document: {src['document_title']}\n"
-        f"Part {src['part_number']} – {src['part_title']}\n"
-        f"Article {src['article_number']}: {src['article_title']}\n"
-        f"Clause {src['clause_index']}\n"
-        f"Text: {src['text']}"
-        for src in sources
-    ])
+UNAVAILABLE_REPLY = "⚠️ Sorry, the AI legal assistant is temporarily unavailable. Please try again shortly."
 
-    prompt = f"""
+ANSWER_INSTRUCTIONS = """
 You are MyPocketLawyer — an AI legal assistant specialized in Nepali law.
 
 Use the retrieved context to answer the user's question as accurately as possible.
@@ -189,65 +506,235 @@ Instructions:
     * **Factual/definitional questions**: summarize context.
     * **Action/procedure questions**: provide practical steps only if supported by context, or suggest reasonable actions using logical reasoning.
 - If context is insufficient to answer, clearly state: "Based on the retrieved legal documents, there is no information directly answering this question, but logically…"
-
-Question:
-{query}
-
-Retrieved Context:
-{context_text}
+- Only the provisions listed under "Retrieved Context" are relevant to the question.
 
 Answer format:
 - **Short Answer**: summary from retrieved context
 - **What the Law Says**: cite relevant context; omit if not available
 - **Logical Reasoning / Practical Steps**: clearly indicate if based on reasoning rather than context
+"""
+
+def generate_legal_answer(query: str, sources: list, history: Optional[List[Dict]] = None):
+    # Frequently retrieved clauses live in the cached prefix; the context only points at them
+    hot_clauses.record(sources, current_index_version())
+    hot_block, pinned = hot_clauses.pinned_for(sources)
+    context_text = "\n\n".join([
+        f"[{pinned[clause_key(src)]}] {src['document_title']}, Article {src['article_number']}, "
+        f"Clause {src['clause_index']} (full text in the reference library)"
+        if clause_key(src) in pinned else format_clause(src)
+        for src in sources
+    ])
+
+    # Follow-ups in a session: the last turns give pronouns like "that" their referent
+    conversation_text = ""
+    if history:
+        conversation_text = "Earlier in this conversation:\n" + "\n".join(
+            f"- User asked: {turn['query']}\n  You answered (excerpt): {turn['answer'][:300]}"
+            for turn in history[-2:]
+        ) + "\n\n"
+
+    prefix = ANSWER_INSTRUCTIONS + hot_block
+    suffix = f"""
+{conversation_text}Question:
+{query}
+
+Retrieved Context:
+{context_text}
 """
 
     try:
         # Primary model (Pro)
-        response = client.models.generate_content(
-            model="gemini-2.5-pro",
-            contents=prompt
-        )
-        return response.text
+        return prompt_cache.generate("gemini-2.5-pro", "answer", prefix, suffix)
 
     except Exception as e:
         print(f"⚠️ gemini-2.5-pro failed: {e}")
         try:
             # Fallback to Flash
-            response = client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=prompt
-            )
-            return response.text
+            return prompt_cache.generate("gemini-2.5-flash", "answer", prefix, suffix)
         except Exception as e2:
             print(f"❌ Both models failed: {e2}")
-            return "⚠️ Sorry, the AI legal assistant is temporarily unavailable. Please try again shortly."
+            return UNAVAILABLE_REPLY
 
 # ---------- Routes ----------
 @app.get("/api/health")
 def health_check():
     return {"status": "ok", "message": "MyPocketLawyer backend is live."}
 
-# Mount static files (JS, CSS, images)
-# We mount them at the root or /assets depending on how Vite builds.
-# Usually Vite puts assets in dist/assets. 
-# We'll serve the entire 'dist' folder as static, but we need to handle the index.html fallback for SPA.
+@app.get("/api/admission")
+def admission_stats():
+    """Queue depth, wait and service times per stage, shed counts and cache hit rates (incl. prompt cache)."""
+    return {
+        **admission.stats(),
+        "caches": {c.name: c.stats() for c in (rewrite_cache, retrieval_cache, answer_cache)},
+        "sessions": session_store.stats(),
+        "prompt_cache": {**prompt_cache.stats(), "hot_clauses": hot_clauses.stats()},
+        "query_log": query_logger.stats() if query_logger else None,
+        "extractive": extractive_answerer.stats(),
+    }
+
+@app.delete("/api/sessions/{session_id}")
+def delete_session(session_id: str):
+    if not valid_session_id(session_id):
+        raise HTTPException(status_code=400, detail="Invalid session_id.")
+    session_store.delete(session_id)
+    return {"deleted": session_id}
+
+@app.get("/api/memory", dependencies=[Depends(require_admin)])
+def memory_report():
+    """This process's shared vs. private memory; under backend/serve.py, every worker's too."""
+    report = {"pid": os.getpid(), "process": smaps_rollup(), "governor": memory_governor.stats()}
+    master_pid = int(os.getenv("MPL_MASTER_PID", "0"))
+    if master_pid:
+        report["server"] = process_tree_report(master_pid)
+    return report
+
+@app.post("/api/admin/memory/relieve", dependencies=[Depends(require_admin)])
+def memory_relieve(target_mb: Optional[float] = None):
+    """Release caches and idle models now, down to target_mb (default: the low-water mark)."""
+    if target_mb is None and not memory_governor.budget_mb:
+        raise HTTPException(status_code=400, detail="No MEMORY_BUDGET_MB set: pass target_mb.")
+    freed = memory_governor.relieve(target_mb, reason="admin")
+    return {"freed_mb": round(freed, 1), **memory_governor.stats()}
+
+last_allocation_snapshot = None
+
+@app.post("/api/admin/memory/tracemalloc", dependencies=[Depends(require_admin)])
+def tracemalloc_start(frames: int = 1):
+    """Start allocation tracing (costs memory and CPU until stopped)."""
+    return {"started": start_tracemalloc(max(1, min(frames, 25))), "tracing": tracemalloc.is_tracing()}
+
+@app.delete("/api/admin/memory/tracemalloc", dependencies=[Depends(require_admin)])
+def tracemalloc_stop():
+    global last_allocation_snapshot
+    last_allocation_snapshot = None
+    tracemalloc.stop()
+    return {"tracing": False}
+
+@app.get("/api/admin/memory/allocations", dependencies=[Depends(require_admin)])
+def memory_allocations(top: int = 25, group_by: str = "package", diff: bool = False):
+    """Top Python allocation sites; diff=true reports growth since the previous call."""
+    global last_allocation_snapshot
+    if not tracemalloc.is_tracing():
+        raise HTTPException(status_code=409, detail="tracemalloc is off: POST /api/admin/memory/tracemalloc "
+                            "or start with TRACEMALLOC=1.")
+    if group_by not in ("lineno", "filename", "package"):
+        raise HTTPException(status_code=400, detail="group_by must be lineno, filename or package.")
+    report, last_allocation_snapshot = allocation_report(
+        top, group_by, baseline=last_allocation_snapshot if diff else None)
+    return {**report, "process": smaps_rollup()}
+
+PROFILE_NAME_RE = re.compile(r"^[0-9]+-[0-9T]+\.collapsed$")
+
+@app.get("/api/admin/profiles", dependencies=[Depends(require_admin)])
+def profiles_index():
+    return {"continuous": continuous_profiler.stats() if continuous_profiler else None,
+            "profiles": list_profiles(PROFILE_DIR)}
+
+@app.get("/api/admin/profiles/{name}", dependencies=[Depends(require_admin)])
+def profile_file(name: str):
+    """One window of collapsed stacks (feed to flamegraph.pl or speedscope)."""
+    path = PROFILE_DIR / name
+    if not PROFILE_NAME_RE.match(name) or not path.is_file():
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    return PlainTextResponse(path.read_text(encoding="utf-8"))
+
+@app.post("/api/admin/prewarm", dependencies=[Depends(require_admin)])
+def reload_faq_answers():
+    """Re-read the FAQ store into this worker's caches (run after backend/prewarm.py)."""
+    return {"seeded": load_faq_answers(), "store": str(FAQ_STORE)}
+
+class ReloadRequest(BaseModel):
+    version: str = None
 
+@app.get("/api/admin/index", dependencies=[Depends(require_admin)])
+def index_status():
+    """Live index; for a sharded one also the per-shard search latency."""
+    if index_holder is None:
+        store = numpy_index if VECTOR_BACKEND == "numpy" else chroma_collection
+        status = {"snapshots": False, "backend": VECTOR_BACKEND}
+    else:
+        snapshot = index_holder.current()
+        store = snapshot.store if snapshot is not None else None
+        status = {"snapshots": True, **index_holder.describe()}
+    if isinstance(store, ShardedIndex):
+        status["sharding"] = store.stats()
+    elif store is not None and hasattr(store, "metadata"):
+        hnsw = HnswParams.from_metadata(store.metadata)
+        status["hnsw"] = hnsw.to_dict() if hnsw else "chroma defaults"
+    return status
+
+@app.post("/api/admin/index/reload", status_code=202, dependencies=[Depends(require_admin)])
+def reload_index(req: ReloadRequest = None):
+    """Load a snapshot (default: latest) in the background and swap it in when ready."""
+    if index_holder is None:
+        raise HTTPException(status_code=409, detail="Snapshot serving is off; set INDEX_SNAPSHOT.")
+    version = req.version if req else None
+    master_pid = int(os.getenv("MPL_MASTER_PID", "0"))
+    if master_pid:
+        # Under backend/serve.py every worker must swap: SIGHUP makes the master tell them all to load latest
+        if version is not None:
+            raise HTTPException(status_code=409, detail="Multi-worker server: promote the version "
+                                "with backend/snapshots.py, then reload without a version.")
+        os.kill(master_pid, signal.SIGHUP)
+    else:
+        index_holder.swap_in_background(version)
+    return {"accepted": True, "requested": version or "latest", **index_holder.describe()}
+
+@app.get("/provision")
+def provision_lookup(q: Optional[str] = None, document: Optional[str] = None, article: Optional[str] = None,
+                     clause: str = ""):
+    """
+    Exact clauses of a provision, either from a free-text citation (?q=Section 47(2) of the
+    Labour Act) or structured (?document=labour act&article=47&clause=2).
+    """
+    if provision_index is None:
+        raise HTTPException(status_code=503, detail="Provision lookup is disabled.")
+    if q:
+        resolution = provision_index.resolve(q)
+    elif document and article:
+        resolution = provision_index.lookup(document, article, clause)
+    else:
+        raise HTTPException(status_code=400, detail="Pass q, or document and article.")
+    if not resolution.resolved:
+        raise HTTPException(status_code=404, detail=resolution.to_dict())
+    return {**resolution.to_dict(), "sources": resolution.sources}
+
+@app.get("/define")
+def define_term(term: str, document: Optional[str] = None):
+    """Definitions of a term, optionally only in one Act (title or alias)."""
+    if definition_index is None:
+        raise HTTPException(status_code=503, detail="Definition lookup is disabled.")
+    documents = None
+    if document:
+        documents = [document] if provision_index is None else provision_index.find_documents(document) or [document]
+    ids = definition_index.lookup(term, documents)
+    if not ids:
+        raise HTTPException(status_code=404, detail=f"No definition of '{term}' found.")
+    return {"term": term, "definitions": [definition_index.entry(i) for i in ids]}
+
+@app.get("/define/suggest")
+def suggest_terms(prefix: str, limit: int = 10):
+    """Autocomplete over the defined terms."""
+    if definition_index is None:
+        raise HTTPException(status_code=503, detail="Definition lookup is disabled.")
+    return {"prefix": prefix, "suggestions": definition_index.complete(prefix, max(1, min(limit, 50)))}
+
+# Built frontend: indexed and precompressed in memory once at startup (see backend/static_assets.py).
+# Registered last so the API routes above take precedence over the SPA catch-all.
 FRONTEND_DIST = BASE_DIR.parent / "frontend" / "dist"
 
 if FRONTEND_DIST.exists():
-    app.mount("/assets", StaticFiles(directory=str(FRONTEND_DIST / "assets")), name="assets")
-    
-    # Catch-all for SPA: serve index.html for any path not matching an API route or file
-    @app.get("/{full_path:path}")
-    async def serve_spa_or_static(full_path: str):
-        # Check if file exists in dist (e.g. favicon.ico, robot.txt)
-        file_path = FRONTEND_DIST / full_path
-        if file_path.is_file():
-            return FileResponse(file_path)
-        
-        # Otherwise, serve index.html
-        return FileResponse(FRONTEND_DIST / "index.html")
+    static_index = StaticIndex(FRONTEND_DIST)
+    print(f"📦 Frontend indexed: {static_index.stats()}")
+
+    @app.api_route("/{full_path:path}", methods=["GET", "HEAD"])
+    async def serve_spa_or_static(full_path: str, request: Request):
+        asset = static_index.lookup(full_path)
+        if asset is None:
+            raise HTTPException(status_code=404, detail="Not found")
+        return asset.respond(request.headers.get("accept-encoding", ""),
+                             request.headers.get("if-none-match"),
+                             head=request.method == "HEAD")
 else:
     print(f"⚠️ Frontend build not found at {FRONTEND_DIST}. Serving API only.")
     @app.get("/")
@@ -255,30 +742,304 @@ else:
         return {"message": "Backend live. Frontend build not found. Run 'npm run build' in frontend/."}
 
 
+def current_index_version() -> str:
+    """Part of retrieval/answer cache keys so a snapshot swap never serves stale sources."""
+    if index_holder is not None and index_holder.current() is not None:
+        return index_holder.current().version
+    return VECTOR_BACKEND
+
+NO_EXTRACTIVE_MATCH_REPLY = ("None of the retrieved legal provisions answers this question directly. Please "
+                             "rephrase it, or ask without fast mode for a full answer.")
+NON_LEGAL_REPLY = "I'm designed to assist only with Nepali law-related questions. Please ask about rights, duties, or constitutional matters."
+
+def classify_cached(query: str, deadline: Optional[float], timings: Optional[Dict] = None) -> (bool, str):
+    query_key = normalize_query(query)
+    classified = rewrite_cache.get(query_key)
+    if classified is None:
+        with timed(timings, "classification"), admission.stage("classification", deadline):
+            classified = classify_and_rewrite_query(query)
+        rewrite_cache.set(query_key, classified)
+    return classified
+
+
+def non_legal_result(req: ChatRequest) -> Dict:
+    return {"query": req.query, "rewritten_query": None, "answer": NON_LEGAL_REPLY, "sources": []}
+
+
+def answer_lookup(req: ChatRequest, query_key: str, deadline: Optional[float],
+                  timings: Optional[Dict] = None) -> Optional[Dict]:
+    """Explicit citations and definition questions, answered without a rewrite or vector search."""
+    if provision_index is not None:
+        with timed(timings, "citation"):
+            resolution = provision_index.resolve(req.query)
+        if resolution.resolved:
+            return answer_cited_query(req, resolution, query_key, deadline, timings)
+    if definition_index is not None:
+        with timed(timings, "definition"):
+            named = provision_index.find_documents(req.query) if provision_index is not None else []
+            matched = definition_index.match_question(req.query, named)
+        if matched:
+            return answer_definition_query(req, matched, query_key, deadline, timings)
+    return None
+
+
+def answer_legal_query(req: ChatRequest, deadline: Optional[float], timings: Optional[Dict] = None) -> Dict:
+    """The expensive path: classify/rewrite, retrieve, generate, each in its own admission pool."""
+    query_key = normalize_query(req.query)
+    result = answer_lookup(req, query_key, deadline, timings)
+    if result is not None:
+        return result
+
+    if req.mode == "fast":
+        # No LLM at all: an earlier classification is reused, else the question is searched as asked
+        # (compose_answer then refuses weak matches, which is what off-topic questions produce)
+        classified = rewrite_cache.get(query_key) or (True, req.query)
+    else:
+        classified = classify_cached(req.query, deadline, timings)
+    is_legal, rewritten_query = classified
+
+    if not is_legal:
+        return non_legal_result(req)
+
+    retrieval_key = (current_index_version(), normalize_query(rewritten_query), req.k, shard_route(req.query))
+    sources = retrieval_cache.get(retrieval_key)
+    if sources is None:
+        with timed(timings, "retrieval"), admission.stage("retrieval", deadline):
+            sources = retrieve_top_k(rewritten_query, req.k, timings, route_text=req.query)
+        retrieval_cache.set(retrieval_key, sources)
+
+    answer, extractive = compose_answer(req, sources, deadline, timings)
+    result = {"query": req.query, "rewritten_query": rewritten_query, "answer": answer, "sources": sources}
+    return finish_result(result, extractive, query_key, req)
+
+
+def compose_answer(req: ChatRequest, sources: List[Dict], deadline: Optional[float],
+                   timings: Optional[Dict] = None, history: Optional[List[Dict]] = None):
+    """
+    (answer, extractive): the LLM answer, or the extractive one for mode="fast", when both
+    models fail, or when the generation pool is full.
+    """
+    if req.mode != "fast":
+        try:
+            with timed(timings, "generation"), admission.stage("generation", deadline):
+                answer = generate_legal_answer(req.query, sources, history=history)
+            if answer != UNAVAILABLE_REPLY:
+                return answer, False
+        except Overloaded:
+            if not EXTRACTIVE_ON_OVERLOAD or not sources:
+                raise
+    with timed(timings, "extractive"):
+        answer = extractive_answerer.answer(req.query, sources)
+    if answer:
+        return answer, True
+    return (NO_EXTRACTIVE_MATCH_REPLY, True) if req.mode == "fast" else (UNAVAILABLE_REPLY, False)
+
+
+def answer_cache_key(query_key: str, req: ChatRequest) -> tuple:
+    # Per mode: a fast-mode answer (e.g. a direct definition) must not be served to normal requests
+    return (current_index_version(), query_key, req.k, req.mode)
+
+
+def finish_result(result: Dict, extractive: bool, query_key: str, req: ChatRequest) -> Dict:
+    # Only LLM answers are cached: an extractive one is cheap to redo and a better answer may come next time
+    if extractive:
+        result["extractive"] = True
+    elif result["answer"] != UNAVAILABLE_REPLY:
+        answer_cache.set(answer_cache_key(query_key, req), result)
+    return result
+
+
+def answer_cited_query(req: ChatRequest, resolution, query_key: str, deadline: Optional[float],
+                       timings: Optional[Dict] = None) -> Dict:
+    """An unambiguous citation: the cited clauses are the sources, no rewrite or vector search."""
+    sources = resolution.sources[:MAX_CITED_CLAUSES]
+    answer, extractive = compose_answer(req, sources, deadline, timings)
+    result = {"query": req.query, "rewritten_query": resolution.label(), "answer": answer, "sources": sources,
+              "citation": resolution.to_dict()}
+    return finish_result(result, extractive, query_key, req)
+
+
+def definition_reply(entry: Dict) -> str:
+    unit = provision_unit(entry["document_title"])
+    reference = f"{entry['document_title']}, {unit} {entry['article_number'].rstrip('.')}"
+    if entry["clause"]:
+        reference += f"({entry['clause']})"
+    return (f"**Short Answer**: \"{entry['term']}\" is defined in {reference}.\n\n"
+            f"**What the Law Says**: {entry['text']}")
+
+
+def answer_definition_query(req: ChatRequest, matched: Dict, query_key: str, deadline: Optional[float],
+                            timings: Optional[Dict] = None) -> Dict:
+    """
+    A defined term: its definition clauses are the sources, no rewrite or vector search. A term
+    defined in one Act is answered with the clause itself; several Acts go through generation.
+    """
+    ids = matched["ids"]
+    entries = [definition_index.entry(i) for i in ids]
+    sources = [definition_index.sources[i] for i in ids]
+    documents = sorted({entry["document_title"] for entry in entries})
+    rewritten_query = f"Meaning of \"{matched['term']}\"" + (f" under {documents[0]}" if len(documents) == 1 else "")
+
+    direct = (DEFINITION_DIRECT or req.mode == "fast") and len(entries) == 1
+    extractive = False
+    if direct:
+        answer = definition_reply(entries[0])
+    else:
+        answer, extractive = compose_answer(req, sources, deadline, timings)
+
+    result = {"query": req.query, "rewritten_query": rewritten_query, "answer": answer, "sources": sources,
+              "definition": {"term": matched["term"], "direct": direct, "definitions": entries}}
+    return finish_result(result, extractive, query_key, req)
+
+
+def answer_follow_up(req: ChatRequest, history: List[Dict], mode: str, deadline: Optional[float],
+                     timings: Optional[Dict] = None) -> Dict:
+    """
+    Follow-up in a session. "reuse" adds no new terms to the previous (legal) turn and answers
+    from the clauses already retrieved, without classification. "expand" brings new terms, so it
+    is classified together with the previous question (off-topic questions get the non-legal
+    reply), then retrieves for the rewrite and merges with the cached clauses.
+    """
+    last = history[-1]
+    rewritten_query = last["rewritten_query"]
+    sources = last["sources"]
+    if mode == "expand":
+        if req.mode == "fast":
+            rewritten_query = f"{last['rewritten_query']} {req.query.strip()}"
+        else:
+            is_legal, rewritten_query = classify_cached(
+                f"{req.query.strip()} (follow-up to: {last['rewritten_query']})", deadline, timings)
+            if not is_legal:
+                return non_legal_result(req)
+        with timed(timings, "retrieval"), admission.stage("retrieval", deadline):
+            fresh = retrieve_top_k(rewritten_query, req.k, timings, route_text=f"{last['query']} {req.query}")
+        sources = merge_sources(last["sources"], fresh, req.k)
+
+    answer, extractive = compose_answer(req, sources, deadline, timings, history=history)
+    result = {"query": req.query, "rewritten_query": rewritten_query, "answer": answer, "sources": sources}
+    if extractive:
+        result["extractive"] = True
+    return result
+
+
+def answer_chat(req: ChatRequest, history: List[Dict], follow_up: Optional[str], deadline: Optional[float],
+                timings: Optional[Dict] = None) -> Dict:
+    result = None
+    if follow_up:
+        # An explicit citation or definition question stands on its own ("what about Article 17?")
+        result = answer_lookup(req, normalize_query(req.query), deadline, timings)
+        if result is None:
+            result = {**answer_follow_up(req, history, follow_up, deadline, timings), "follow_up": follow_up}
+    if result is None:
+        result = answer_legal_query(req, deadline, timings)
+    remember_turn(req, result)
+    return result
+
+
+def remember_turn(req: ChatRequest, result: Dict):
+    # Only legal turns with context are worth following up on
+    if (req.session_id and result.get("rewritten_query")
+            and result["answer"] not in (UNAVAILABLE_REPLY, NO_EXTRACTIVE_MATCH_REPLY)):
+        session_store.append(req.session_id, make_turn(
+            req.query, result["rewritten_query"], result["sources"], result["answer"]))
+
+
+def log_query(req: ChatRequest, result: Optional[Dict], path: str, started: float,
+              timings: Optional[Dict] = None, status: int = 200):
+    if query_logger is None:
+        return
+    result = result or {}
+    query_logger.log({
+        "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "query": req.query,
+        "k": req.k,
+        "path": path,
+        "status": status,
+        "is_legal": bool(result.get("rewritten_query")),
+        "rewritten_query": result.get("rewritten_query"),
+        "clause_ids": [clause_key(src) for src in result.get("sources", [])],
+        "follow_up": result.get("follow_up"),
+        "citation": bool(result.get("citation")),
+        "index_version": current_index_version(),
+        "timings_ms": {**(timings or {}), "total": round(1000 * (time.perf_counter() - started), 1)},
+    })
+
+
 @app.post("/chat")
-def chat_endpoint(req: ChatRequest):
+async def chat_endpoint(req: ChatRequest, request: Request):
     if not req.query.strip():
         raise HTTPException(status_code=400, detail="Query text cannot be empty.")
-    try:
-        if is_small_talk(req.query):
-            generic_reply = "I'm designed to help with Nepali law. Please ask a legal question (e.g., rights, acts, courts)."
-            return {"query": req.query, "rewritten_query": None, "answer": generic_reply, "sources": []}
+    if req.session_id is not None and not valid_session_id(req.session_id):
+        raise HTTPException(status_code=400, detail="session_id must be 8-64 characters of [A-Za-z0-9_-].")
+    if req.mode not in (None, "fast"):
+        raise HTTPException(status_code=400, detail="mode must be \"fast\" or omitted.")
+    started = time.perf_counter()
 
-        is_legal, rewritten_query = classify_and_rewrite_query(req.query)
+    # Fast lane: answered on the event loop, without a worker thread or a pool slot
+    if is_small_talk(req.query):
+        admission.record_fast_lane()
+        generic_reply = "I'm designed to help with Nepali law. Please ask a legal question (e.g., rights, acts, courts)."
+        return {"query": req.query, "rewritten_query": None, "answer": generic_reply, "sources": []}
 
-        if not is_legal:
-            generic_reply = "I'm designed to assist only with Nepali law-related questions. Please ask about rights, duties, or constitutional matters."
-            return {"query": req.query, "rewritten_query": None, "answer": generic_reply, "sources": []}
+    # SQLite-backed sessions do disk I/O: keep it off the event loop
+    history = await run_in_threadpool(session_store.history, req.session_id) if req.session_id else []
+    follow_up = classify_follow_up(req.query, history)
+    session_fields = {"session_id": req.session_id, "follow_up": None} if req.session_id else {}
 
-        sources = retrieve_top_k(rewritten_query, req.k)
-        answer = generate_legal_answer(req.query, sources)
+    # Admin-only: sample this request's stacks and return them with the answer
+    profile = request.headers.get("x-profile", request.query_params.get("profile", "0")) not in ("", "0", "false")
+    if profile:
+        require_admin(request.headers.get(ADMIN_TOKEN_HEADER))
 
-        return {"query": req.query, "rewritten_query": rewritten_query, "answer": answer, "sources": sources}
+    if not profile:
+        query_key = normalize_query(req.query)
+        # A question already classified as non-legal is refused, follow-up or not
+        classified = rewrite_cache.get(query_key)
+        if classified is not None and not classified[0]:
+            admission.record_fast_lane()
+            log_query(req, None, "non_legal_cache", started)
+            return {**non_legal_result(req), **session_fields}
+        # Cached answers are context-free, so they never answer a follow-up (nor are they worth profiling)
+        cached = answer_cache.get(answer_cache_key(query_key, req)) if not follow_up else None
+        if cached is not None:
+            admission.record_fast_lane()
+            remember_turn(req, cached)
+            log_query(req, cached, "answer_cache", started)
+            return {**cached, "query": req.query, "cached": True, **session_fields}
 
+    deadline = admission.deadline_from(req.deadline_ms or request.headers.get("x-deadline-ms"))
+    timings = {}
+    path = "follow_up" if follow_up else "pipeline"
+    try:
+        with admission.request(client_identity(request)):
+            if profile:
+                result, profile_data = await run_in_threadpool(
+                    profile_call, answer_chat, req, history, follow_up, deadline, timings)
+                if req.session_id:
+                    session_fields["follow_up"] = result.pop("follow_up", None)
+                log_query(req, {**result, **session_fields}, path, started, timings)
+                return {**result, **session_fields, "profile": profile_data}
+            result = await run_in_threadpool(answer_chat, req, history, follow_up, deadline, timings)
+        follow_up = result.pop("follow_up", None)
+        if req.session_id:
+            session_fields["follow_up"] = follow_up
+        path = "follow_up" if follow_up else "pipeline"
+        if result.get("citation"):
+            path = "citation"
+        elif result.get("definition"):
+            path = "definition"
+        log_query(req, {**result, **session_fields}, path, started, timings)
+        return {**result, **session_fields}
+    except Overloaded as e:
+        log_query(req, None, "shed", started, timings, status=e.status_code)
+        return JSONResponse(status_code=e.status_code, content={"detail": f"Server busy ({e.reason}). Please retry."},
+                            headers={"Retry-After": str(e.retry_after)})
+    except HTTPException:
+        raise
     except Exception as e:
+        log_query(req, None, path, started, timings, status=500)
         raise HTTPException(status_code=500, detail=str(e))
 
-
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000)
@@ -0,0 +1,198 @@
+"""
+Memory governor for low-RAM hosts (e.g. a 512 MB instance).
+
+Resident components (query encoder, index, caches) are registered with a way
+to measure them and, optionally, to give memory back: caches are trimmed,
+the encoder and a Chroma collection are dropped and reloaded by the next
+request that needs them. A background thread compares this process's RSS
+with MEMORY_BUDGET_MB; above the high-water mark it releases components,
+cheapest to rebuild first, until RSS is back under the low-water mark.
+Separately, a component unused for longer than its idle timeout is unloaded
+(ENCODER_IDLE_UNLOAD_S, CHROMA_IDLE_UNLOAD_S).
+
+The budget is per process. Under backend/serve.py the encoder is loaded before
+the fork and shared copy-on-write: unloading it in a worker frees little and
+reloading gives that worker a private copy, so keep idle unloading off there.
+"""
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+from backend.memstats import current_rss_mb, release_freed_memory
+
+# Loaded components used more recently than this are not released under pressure
+# (they would be reloaded right away, raising the peak instead of lowering it)
+BUSY_GRACE_S = 30.0
+MAX_RELIEF_PASSES = 4
+
+
+class Component:
+    def __init__(self, name: str, kind: str, size_mb: Optional[Callable[[], float]] = None,
+                 release: Optional[Callable[[], object]] = None, loaded: Optional[Callable[[], bool]] = None,
+                 cost: int = 0, idle_s: float = 0.0):
+        self.name = name
+        self.kind = kind              # "cache", "model" or "index"
+        self._size_mb = size_mb
+        self._release = release
+        self._loaded = loaded or (lambda: True)
+        self.cost = cost              # release order under pressure, lowest first
+        self.idle_s = idle_s
+        self.last_used = time.monotonic()
+        self.measured_mb = 0.0        # RSS growth while loading, see MemoryGovernor.loading
+        self.loads = 0
+        self.releases = 0
+        self.released_mb = 0.0
+
+    @property
+    def releasable(self) -> bool:
+        return self._release is not None
+
+    def is_loaded(self) -> bool:
+        return bool(self._loaded())
+
+    def size_mb(self) -> float:
+        if not self.is_loaded():
+            return 0.0
+        return float(self._size_mb()) if self._size_mb is not None else self.measured_mb
+
+    def idle_for(self) -> float:
+        return time.monotonic() - self.last_used
+
+    def release(self):
+        self._release()
+        self.releases += 1
+
+    def stats(self) -> Dict:
+        return {"kind": self.kind, "loaded": self.is_loaded(), "size_mb": round(self.size_mb(), 1),
+                "idle_s": round(self.idle_for(), 1), "idle_unload_s": self.idle_s or None,
+                "loads": self.loads, "releases": self.releases, "released_mb": round(self.released_mb, 1)}
+
+
+class MemoryGovernor:
+    def __init__(self, budget_mb: float = 0.0, high_water: float = 0.9, low_water: float = 0.75,
+                 interval_s: float = 5.0):
+        self.budget_mb = budget_mb
+        self.high_water = high_water
+        self.low_water = low_water
+        self.interval_s = interval_s
+        self.components: Dict[str, Component] = {}
+        self.events: List[Dict] = []
+        self.pressure_events = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def register(self, name: str, kind: str = "cache", **kwargs) -> Component:
+        component = Component(name, kind, **kwargs)
+        self.components[name] = component
+        return component
+
+    def touch(self, name: str):
+        component = self.components.get(name)
+        if component is not None:
+            component.last_used = time.monotonic()
+
+    @contextmanager
+    def loading(self, name: str):
+        """Attribute the RSS growth of the block to a component (for those without a size function)."""
+        before = current_rss_mb()
+        try:
+            yield
+        finally:
+            component = self.components.get(name)
+            if component is not None:
+                component.measured_mb = max(0.0, current_rss_mb() - before)
+                component.loads += 1
+                component.last_used = time.monotonic()
+
+    def _release(self, component: Component, reason: str) -> float:
+        before = current_rss_mb()
+        component.release()
+        release_freed_memory()
+        freed = max(0.0, before - current_rss_mb())
+        component.released_mb += freed
+        self.events = (self.events + [{"ts": time.strftime("%Y-%m-%dT%H:%M:%S"), "component": component.name,
+                                       "reason": reason, "freed_mb": round(freed, 1)}])[-50:]
+        print(f"🧹 Released {component.name} ({reason}): {freed:.1f} MB")
+        return freed
+
+    def relieve(self, target_mb: Optional[float] = None, reason: str = "pressure") -> float:
+        """Release components, cheapest to rebuild first, until RSS <= target_mb; returns MB freed."""
+        if target_mb is None:
+            target_mb = self.budget_mb * self.low_water
+        freed = 0.0
+        with self._lock:
+            for _ in range(MAX_RELIEF_PASSES):
+                released_any = False
+                for component in sorted(self.components.values(), key=lambda c: c.cost):
+                    if current_rss_mb() <= target_mb:
+                        return freed
+                    if not component.releasable or component.size_mb() <= 0:
+                        continue
+                    if component.kind != "cache" and component.idle_for() < BUSY_GRACE_S:
+                        continue
+                    freed += self._release(component, reason)
+                    released_any = True
+                if not released_any:
+                    break
+        return freed
+
+    def unload_idle(self) -> float:
+        freed = 0.0
+        with self._lock:
+            for component in self.components.values():
+                if (component.idle_s > 0 and component.releasable and component.is_loaded()
+                        and component.idle_for() > component.idle_s):
+                    freed += self._release(component, f"idle {component.idle_for():.0f}s")
+        return freed
+
+    def check(self):
+        self.unload_idle()
+        if self.budget_mb > 0 and current_rss_mb() > self.budget_mb * self.high_water:
+            self.pressure_events += 1
+            self.relieve()
+
+    @property
+    def active(self) -> bool:
+        return self.budget_mb > 0 or any(c.idle_s > 0 for c in self.components.values())
+
+    def start(self):
+        """Start the per-process checker thread (threads do not survive the pre-fork)."""
+        if not self.active or self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name="memory-governor", daemon=True)
+        self._thread.start()
+        print(f"🧮 Memory governor: budget {self.budget_mb:g} MB, checking every {self.interval_s:g}s")
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval_s)
+            try:
+                self.check()
+            except Exception as e:
+                print(f"⚠️ Memory governor check failed: {e}")
+
+    def stats(self) -> Dict:
+        rss = current_rss_mb()
+        return {
+            "rss_mb": rss,
+            "budget_mb": self.budget_mb or None,
+            "used_pct": round(100 * rss / self.budget_mb, 1) if self.budget_mb else None,
+            "high_water_mb": round(self.budget_mb * self.high_water, 1) if self.budget_mb else None,
+            "low_water_mb": round(self.budget_mb * self.low_water, 1) if self.budget_mb else None,
+            "pressure_events": self.pressure_events,
+            "components": {name: c.stats() for name, c in self.components.items()},
+            "recent_releases": self.events[-10:],
+        }
+
+
+def make_memory_governor() -> MemoryGovernor:
+    return MemoryGovernor(
+        budget_mb=float(os.getenv("MEMORY_BUDGET_MB", "0")),
+        high_water=float(os.getenv("MEMORY_HIGH_WATER", "0.9")),
+        low_water=float(os.getenv("MEMORY_LOW_WATER", "0.75")),
+        interval_s=float(os.getenv("MEMORY_CHECK_SECONDS", "5")),
+    )
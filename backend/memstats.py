@@ -0,0 +1,144 @@
+"""
+Process memory helpers shared by ingest, benchmarks and the backend.
+"""
+import gc
+import os
+import sys
+import ctypes
+import resource
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far."""
+    # ru_maxrss is reported in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def current_rss_mb() -> float:
+    """Current resident set size, read from /proc where available."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return round(resident_pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024, 1)
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+
+def deep_sizeof(obj, limit: int = 100000) -> int:
+    """
+    Approximate bytes held by obj and the containers, strings and arrays it references
+    (objects shared between several places are counted once; stops after `limit` objects).
+    """
+    seen, stack, total = set(), [obj], 0
+    while stack and len(seen) < limit:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        nbytes = getattr(item, "nbytes", None)
+        if isinstance(nbytes, int):
+            total += nbytes
+            continue
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+    return total
+
+
+def release_freed_memory():
+    """Collect garbage and hand freed heap pages back to the OS (glibc), so RSS reflects evictions."""
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def smaps_rollup(pid="self") -> dict:
+    """
+    Shared vs. private memory of a process (MB) from /proc/<pid>/smaps_rollup.
+    Pss splits shared pages evenly between the processes mapping them.
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 3 and parts[0].endswith(":") and parts[2] == "kB":
+                    fields[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        return {}
+
+    def mb(*keys):
+        return round(sum(fields.get(k, 0) for k in keys) / 1024, 1)
+
+    return {
+        "rss_mb": mb("Rss"),
+        "pss_mb": mb("Pss"),
+        "shared_mb": mb("Shared_Clean", "Shared_Dirty"),
+        "private_mb": mb("Private_Clean", "Private_Dirty"),
+        "swap_mb": mb("Swap"),
+    }
+
+
+def child_pids(parent_pid: int) -> list:
+    """PIDs whose parent is parent_pid (scans /proc; Linux only)."""
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                # The command name may contain spaces; fields resume after the closing paren
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        if ppid == parent_pid:
+            pids.append(int(entry))
+    return sorted(pids)
+
+
+def available_memory_mb() -> float:
+    """Memory this process may still use: the tighter of cgroup headroom and MemAvailable."""
+    limits = []
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    limits.append(int(line.split()[1]) / 1024)
+    except OSError:
+        pass
+    for limit_file, usage_file in (("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory.current"),
+                                   ("/sys/fs/cgroup/memory/memory.limit_in_bytes",
+                                    "/sys/fs/cgroup/memory/memory.usage_in_bytes")):
+        try:
+            with open(limit_file, "r") as f:
+                limit = f.read().strip()
+            with open(usage_file, "r") as f:
+                usage = int(f.read().strip())
+        except (OSError, ValueError):
+            continue
+        # cgroup v1 reports "no limit" as a huge number
+        if limit.isdigit() and int(limit) < 1 << 60:
+            limits.append((int(limit) - usage) / 1024 / 1024)
+        break
+    return round(min(limits), 1) if limits else 0.0
+
+
+def process_tree_report(master_pid: int) -> dict:
+    """Per-process memory of a pre-fork master and its workers, plus totals."""
+    processes = {"master": {"pid": master_pid, **smaps_rollup(master_pid)}}
+    workers = [{"pid": pid, **smaps_rollup(pid)} for pid in child_pids(master_pid)]
+    everyone = [processes["master"]] + workers
+    return {
+        **processes,
+        "workers": workers,
+        # Sum of PSS is the real footprint; sum of RSS counts shared pages once per process
+        "total_pss_mb": round(sum(p.get("pss_mb", 0) for p in everyone), 1),
+        "total_rss_mb": round(sum(p.get("rss_mb", 0) for p in everyone), 1),
+        "private_per_worker_mb": round(
+            sum(p.get("private_mb", 0) for p in workers) / len(workers), 1) if workers else 0.0,
+    }
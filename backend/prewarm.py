@@ -0,0 +1,136 @@
+"""
+Offline cache prewarming from the query log.
+
+Mines the JSONL written by backend/query_log.py for the most frequent legal
+questions, answers each once through the normal pipeline and writes an FAQ
+store (JSON). The backend loads the store at startup (FAQ_STORE) and seeds its
+rewrite/retrieval/answer caches, so the hot questions are answered from memory
+by every worker from the first request. Run it before traffic peaks, e.g.
+
+    python backend/prewarm.py --top 200 --min-count 3
+    python backend/prewarm.py --dry-run          # only show the top questions
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from backend.caches import normalize_query
+from backend.query_log import read_records
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_LOG_DIR = PROJECT_ROOT / "data" / "query_log"
+DEFAULT_FAQ_STORE = PROJECT_ROOT / "data" / "faq_answers.json"
+
+
+def top_queries(log_dir: Path, top: int, min_count: int = 2) -> List[Dict]:
+    """Most frequent standalone legal questions (by normalized text) that were answered."""
+    counts = Counter()
+    examples = {}
+    for record in read_records(log_dir):
+        if record.get("status") != 200 or not record.get("is_legal") or record.get("follow_up"):
+            continue
+        key = normalize_query(record.get("query", ""))
+        if not key:
+            continue
+        counts[key] += 1
+        examples.setdefault(key, record)
+    return [{"key": key, "query": examples[key]["query"], "count": count, "k": examples[key].get("k", 8)}
+            for key, count in counts.most_common(top) if count >= min_count]
+
+
+def build_store(queries: List[Dict], store_path: Path, delay_s: float = 0.0) -> Dict:
+    """Answer each query through backend.main's pipeline and write the FAQ store."""
+    from backend import main
+
+    entries, failed = {}, 0
+    for i, item in enumerate(queries, 1):
+        req = main.ChatRequest(query=item["query"], k=item["k"])
+        try:
+            result = main.answer_legal_query(req, deadline=None)
+        except Exception as e:
+            print(f"⚠️ [{i}/{len(queries)}] {item['query'][:60]!r}: {e}")
+            failed += 1
+            continue
+        if not result.get("rewritten_query") or result["answer"] == main.UNAVAILABLE_REPLY or result.get("extractive"):
+            failed += 1
+            continue
+        entries[item["key"]] = {**result, "k": item["k"], "count": item["count"]}
+        print(f"✅ [{i}/{len(queries)}] ({item['count']}×) {item['query'][:70]}")
+        if delay_s:
+            time.sleep(delay_s)
+
+    store = {
+        "index_version": main.current_index_version(),
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "entries": entries,
+    }
+    store_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = store_path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(store, ensure_ascii=False, indent=1), encoding="utf-8")
+    os.replace(tmp, store_path)
+    print(f"📦 Wrote {len(entries)} answers to {store_path} ({failed} skipped)")
+    return store
+
+
+def seed_caches(store_path: Path, index_version: str, rewrite_cache, retrieval_cache, answer_cache,
+                ttl: float, route=lambda query: ()) -> int:
+    """
+    Load an FAQ store into the backend caches; entries for another index version are ignored.
+    `route` gives the shard-routing part of a retrieval key (main.shard_route).
+    """
+    store_path = Path(store_path)
+    if not store_path.exists():
+        return 0
+    try:
+        store = json.loads(store_path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"⚠️ Could not read FAQ store {store_path}: {e}")
+        return 0
+    if store.get("index_version") != index_version:
+        print(f"⚠️ FAQ store was built for index {store.get('index_version')}, serving {index_version}: not loaded")
+        return 0
+
+    seeded = 0
+    for key, entry in store.get("entries", {}).items():
+        result = {name: entry[name] for name in ("query", "rewritten_query", "answer", "sources")}
+        rewrite_cache.set(key, (True, entry["rewritten_query"]), ttl=ttl)
+        retrieval_cache.set((index_version, normalize_query(entry["rewritten_query"]), entry["k"],
+                             route(entry["query"])), entry["sources"], ttl=ttl)
+        # Keyed like main.answer_cache_key for a normal (non-"fast") request
+        answer_cache.set((index_version, key, entry["k"], None), result, ttl=ttl)
+        seeded += 1
+    return seeded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute answers for the most frequent logged questions")
+    parser.add_argument("--log-dir", type=Path, default=Path(os.getenv("QUERY_LOG_DIR", str(DEFAULT_LOG_DIR))))
+    parser.add_argument("--store", type=Path, default=Path(os.getenv("FAQ_STORE", str(DEFAULT_FAQ_STORE))))
+    parser.add_argument("--top", type=int, default=100, help="Number of questions to precompute")
+    parser.add_argument("--min-count", type=int, default=2, help="Ignore questions asked fewer times")
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds between questions (API rate limits)")
+    parser.add_argument("--dry-run", action="store_true", help="Print the top questions without answering them")
+    args = parser.parse_args()
+
+    queries = top_queries(args.log_dir, args.top, args.min_count)
+    if not queries:
+        print(f"⚠️ No qualifying questions in {args.log_dir}")
+        return 1
+    print(f"🔥 {len(queries)} hot questions from {args.log_dir}")
+    if args.dry_run:
+        for item in queries:
+            print(f"{item['count']:6d}  {item['query']}")
+        return 0
+    store = build_store(queries, args.store, args.delay)
+    return 0 if store["entries"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+"""
+Opt-in profiling for the running backend (all entry points are admin-guarded).
+
+- StackSampler: a statistical wall-clock profiler. A background thread reads
+  every thread's stack with sys._current_frames() at a fixed interval and counts
+  collapsed stacks ("outer;inner;leaf count"), the input format of
+  flamegraph.pl and speedscope. It can be pointed at the thread serving one
+  /chat request or run continuously over all threads.
+- ContinuousProfiler: samples at a low rate and writes one collapsed-stack file
+  per window to PROFILE_DIR, keeping the newest PROFILE_KEEP files.
+- Allocation snapshots via tracemalloc, grouped by line, file or package.
+  tracemalloc only sees memory allocated through Python's allocator: tensors
+  and native index buffers show up in smaps (/api/memory), not here.
+"""
+import os
+import sys
+import time
+import threading
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+_SITE_MARKERS = ("site-packages/", "dist-packages/")
+_PROJECT_ROOT = str(Path(__file__).resolve().parent.parent) + "/"
+
+
+def short_path(filename: str) -> str:
+    """Path relative to the project or to site-packages, for readable frame names."""
+    filename = filename.replace("\\", "/")
+    for marker in _SITE_MARKERS:
+        if marker in filename:
+            return filename.split(marker, 1)[1]
+    if filename.startswith(_PROJECT_ROOT):
+        return filename[len(_PROJECT_ROOT):]
+    return filename.rsplit("/", 1)[-1]
+
+
+def frame_stack(frame) -> str:
+    """Collapsed stack of `frame`, outermost call first."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{getattr(code, 'co_qualname', code.co_name)} ({short_path(code.co_filename)})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """Samples stacks of the given threads (default: all but itself) every `interval_s`."""
+
+    def __init__(self, interval_s: float = 0.005, thread_ids: Optional[List[int]] = None,
+                 label_threads: bool = False):
+        self.interval_s = interval_s
+        self.thread_ids = set(thread_ids) if thread_ids else None
+        self.label_threads = label_threads
+        self.samples = Counter()
+        self.ticks = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.started = None
+
+    def start(self) -> "StackSampler":
+        self.started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.samples
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval_s):
+            names = {t.ident: t.name for t in threading.enumerate()} if self.label_threads else {}
+            frames = sys._current_frames()
+            with self._lock:
+                self.ticks += 1
+                for tid, frame in frames.items():
+                    if tid == own or (self.thread_ids is not None and tid not in self.thread_ids):
+                        continue
+                    stack = frame_stack(frame)
+                    if self.label_threads:
+                        stack = f"{names.get(tid, tid)};{stack}"
+                    self.samples[stack] += 1
+            # Frame references keep every sampled frame's locals alive
+            del frames
+
+    def drain(self) -> Tuple[Counter, int]:
+        """Samples and tick count so far, resetting both (used per continuous window)."""
+        with self._lock:
+            samples, ticks = self.samples, self.ticks
+            self.samples, self.ticks = Counter(), 0
+        return samples, ticks
+
+
+def collapsed_lines(samples: Counter) -> List[str]:
+    return [f"{stack} {count}" for stack, count in samples.most_common()]
+
+
+def top_frames(samples: Counter, n: int = 15) -> List[Dict]:
+    """Leaf ("self") and inclusive sample counts per frame, by self time."""
+    self_counts, total_counts = Counter(), Counter()
+    for stack, count in samples.items():
+        frames = stack.split(";")
+        self_counts[frames[-1]] += count
+        for name in set(frames):
+            total_counts[name] += count
+    total = sum(samples.values()) or 1
+    return [{"frame": name, "self_pct": round(100 * count / total, 1),
+             "total_pct": round(100 * total_counts[name] / total, 1)}
+            for name, count in self_counts.most_common(n)]
+
+
+def profile_call(fn: Callable, *args, interval_s: float = 0.005, **kwargs) -> Tuple[object, Dict]:
+    """Run fn in the calling thread while sampling that thread; returns (result, profile)."""
+    sampler = StackSampler(interval_s, thread_ids=[threading.get_ident()]).start()
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        samples = sampler.stop()
+    duration = time.monotonic() - sampler.started
+    return result, {
+        "duration_ms": round(1000 * duration, 1),
+        "interval_ms": interval_s * 1000,
+        "samples": sum(samples.values()),
+        "top": top_frames(samples),
+        "collapsed": collapsed_lines(samples),
+    }
+
+
+class ContinuousProfiler:
+    """Low-rate sampling of every thread, flushed to `<out_dir>/<pid>-<time>.collapsed` per window."""
+
+    def __init__(self, out_dir: Path, interval_s: float = 0.02, window_s: float = 60.0, keep: int = 120):
+        self.out_dir = Path(out_dir)
+        self.window_s = window_s
+        self.keep = keep
+        self.sampler = StackSampler(interval_s, label_threads=True)
+        self._stop = threading.Event()
+        self._thread = None
+        self.written = 0
+
+    def start(self):
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.sampler.start()
+        self._thread = threading.Thread(target=self._run, name="profile-writer", daemon=True)
+        self._thread.start()
+        print(f"🔬 Continuous profiling every {self.sampler.interval_s * 1000:g} ms → {self.out_dir}")
+
+    def stop(self):
+        self._stop.set()
+        self.sampler.stop()
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.window_s):
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"⚠️ Could not write profile: {e}")
+
+    def flush(self):
+        samples, _ = self.sampler.drain()
+        if not samples:
+            return
+        path = self.out_dir / f"{os.getpid()}-{time.strftime('%Y%m%dT%H%M%S')}.collapsed"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text("\n".join(collapsed_lines(samples)) + "\n", encoding="utf-8")
+        os.replace(tmp, path)
+        self.written += 1
+        self.prune()
+
+    def prune(self):
+        files = sorted(self.out_dir.glob("*.collapsed"), key=lambda p: p.stat().st_mtime)
+        for old in files[:-self.keep] if self.keep > 0 else []:
+            old.unlink(missing_ok=True)
+
+    def stats(self) -> Dict:
+        return {"dir": str(self.out_dir), "interval_ms": self.sampler.interval_s * 1000,
+                "window_s": self.window_s, "files_written": self.written}
+
+
+def list_profiles(out_dir: Path) -> List[Dict]:
+    out_dir = Path(out_dir)
+    if not out_dir.exists():
+        return []
+    files = sorted(out_dir.glob("*.collapsed"), key=lambda p: p.stat().st_mtime, reverse=True)
+    return [{"name": p.name, "bytes": p.stat().st_size, "modified": time.strftime(
+        "%Y-%m-%dT%H:%M:%S", time.localtime(p.stat().st_mtime))} for p in files]
+
+
+# ---------- tracemalloc ----------
+
+def start_tracemalloc(frames: int = 1) -> bool:
+    """Start tracing (only allocations made from now on are seen); False if already running."""
+    if tracemalloc.is_tracing():
+        return False
+    tracemalloc.start(frames)
+    return True
+
+
+def _package_of(filename: str) -> str:
+    path = short_path(filename)
+    return path.split("/", 1)[0] if "/" in path else path
+
+
+def allocation_report(top: int = 25, group_by: str = "lineno",
+                      baseline: Optional[tracemalloc.Snapshot] = None) -> Tuple[Dict, tracemalloc.Snapshot]:
+    """
+    Top allocation sites of a new tracemalloc snapshot, and the snapshot itself (the
+    baseline for a later diff). group_by is "lineno", "filename" or "package"; with a
+    baseline, sizes are the growth since then.
+    """
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ))
+    key = "filename" if group_by == "package" else group_by
+    if baseline is not None:
+        stats = snapshot.compare_to(baseline, key)
+        rows = [(s.traceback[0], s.size_diff, s.count_diff) for s in stats]
+    else:
+        stats = snapshot.statistics(key)
+        rows = [(s.traceback[0], s.size, s.count) for s in stats]
+
+    grouped = Counter()
+    counts = Counter()
+    for frame, size, count in rows:
+        if group_by == "package":
+            name = _package_of(frame.filename)
+        elif group_by == "filename":
+            name = short_path(frame.filename)
+        else:
+            name = f"{short_path(frame.filename)}:{frame.lineno}"
+        grouped[name] += size
+        counts[name] += count
+
+    current, peak = tracemalloc.get_traced_memory()
+    order = sorted(grouped.items(), key=lambda kv: abs(kv[1]), reverse=True)[:top]
+    return {
+        "group_by": group_by,
+        "diff": baseline is not None,
+        "traced_mb": round(current / 1024 / 1024, 1),
+        "peak_traced_mb": round(peak / 1024 / 1024, 1),
+        "top": [{"site": name, "kb": round(size / 1024, 1), "blocks": counts[name]} for name, size in order],
+    }, snapshot
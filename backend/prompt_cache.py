@@ -0,0 +1,429 @@
+"""
+Prompt caching for the Gemini calls of the /chat pipeline.
+
+Every prompt is split into a static prefix (instructions, answer format and a
+block of the most frequently retrieved clauses) and a dynamic suffix (question,
+retrieved context, conversation). A prefix large enough for the provider's
+minimum is registered once as cached content and later calls only send the
+suffix plus the cache name; smaller prefixes are still sent first so the
+provider's implicit prefix cache can match them. Without hot clauses
+(HOT_CLAUSES=0, the default) the instruction prefixes stay below every model's
+minimum, so only implicit caching applies. Cached content is refreshed
+before its TTL runs out while it is in use and left to expire otherwise.
+
+PROMPT_CACHE=gemini (default) uses the Gemini cachedContents API,
+PROMPT_CACHE=local emulates it in-process (offline testing; every call sends
+the full prompt) and PROMPT_CACHE=off always sends the full prompt.
+"""
+import os
+import time
+import hashlib
+import threading
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+from backend.vector_engine import clause_key
+
+# Smallest prefix the API accepts as cached content, per model
+MIN_CACHE_TOKENS = {"gemini-2.5-flash": 1024, "gemini-2.5-pro": 4096}
+DEFAULT_MIN_CACHE_TOKENS = 4096
+# A replaced prefix (e.g. the hot-clause block changed) stays valid this long for in-flight calls
+RETIRE_GRACE_S = 120
+# After a failed create, send full prompts for this long before trying again
+CREATE_BACKOFF_S = 300
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), enough to compare against the minimums."""
+    return len(text) // 4 + 1
+
+
+class CacheExpired(Exception):
+    """The provider no longer has the cached content a call referenced."""
+
+
+class CacheProvider:
+    """Registers cached prefixes and generates with or without one."""
+
+    name = "base"
+
+    def create(self, model: str, prefix: str, ttl_s: float, display_name: str) -> Tuple[str, float]:
+        """Register `prefix`; returns (cache name, expiry as a UNIX timestamp)."""
+        raise NotImplementedError
+
+    def find(self, display_name: str) -> Optional[Tuple[str, float]]:
+        """An existing cache with this display name (e.g. created by another worker)."""
+        return None
+
+    def refresh(self, cache_name: str, ttl_s: float) -> float:
+        raise NotImplementedError
+
+    def delete(self, cache_name: str):
+        raise NotImplementedError
+
+    def generate(self, model: str, contents: str, cache_name: Optional[str] = None) -> Tuple[str, Dict]:
+        """Returns (text, {"prompt_tokens", "cached_tokens"})."""
+        raise NotImplementedError
+
+
+class GeminiCacheProvider(CacheProvider):
+    name = "gemini"
+
+    def __init__(self, client):
+        self.client = client
+
+    @staticmethod
+    def _is_missing(error: Exception) -> bool:
+        message = str(error).lower()
+        return getattr(error, "code", None) == 404 or "cachedcontent" in message or "cached content" in message
+
+    def create(self, model: str, prefix: str, ttl_s: float, display_name: str) -> Tuple[str, float]:
+        from google.genai import types
+        cache = self.client.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                contents=[types.Content(role="user", parts=[types.Part(text=prefix)])],
+                ttl=f"{int(ttl_s)}s",
+                display_name=display_name,
+            ),
+        )
+        expires = cache.expire_time.timestamp() if cache.expire_time else time.time() + ttl_s
+        return cache.name, expires
+
+    def find(self, display_name: str) -> Optional[Tuple[str, float]]:
+        for cache in self.client.caches.list():
+            if cache.display_name == display_name and cache.expire_time:
+                return cache.name, cache.expire_time.timestamp()
+        return None
+
+    def refresh(self, cache_name: str, ttl_s: float) -> float:
+        from google.genai import types
+        try:
+            cache = self.client.caches.update(
+                name=cache_name, config=types.UpdateCachedContentConfig(ttl=f"{int(ttl_s)}s"))
+        except Exception as e:
+            if self._is_missing(e):
+                raise CacheExpired(cache_name) from e
+            raise
+        return cache.expire_time.timestamp() if cache.expire_time else time.time() + ttl_s
+
+    def delete(self, cache_name: str):
+        self.client.caches.delete(name=cache_name)
+
+    def generate(self, model: str, contents: str, cache_name: Optional[str] = None) -> Tuple[str, Dict]:
+        from google.genai import types
+        config = types.GenerateContentConfig(cached_content=cache_name) if cache_name else None
+        try:
+            response = self.client.models.generate_content(model=model, contents=contents, config=config)
+        except Exception as e:
+            if cache_name and self._is_missing(e):
+                raise CacheExpired(cache_name) from e
+            raise
+        usage = response.usage_metadata
+        return response.text, {
+            "prompt_tokens": (usage.prompt_token_count or 0) if usage else 0,
+            # Also set for implicit prefix-cache hits on full prompts
+            "cached_tokens": (usage.cached_content_token_count or 0) if usage else 0,
+        }
+
+
+class LocalCacheProvider(CacheProvider):
+    """
+    In-process stand-in with the same contract: caches get names and TTLs, expire,
+    and referencing an expired one raises CacheExpired. `generate_fn(model, prompt)`
+    receives the full prompt (prefix + suffix); token counts are estimated.
+    """
+
+    name = "local"
+
+    def __init__(self, generate_fn: Callable[[str, str], str]):
+        self.generate_fn = generate_fn
+        self._caches: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    def _live(self, cache_name: str) -> Dict:
+        entry = self._caches.get(cache_name)
+        if entry is None or entry["expires"] <= time.time():
+            self._caches.pop(cache_name, None)
+            raise CacheExpired(cache_name)
+        return entry
+
+    def create(self, model: str, prefix: str, ttl_s: float, display_name: str) -> Tuple[str, float]:
+        with self._lock:
+            self._seq += 1
+            name = f"cachedContents/local-{self._seq}"
+            self._caches[name] = {"model": model, "prefix": prefix, "display_name": display_name,
+                                  "expires": time.time() + ttl_s}
+            return name, self._caches[name]["expires"]
+
+    def find(self, display_name: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            for name, entry in list(self._caches.items()):
+                if entry["display_name"] == display_name and entry["expires"] > time.time():
+                    return name, entry["expires"]
+        return None
+
+    def refresh(self, cache_name: str, ttl_s: float) -> float:
+        with self._lock:
+            entry = self._live(cache_name)
+            entry["expires"] = time.time() + ttl_s
+            return entry["expires"]
+
+    def delete(self, cache_name: str):
+        with self._lock:
+            self._caches.pop(cache_name, None)
+
+    def generate(self, model: str, contents: str, cache_name: Optional[str] = None) -> Tuple[str, Dict]:
+        prefix = ""
+        if cache_name:
+            with self._lock:
+                entry = self._live(cache_name)
+            if entry["model"] != model:
+                raise ValueError(f"{cache_name} was created for {entry['model']}, not {model}")
+            prefix = entry["prefix"]
+        text = self.generate_fn(model, prefix + contents)
+        return text, {"prompt_tokens": estimate_tokens(prefix + contents),
+                      "cached_tokens": estimate_tokens(prefix) if prefix else 0}
+
+
+class PromptCache:
+    """
+    Reuses provider-side cached prefixes across requests. Entries are keyed by
+    (model, family) so a changed prefix (new hot clauses) replaces the old cache
+    instead of accumulating them.
+    """
+
+    def __init__(self, provider: CacheProvider, enabled: bool = True, ttl_s: float = 3600.0,
+                 refresh_margin_s: float = 600.0, min_tokens: Optional[Dict[str, int]] = None):
+        self.provider = provider
+        self.enabled = enabled
+        self.ttl_s = ttl_s
+        self.refresh_margin_s = min(refresh_margin_s, ttl_s / 2)
+        self.min_tokens = dict(MIN_CACHE_TOKENS, **(min_tokens or {}))
+        self._entries: Dict[Tuple[str, str], Dict] = {}
+        self._busy = set()  # keys being created or refreshed by some thread
+        self._backoff: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+        self.counters = Counter()
+
+    def generate(self, model: str, family: str, prefix: str, suffix: str) -> str:
+        """Generate from prefix + suffix, sending the prefix as cached content when possible."""
+        cache_name = self._cache_name(model, family, prefix) if self.enabled else None
+        if cache_name:
+            try:
+                text, usage = self.provider.generate(model, suffix, cache_name=cache_name)
+                self._account(usage, "hits")
+                return text
+            except CacheExpired:
+                self._forget((model, family), cache_name)
+                with self._lock:
+                    self.counters["expired_fallbacks"] += 1
+        text, usage = self.provider.generate(model, prefix + suffix)
+        self._account(usage, "full_prompts")
+        return text
+
+    def _account(self, usage: Dict, outcome: str):
+        with self._lock:
+            self.counters[outcome] += 1
+            self.counters["prompt_tokens"] += usage.get("prompt_tokens", 0)
+            self.counters["cached_tokens"] += usage.get("cached_tokens", 0)
+            if outcome == "full_prompts" and usage.get("cached_tokens"):
+                self.counters["implicit_hits"] += 1
+
+    def _cache_name(self, model: str, family: str, prefix: str) -> Optional[str]:
+        if estimate_tokens(prefix) < self.min_tokens.get(model, DEFAULT_MIN_CACHE_TOKENS):
+            with self._lock:
+                self.counters["below_minimum"] += 1
+            return None
+
+        key = (model, family)
+        digest = hashlib.sha256(f"{model}\n{prefix}".encode("utf-8")).hexdigest()[:16]
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            current = entry is not None and entry["digest"] == digest and entry["expires"] > now + 5
+            if current and (entry["expires"] - now > self.refresh_margin_s or key in self._busy):
+                return entry["name"]
+            if not current and (key in self._busy or self._backoff.get(key, 0) > now):
+                # Another thread is creating it (or creation just failed): don't wait, send in full
+                return None
+            self._busy.add(key)
+
+        try:
+            if current:
+                return self._refresh(key, entry)
+            return self._create(key, model, family, prefix, digest, stale=entry)
+        finally:
+            with self._lock:
+                self._busy.discard(key)
+
+    def _refresh(self, key: Tuple[str, str], entry: Dict) -> Optional[str]:
+        try:
+            expires = self.provider.refresh(entry["name"], self.ttl_s)
+        except CacheExpired:
+            self._forget(key, entry["name"])
+            return None
+        except Exception as e:
+            # Still valid until its old expiry; try again on a later call
+            print(f"⚠️ Prompt cache refresh failed for {entry['name']}: {e}")
+            return entry["name"]
+        with self._lock:
+            entry["expires"] = expires
+            self.counters["refreshes"] += 1
+        return entry["name"]
+
+    def _create(self, key: Tuple[str, str], model: str, family: str, prefix: str, digest: str,
+                stale: Optional[Dict]) -> Optional[str]:
+        display_name = f"mpl-{family}-{digest}"
+        try:
+            # Another worker (or a previous run) may already have registered this exact prefix
+            found = self.provider.find(display_name)
+            if found is not None:
+                name, expires = found
+            else:
+                name, expires = self.provider.create(model, prefix, self.ttl_s, display_name)
+                print(f"🧊 Cached {family} prefix for {model} ({estimate_tokens(prefix)} tokens) as {name}")
+        except Exception as e:
+            print(f"⚠️ Prompt cache create failed for {family}/{model}: {e}")
+            with self._lock:
+                self.counters["create_errors"] += 1
+                self._backoff[key] = time.time() + CREATE_BACKOFF_S
+            return None
+
+        with self._lock:
+            self.counters["adopted" if found is not None else "creates"] += 1
+            self._entries[key] = {"name": name, "digest": digest, "expires": expires,
+                                  "tokens": estimate_tokens(prefix)}
+        if stale is not None and stale["name"] != name:
+            self._retire(stale["name"])
+        return name
+
+    def _retire(self, cache_name: str):
+        """Shorten a replaced cache's TTL instead of deleting it under in-flight calls."""
+        try:
+            self.provider.refresh(cache_name, RETIRE_GRACE_S)
+        except Exception:
+            pass
+
+    def _forget(self, key: Tuple[str, str], cache_name: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["name"] == cache_name:
+                del self._entries[key]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self.counters)
+            entries = {f"{model}/{family}": {"name": e["name"], "tokens": e["tokens"],
+                                             "expires_in_s": round(e["expires"] - time.time())}
+                       for (model, family), e in self._entries.items()}
+        calls = counters.get("hits", 0) + counters.get("full_prompts", 0)
+        prompt_tokens = counters.get("prompt_tokens", 0)
+        return {
+            "provider": self.provider.name,
+            "enabled": self.enabled,
+            "ttl_s": self.ttl_s,
+            **counters,
+            "hit_rate": round(counters.get("hits", 0) / calls, 3) if calls else 0.0,
+            "cached_token_share": round(counters.get("cached_tokens", 0) / prompt_tokens, 3) if prompt_tokens else 0.0,
+            "entries": entries,
+        }
+
+
+class HotClauses:
+    """
+    Retrieval frequency per clause. Every `rebuild_every` recorded answers the most
+    retrieved clauses are pinned into the cached answer prefix; counts then decay so
+    the set follows current traffic. The pinned set is only replaced when enough of it
+    changed, because every change means registering a new cached prefix.
+    """
+
+    def __init__(self, top_n: int = 0, min_count: int = 3, rebuild_every: int = 50,
+                 max_tokens: int = 8000, min_churn: float = 0.25):
+        self.top_n = top_n
+        self.min_count = min_count
+        self.rebuild_every = rebuild_every
+        self.max_tokens = max_tokens
+        self.min_churn = min_churn
+        self._counts = Counter()
+        self._sources: Dict[str, Dict] = {}
+        self._recorded = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self._labels: Dict[str, str] = {}
+        self._block = ""
+
+    def record(self, sources: List[Dict], index_version: str):
+        if self.top_n <= 0:
+            return
+        with self._lock:
+            if index_version != self._version:
+                # Clause text may differ in another index: start over
+                self._counts.clear()
+                self._sources.clear()
+                self._labels, self._block, self._version = {}, "", index_version
+            for src in sources:
+                key = clause_key(src)
+                self._counts[key] += 1
+                self._sources[key] = src
+            self._recorded += 1
+            if self._recorded % self.rebuild_every == 0:
+                self._rebuild()
+
+    def _rebuild(self):
+        top = [key for key, count in self._counts.most_common(self.top_n) if count >= self.min_count]
+        if top:
+            changed = len(set(top) ^ set(self._labels)) / max(len(top), len(self._labels))
+            if changed >= self.min_churn or not self._labels:
+                self._pin(sorted(top))
+        # Decay, dropping clauses that are no longer retrieved
+        for key in list(self._counts):
+            self._counts[key] //= 2
+            if not self._counts[key]:
+                del self._counts[key]
+                if key not in self._labels:
+                    self._sources.pop(key, None)
+
+    def _pin(self, keys: List[str]):
+        labels, parts, tokens = {}, [], 0
+        for key in keys:
+            label = f"H{len(labels) + 1}"
+            text = f"[{label}] {format_clause(self._sources[key])}"
+            if tokens + estimate_tokens(text) > self.max_tokens:
+                break
+            labels[key] = label
+            parts.append(text)
+            tokens += estimate_tokens(text)
+        self._labels = labels
+        self._block = ("\nReference library of frequently cited provisions. This is background, NOT context "
+                       "for the question: use or cite an [H#] provision only when the Retrieved Context "
+                       "lists its label, and ignore all others.\n\n" + "\n\n".join(parts) + "\n") if parts else ""
+
+    def pinned_for(self, sources: List[Dict]) -> Tuple[str, Dict[str, str]]:
+        """(block, {clause key: label} for the sources already in it), from one consistent pinned set."""
+        with self._lock:
+            block, labels = self._block, self._labels
+        return block, {clause_key(src): labels[clause_key(src)] for src in sources if clause_key(src) in labels}
+
+    def stats(self) -> Dict:
+        return {"pinned": len(self._labels), "tracked": len(self._counts),
+                "block_tokens": estimate_tokens(self._block) if self._block else 0}
+
+
+def format_clause(src: Dict) -> str:
+    return (f"📘 Document: {src['document_title']}\n"
+            f"Part {src['part_number']} – {src['part_title']}\n"
+            f"Article {src['article_number']}: {src['article_title']}\n"
+            f"Clause {src['clause_index']}\n"
+            f"Text: {src['text']}")
+
+
+def make_prompt_cache(client) -> PromptCache:
+    mode = os.getenv("PROMPT_CACHE", "gemini").strip().lower()
+    if mode == "local":
+        provider = LocalCacheProvider(
+            lambda model, prompt: client.models.generate_content(model=model, contents=prompt).text)
+    else:
+        provider = GeminiCacheProvider(client)
+    return PromptCache(provider, enabled=mode != "off", ttl_s=float(os.getenv("PROMPT_CACHE_TTL", "3600")))
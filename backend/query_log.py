@@ -0,0 +1,171 @@
+"""
+Non-blocking query log for /chat.
+
+Request handlers only enqueue a record; a background thread writes them as
+JSONL (query, rewrite, retrieved clause IDs, path taken, per-stage timings).
+Each process writes its own `queries-<pid>-<start>.jsonl` in QUERY_LOG_DIR, so
+the workers of backend/serve.py never interleave or race on rotation; a file
+is rolled over at QUERY_LOG_MAX_MB and only the newest QUERY_LOG_MAX_FILES
+files are kept (a file is only pruned by its own process or once that process
+has exited). When the queue is full records are dropped (and counted)
+rather than slowing requests down. backend/prewarm.py mines these files.
+"""
+import os
+import json
+import time
+import queue
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+_STOP = object()
+
+
+@contextmanager
+def timed(timings: Optional[Dict], name: str):
+    """Record the duration of the block in timings[name] (ms); no-op when timings is None."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[name] = round(1000 * (time.perf_counter() - started), 1)
+
+
+def writer_alive(path: Path) -> bool:
+    """Whether another running process owns `queries-<pid>-....jsonl` (this process's old files do not count)."""
+    try:
+        pid = int(path.name.split("-")[1])
+    except (IndexError, ValueError):
+        return False
+    if pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class QueryLogger:
+    def __init__(self, log_dir: Path, max_bytes: int = 20 * 1024 * 1024, max_files: int = 20,
+                 queue_size: int = 10000):
+        self.log_dir = Path(log_dir)
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._file = None
+        self._path = None
+        self.written = 0
+        self.dropped = 0
+
+    def log(self, record: Dict):
+        """Enqueue a record; never blocks the caller."""
+        if self._pid != os.getpid():
+            # Lazily (re)started per process: the writer thread does not survive fork
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    self._start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        self._queue = queue.Queue(maxsize=self._queue.maxsize)
+        self._file = None
+        self._thread = threading.Thread(target=self._run, name="query-log", daemon=True)
+        self._thread.start()
+        self._pid = os.getpid()
+
+    def close(self, timeout: float = 5.0):
+        if self._thread is not None and self._pid == os.getpid():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def _open(self):
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self._path = self.log_dir / f"queries-{os.getpid()}-{time.strftime('%Y%m%dT%H%M%S')}.jsonl"
+        self._file = open(self._path, "a", encoding="utf-8")
+        self._prune()
+
+    def _prune(self):
+        files = []
+        for path in self.log_dir.glob("queries-*.jsonl"):
+            try:
+                files.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                continue  # pruned by another process meanwhile
+        files.sort()
+        for _, old in files[:-self.max_files] if self.max_files > 0 else []:
+            # Another live worker may still be writing its file; leave that to the worker itself
+            if old != self._path and not writer_alive(old):
+                old.unlink(missing_ok=True)
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            batch = [record]
+            # Write whatever else is queued in the same flush
+            while len(batch) < 500:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(r is _STOP for r in batch)
+            records = [r for r in batch if r is not _STOP]
+            try:
+                self._write(records)
+            except OSError as e:
+                self.dropped += len(records)
+                self._file = None
+                print(f"⚠️ Query log write failed: {e}")
+            if stop:
+                if self._file is not None:
+                    self._file.close()
+                return
+
+    def _write(self, records):
+        if not records:
+            return
+        if self._file is None:
+            self._open()
+        for record in records:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self.written += len(records)
+        if self._file.tell() >= self.max_bytes:
+            self._file.close()
+            self._file = None  # next batch opens a new file
+
+    def stats(self) -> Dict:
+        return {"dir": str(self.log_dir), "file": str(self._path) if self._path else None,
+                "written": self.written, "dropped": self.dropped, "queued": self._queue.qsize()}
+
+
+def read_records(log_dir: Path) -> Iterator[Dict]:
+    """Every record in the log directory, oldest file first; skips torn or invalid lines."""
+    files = sorted(Path(log_dir).glob("queries-*.jsonl"), key=lambda p: p.stat().st_mtime)
+    for path in files:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+def make_query_logger(default_dir: Path) -> Optional[QueryLogger]:
+    if os.getenv("QUERY_LOG", "1") == "0":
+        return None
+    return QueryLogger(
+        Path(os.getenv("QUERY_LOG_DIR", str(default_dir))),
+        max_bytes=int(float(os.getenv("QUERY_LOG_MAX_MB", "20")) * 1024 * 1024),
+        max_files=int(os.getenv("QUERY_LOG_MAX_FILES", "20")),
+    )
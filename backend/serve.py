@@ -0,0 +1,233 @@
+"""
+Production server: pre-fork uvicorn workers sharing one copy of the model and index.
+
+The master imports the app, loads the query encoder and index once, freezes the
+GC and then forks the workers. Encoder weights, the memory-mapped NumPy index
+and the parsed records stay in copy-on-write pages shared by every worker,
+so each extra worker only costs its private memory rather than a full reload.
+All workers accept connections from one listening socket bound by the master.
+
+    python backend/serve.py                    # workers sized from cores and memory
+    python backend/serve.py --workers 2 --port 8000
+
+SIGTERM/SIGINT stop the workers. SIGHUP makes the master load the latest index
+snapshot (extracting it once) and then every worker swap to it; workers
+restarted later are forked from that snapshot. Per-worker vs. shared memory is
+reported at /api/memory.
+"""
+import os
+import gc
+import sys
+import time
+import signal
+import socket
+import argparse
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+# Fast tokenizers' thread pool must not be started before fork
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+from backend.memstats import current_rss_mb, available_memory_mb, smaps_rollup
+from backend.snapshots import latest_version
+
+# Memory a worker adds on top of the shared pages (request buffers, activations, caches)
+WORKER_PRIVATE_MB = float(os.getenv("WORKER_PRIVATE_MB", "150"))
+# Headroom left for the OS, page cache and index snapshot swaps
+MEMORY_RESERVE_MB = float(os.getenv("MEMORY_RESERVE_MB", "64"))
+RESPAWN_DELAY_S = 1.0
+
+
+def cpu_count() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def auto_workers(available_mb: float) -> int:
+    """One worker per core, capped by how many private footprints fit in free memory."""
+    by_memory = int((available_mb - MEMORY_RESERVE_MB) // WORKER_PRIVATE_MB) if available_mb else cpu_count()
+    return max(1, min(cpu_count(), by_memory))
+
+
+def set_torch_threads(threads: int):
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(max(1, threads))
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def preload():
+    """Import the app and load everything workers should share."""
+    # A single intra-op thread in the master: OpenMP pools do not survive fork()
+    set_torch_threads(1)
+    started = time.perf_counter()
+    from backend import main
+    main.warm_up()
+    gc.collect()
+    # Keep the cyclic GC from writing to (and so un-sharing) every preloaded object
+    gc.freeze()
+    print(f"📦 Preloaded app, encoder and index in {time.perf_counter() - started:.1f}s "
+          f"(master RSS {current_rss_mb()} MB)")
+    return main
+
+
+def run_worker(main_module, sock: socket.socket, worker_id: int, threads: int, args):
+    import uvicorn
+
+    os.environ["MPL_WORKER_ID"] = str(worker_id)
+    for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+        signal.signal(sig, signal.SIG_DFL)
+    set_torch_threads(threads)
+
+    holder = getattr(main_module, "index_holder", None)
+    if holder is not None:
+        signal.signal(signal.SIGHUP, lambda *_: holder.swap_in_background())
+        # Forked from an older snapshot than the one published (e.g. a failed master reload)
+        latest, current = latest_version(holder.snapshots_dir), holder.current()
+        if latest and (current is None or current.version != latest):
+            holder.swap_in_background(latest)
+    else:
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    config = uvicorn.Config(main_module.app, host=args.host, port=args.port,
+                            log_level=args.log_level, timeout_keep_alive=args.keep_alive)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Master:
+    def __init__(self, main_module, sock: socket.socket, workers: int, threads: int, args):
+        self.main = main_module
+        self.sock = sock
+        self.workers = workers
+        self.threads = threads
+        self.args = args
+        self.children = {}
+        self.stopping = False
+
+    def spawn(self, worker_id: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.main, self.sock, worker_id, self.threads, self.args)
+            except BaseException as e:
+                print(f"❌ Worker {worker_id} crashed: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = worker_id
+
+    def signal_workers(self, sig):
+        for pid in list(self.children):
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def handle_stop(self, signum, frame):
+        if not self.stopping:
+            print("🛑 Stopping workers...")
+        self.stopping = True
+        self.signal_workers(signal.SIGTERM)
+
+    def handle_reload(self, signum, frame):
+        holder = getattr(self.main, "index_holder", None)
+        if holder is not None:
+            # Swap the master first: the archive is extracted once, and restarted workers fork from it
+            try:
+                holder.swap_to()
+            except Exception as e:
+                print(f"❌ Master could not load the latest index snapshot: {e}")
+            gc.collect()
+            gc.freeze()
+        print("🔁 Reloading latest index snapshot in all workers...")
+        self.signal_workers(signal.SIGHUP)
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self.handle_stop)
+        signal.signal(signal.SIGINT, self.handle_stop)
+        signal.signal(signal.SIGHUP, self.handle_reload)
+
+        for worker_id in range(self.workers):
+            self.spawn(worker_id)
+        print(f"🌐 Serving on http://{self.args.host}:{self.args.port} with {self.workers} workers "
+              f"(pids {sorted(self.children)}, {self.threads} torch threads each)")
+        time.sleep(min(2.0, 0.5 * self.workers))
+        self.report_memory()
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            worker_id = self.children.pop(pid, None)
+            if worker_id is None or self.stopping:
+                continue
+            print(f"⚠️  Worker {worker_id} (pid {pid}) exited with status {status}; restarting...")
+            time.sleep(RESPAWN_DELAY_S)
+            self.spawn(worker_id)
+        self.sock.close()
+        return 0
+
+    def report_memory(self):
+        master = smaps_rollup()
+        workers = [smaps_rollup(pid) for pid in self.children]
+        workers = [w for w in workers if w]
+        if not master or not workers:
+            return
+        private = sum(w["private_mb"] for w in workers) / len(workers)
+        shared = sum(w["shared_mb"] for w in workers) / len(workers)
+        total_pss = master["pss_mb"] + sum(w["pss_mb"] for w in workers)
+        print(f"📊 Memory: master RSS {master['rss_mb']} MB; per worker ~{round(private, 1)} MB private "
+              f"+ {round(shared, 1)} MB shared; total PSS {round(total_pss, 1)} MB")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pre-fork multi-worker MyPocketLawyer server.")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "0")),
+                        help="Worker processes (default: from cores and available memory)")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="Torch threads per worker (default: cores / workers)")
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--keep-alive", type=int, default=5, help="Keep-alive timeout in seconds")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not hasattr(os, "fork"):
+        print("❌ The pre-fork server needs os.fork(); use 'uvicorn backend.main:app' on this platform.")
+        return 1
+
+    sock = bind_socket(args.host, args.port)
+    # Set before preload: the app picks its shared (SQLite) session store from it
+    os.environ["MPL_MASTER_PID"] = str(os.getpid())
+    main_module = preload()
+
+    available = available_memory_mb()
+    workers = args.workers or auto_workers(available)
+    threads = args.threads or max(1, cpu_count() // workers)
+    print(f"⚙️  {cpu_count()} cores, {available} MB available after preload "
+          f"-> {workers} workers (assuming {WORKER_PRIVATE_MB:.0f} MB private each)")
+
+    return Master(main_module, sock, workers, threads, args).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
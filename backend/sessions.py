@@ -0,0 +1,261 @@
+"""
+Optional chat sessions: recent turns and the clauses retrieved for them.
+
+A session keeps the last few turns (query, rewritten query, retrieved sources
+and their clause IDs) so a follow-up such as "and what is the punishment for
+that?" can reuse or extend the previous context instead of going through
+classification and a fresh retrieval. Stores are bounded: an in-memory LRU
+with TTL, or SQLite (SESSION_STORE=sqlite) when sessions must survive
+restarts or be shared by workers; SQLite is the default under backend/serve.py.
+"""
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from backend.vector_engine import clause_key
+
+SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+# Follow-ups must refer back to the previous turn explicitly: a leading connective, or a pronoun /
+# deictic with no referent in the query itself. Dummy "it" ("Is it raining...?", "Is it legal to...?"),
+# relative "that" and demonstratives with their own noun ("in this constitution") do not count, and
+# neither does mere shortness.
+_CONTINUATION_RE = re.compile(r"^(and|but|also|then|what about|how about|what if|in that case|in such cases?)\b")
+_REFERENCE_RES = (
+    # "Does it apply...", "Is that legal?", "Can they..."
+    re.compile(r"^(does|do|did|will|would|can|could|should|may|might|must)\s+(it|that|this|they|those|these)\b"),
+    re.compile(r"^(is|are|was|were)\s+(that|this|they|those|these)\b"),
+    # "explain that in simpler terms", "summarise it"
+    re.compile(r"^(explain|clarify|summari[sz]e|simplify|rephrase|elaborate on|expand on)\s+"
+               r"(it|that|this|them|those|these)\b"),
+    re.compile(r"\b(the same|the above|the said|aforementioned|the former|the latter)\b"),
+)
+# A pronoun at the end or after a preposition also refers back, but a question bringing several
+# terms of its own ("how do I file a case against my employer for this?") stands alone
+_TRAILING_REFERENCE_RES = (
+    # "...for that?", "can I appeal it?"
+    re.compile(r"\b(that|this|it|them|those|these)\s*[?.!]*$"),
+    # "about it in detail", "under those?", "for that, and"
+    re.compile(r"\b(for|of|about|on|under|in|to|with|against|from|by|after|before)\s+"
+               r"(?:(it|them)\b|(that|this|those|these)(?=\s*[?.!,;]|\s*$|\s+(?:and|or|in|if|when|as)\b))"),
+)
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "so", "then", "also", "what", "which", "who", "whom", "how",
+    "is", "are", "was", "were", "be", "been", "do", "does", "did", "can", "could", "will", "would",
+    "should", "may", "might", "must", "shall", "of", "for", "to", "in", "on", "at", "by", "with",
+    "about", "from", "as", "if", "any", "there", "me", "my", "i", "you", "your", "we", "our", "tell",
+    "explain", "more", "please", "case", "when", "where", "why", "under", "into", "than",
+    "that", "this", "it", "its", "they", "them", "their", "those", "these", "such", "same", "above",
+    "aforementioned", "former", "latter", "nepal", "law", "legal",
+    # Rephrasing requests ("in simpler terms", "in plain words", "briefly, with an example")
+    "simple", "simpler", "simply", "plain", "easy", "easier", "terms", "words", "language", "detail",
+    "details", "detailed", "brief", "briefly", "short", "shorter", "again", "example", "examples",
+    "clarify", "summarise", "summarize", "simplify", "rephrase", "elaborate", "expand", "mean", "means",
+}
+# Queries longer than this are treated as self-contained questions
+FOLLOW_UP_MAX_WORDS = 14
+# A trailing / prepositional pronoun alone marks a follow-up only up to this many new terms
+FOLLOW_UP_MAX_NEW_TERMS = 2
+
+
+def valid_session_id(session_id: str) -> bool:
+    return bool(session_id) and bool(SESSION_ID_RE.match(session_id))
+
+
+def content_terms(text: str) -> set:
+    return {t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS and len(t) > 2}
+
+
+def classify_follow_up(query: str, history: List[Dict]) -> Optional[str]:
+    """
+    None for a standalone question; otherwise how to treat the follow-up:
+      "reuse"  - only refers back (e.g. "explain that in simpler terms"): answer from the cached clauses
+      "expand" - refers back but asks about something new (e.g. "and the punishment for that?"):
+                 retrieve for the new terms in the context of the previous question and merge
+    """
+    if not history or not history[-1].get("rewritten_query"):
+        return None
+    q = query.strip().lower()
+    if len(q.split()) > FOLLOW_UP_MAX_WORDS:
+        return None
+    explicit = _CONTINUATION_RE.match(q) or any(pattern.search(q) for pattern in _REFERENCE_RES)
+    if not (explicit or any(pattern.search(q) for pattern in _TRAILING_REFERENCE_RES)):
+        return None
+
+    last = history[-1]
+    known = content_terms(" ".join([last["query"], last["rewritten_query"]]
+                                   + [src.get("text", "") for src in last.get("sources", [])]
+                                   + [src.get("article_title", "") for src in last.get("sources", [])]))
+    new_terms = content_terms(q) - known
+    if not explicit and len(new_terms) > FOLLOW_UP_MAX_NEW_TERMS:
+        return None
+    return "expand" if new_terms else "reuse"
+
+
+def make_turn(query: str, rewritten_query: Optional[str], sources: List[Dict], answer: str) -> Dict:
+    return {
+        "query": query,
+        "rewritten_query": rewritten_query,
+        "clause_ids": [clause_key(src) for src in sources],
+        "sources": sources,
+        # Only the opening of the answer is kept; follow-up prompts need the gist, not the full text
+        "answer": (answer or "")[:600],
+        "created": time.time(),
+    }
+
+
+def merge_sources(previous: List[Dict], fresh: List[Dict], k: int) -> List[Dict]:
+    """
+    Best new clauses first (they answer the new part), then the prior context, then the
+    remaining new clauses; deduplicated by clause ID and capped at k.
+    """
+    head = (k + 1) // 2
+    merged, seen = [], set()
+    for src in fresh[:head] + previous + fresh[head:]:
+        key = clause_key(src)
+        if key not in seen:
+            seen.add(key)
+            merged.append(src)
+    return merged[:k]
+
+
+class SessionStore:
+    """Bounded store of recent turns per session."""
+
+    def __init__(self, ttl: float, max_turns: int):
+        self.ttl = ttl
+        self.max_turns = max_turns
+
+    def history(self, session_id: str) -> List[Dict]:
+        raise NotImplementedError
+
+    def append(self, session_id: str, turn: Dict):
+        raise NotImplementedError
+
+    def delete(self, session_id: str):
+        raise NotImplementedError
+
+    def stats(self) -> Dict:
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """Per-process LRU of sessions; each entry expires `ttl` seconds after its last turn."""
+
+    def __init__(self, ttl: float = 1800.0, max_turns: int = 6, max_sessions: int = 5000):
+        super().__init__(ttl, max_turns)
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def history(self, session_id: str) -> List[Dict]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return []
+            if entry["updated"] + self.ttl < time.time():
+                del self._sessions[session_id]
+                return []
+            self._sessions.move_to_end(session_id)
+            return list(entry["turns"])
+
+    def append(self, session_id: str, turn: Dict):
+        with self._lock:
+            entry = self._sessions.setdefault(session_id, {"turns": [], "updated": 0.0})
+            entry["turns"] = (entry["turns"] + [turn])[-self.max_turns:]
+            entry["updated"] = time.time()
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self) -> Dict:
+        return {"backend": "memory", "sessions": len(self._sessions), "max_sessions": self.max_sessions,
+                "ttl_s": self.ttl, "max_turns": self.max_turns}
+
+
+class SQLiteSessionStore(SessionStore):
+    """Turns in a SQLite file, shared by every worker process on the host."""
+
+    PRUNE_EVERY = 100
+
+    def __init__(self, path: Path, ttl: float = 1800.0, max_turns: int = 6):
+        super().__init__(ttl, max_turns)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS turns ("
+                " session_id TEXT NOT NULL, created REAL NOT NULL, payload TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS turns_session ON turns (session_id, created)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread (and per process: never reuse one across fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(str(self.path), timeout=5.0)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def history(self, session_id: str) -> List[Dict]:
+        rows = self._connect().execute(
+            "SELECT payload FROM turns WHERE session_id = ? AND created > ? ORDER BY created DESC LIMIT ?",
+            (session_id, time.time() - self.ttl, self.max_turns),
+        ).fetchall()
+        return [json.loads(payload) for (payload,) in reversed(rows)]
+
+    def append(self, session_id: str, turn: Dict):
+        with self._connect() as conn:
+            conn.execute("INSERT INTO turns (session_id, created, payload) VALUES (?, ?, ?)",
+                         (session_id, turn.get("created", time.time()), json.dumps(turn)))
+            conn.execute(
+                "DELETE FROM turns WHERE session_id = ? AND rowid NOT IN ("
+                " SELECT rowid FROM turns WHERE session_id = ? ORDER BY created DESC LIMIT ?)",
+                (session_id, session_id, self.max_turns),
+            )
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM turns WHERE created <= ?", (time.time() - self.ttl,))
+
+    def delete(self, session_id: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+
+    def stats(self) -> Dict:
+        (sessions,) = self._connect().execute(
+            "SELECT COUNT(DISTINCT session_id) FROM turns WHERE created > ?", (time.time() - self.ttl,)
+        ).fetchone()
+        return {"backend": "sqlite", "path": str(self.path), "sessions": sessions,
+                "ttl_s": self.ttl, "max_turns": self.max_turns}
+
+
+def make_session_store(default_db: Path) -> SessionStore:
+    """SESSION_STORE, defaulting to SQLite under several workers (a follow-up may land on any of them)."""
+    ttl = float(os.getenv("SESSION_TTL", "1800"))
+    max_turns = int(os.getenv("SESSION_MAX_TURNS", "6"))
+    multi_worker = bool(os.getenv("MPL_MASTER_PID")) or int(os.getenv("WEB_CONCURRENCY", "0") or 0) > 1
+    backend = os.getenv("SESSION_STORE", "sqlite" if multi_worker else "memory").strip().lower()
+    if backend == "sqlite":
+        return SQLiteSessionStore(Path(os.getenv("SESSION_DB", str(default_db))), ttl, max_turns)
+    if multi_worker:
+        print("⚠️  SESSION_STORE=memory with several workers: follow-ups reaching another worker "
+              "lose their history. Use SESSION_STORE=sqlite.")
+    return MemorySessionStore(ttl, max_turns, int(os.getenv("SESSION_MAX_SESSIONS", "5000")))
@@ -0,0 +1,189 @@
+"""
+Per-Act index shards with parallel fan-out search.
+
+`ingest.py --shard-by-act` builds one index per `document_title` instead of a
+single `legal_docs` index: NumPy shards are sub-directories, Chroma shards are
+collections (`legal_docs__<slug>`) in one persistent directory. `shards.json`
+in the index directory lists them, so a single Act can be rebuilt with
+`--only` while the other shards are left untouched.
+
+A query is sent to the shards whose Act the user's question names explicitly
+(e.g. "... under the Labour Act", matched through the same aliases as
+citations), or to all of them, on a thread pool. A topic word alone ("child
+labour") or an Act the LLM rewrite added never narrows it. The per-shard top-k
+are merged by score. Exact NumPy shards merge to exactly the global top-k.
+Per-shard latency is kept for /api/admin/index and reported per request.
+"""
+import os
+import re
+import json
+import time
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from backend.citations import ActMatcher
+
+SHARDS_FILE = "shards.json"
+COLLECTION_NAME = "legal_docs"
+EWMA_ALPHA = 0.2
+
+
+def shard_name(document_title: str) -> str:
+    """Filesystem- and Chroma-safe slug of an Act title."""
+    slug = re.sub(r"[^a-z0-9]+", "_", document_title.lower()).strip("_")
+    return slug[:48] or "untitled"
+
+
+def collection_name(shard: str) -> str:
+    return f"{COLLECTION_NAME}__{shard}"
+
+
+def is_sharded(index_dir: Path) -> bool:
+    return (Path(index_dir) / SHARDS_FILE).exists()
+
+
+def read_shard_manifest(index_dir: Path) -> Dict:
+    with open(Path(index_dir) / SHARDS_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def update_shard_manifest(index_dir: Path, backend: str, embedding_model: str, built: Dict[str, Dict],
+                          replace_all: bool) -> Dict:
+    """Record rebuilt shards; other shards' entries are kept unless replace_all."""
+    index_dir = Path(index_dir)
+    manifest = {"backend": backend, "embedding_model": embedding_model, "shards": {}}
+    if is_sharded(index_dir) and not replace_all:
+        previous = read_shard_manifest(index_dir)
+        if previous.get("backend") != backend or previous.get("embedding_model") != embedding_model:
+            raise ValueError(f"Existing shards were built with {previous.get('backend')}/"
+                             f"{previous.get('embedding_model')}; rebuild all of them instead of --only.")
+        manifest["shards"] = previous["shards"]
+    manifest["shards"].update(built)
+    manifest["updated_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    tmp = index_dir / (SHARDS_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, index_dir / SHARDS_FILE)
+    return manifest
+
+
+def replace_dir(built: Path, target: Path):
+    """Move a freshly built shard directory into place, then remove the old one."""
+    old = target.with_name(f".{target.name}.old")
+    shutil.rmtree(old, ignore_errors=True)
+    if target.exists():
+        os.replace(target, old)
+    os.replace(built, target)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+class Shard:
+    def __init__(self, name: str, document_title: str, backend: str, store):
+        self.name = name
+        self.document_title = document_title
+        self.backend = backend
+        self.store = store
+        self.searches = 0
+        self.last_ms = 0.0
+        self.avg_ms = None
+        self.max_ms = 0.0
+
+    def search(self, query_emb, k: int) -> List[Dict]:
+        """Hits as {"text", "metadata", "score"}, higher score = more similar."""
+        if self.backend == "numpy":
+            return self.store.search(query_emb, k)
+        results = self.store.query(query_embeddings=[query_emb], n_results=k)
+        # Chroma returns distances (smaller is closer) in the collection's space; negate to rank
+        return [{"text": doc, "metadata": meta, "score": -dist} for doc, meta, dist in zip(
+            results["documents"][0], results["metadatas"][0], results["distances"][0])]
+
+    def record(self, elapsed_ms: float):
+        self.searches += 1
+        self.last_ms = elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.avg_ms = elapsed_ms if self.avg_ms is None else EWMA_ALPHA * elapsed_ms + (1 - EWMA_ALPHA) * self.avg_ms
+
+    def stats(self) -> Dict:
+        return {"document_title": self.document_title, "searches": self.searches,
+                "last_ms": round(self.last_ms, 2), "avg_ms": round(self.avg_ms or 0.0, 2),
+                "max_ms": round(self.max_ms, 2)}
+
+
+class ShardedIndex:
+    """Fans a query out to the relevant shards in parallel and merges the top-k by score."""
+
+    def __init__(self, shards: List[Shard], backend: str, embedding_model: str = "",
+                 max_workers: Optional[int] = None):
+        self.shards = {shard.name: shard for shard in shards}
+        self.matcher = ActMatcher(shard.document_title for shard in shards)
+        self.backend = backend
+        self.embedding_model = embedding_model
+        self.max_workers = max_workers or min(len(shards), os.cpu_count() or 1) or 1
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return sum(getattr(s.store, "size", 0) or 0 for s in self.shards.values())
+
+    def _pool(self) -> ThreadPoolExecutor:
+        # Created lazily per process: executor threads do not survive fork()
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="shard-search")
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def select(self, query_text: str = "") -> List[Shard]:
+        """Shards of the Acts the query names explicitly; all shards when it names none."""
+        named = set(self.matcher.find(query_text or ""))
+        return [s for s in self.shards.values() if s.document_title in named] or list(self.shards.values())
+
+    def _search_one(self, shard: Shard, query_emb, k: int):
+        started = time.perf_counter()
+        hits = shard.search(query_emb, k)
+        elapsed_ms = 1000 * (time.perf_counter() - started)
+        shard.record(elapsed_ms)
+        return hits, elapsed_ms
+
+    def search(self, query_emb, k: int, query_text: str = "", report: Optional[Dict] = None) -> List[Dict]:
+        """Merged top-k; per-shard latencies (ms) are written to `report` when given."""
+        shards = self.select(query_text)
+        if len(shards) == 1:
+            results = [self._search_one(shards[0], query_emb, k)]
+        else:
+            futures = [self._pool().submit(self._search_one, shard, query_emb, k) for shard in shards]
+            results = [future.result() for future in futures]
+        if report is not None:
+            report.update({shard.name: round(ms, 2) for shard, (_, ms) in zip(shards, results)})
+        hits = [hit for shard_hits, _ in results for hit in shard_hits]
+        hits.sort(key=lambda hit: hit["score"], reverse=True)
+        return hits[:k]
+
+    def stats(self) -> Dict:
+        return {"backend": self.backend, "workers": self.max_workers,
+                "shards": {name: shard.stats() for name, shard in self.shards.items()}}
+
+
+def open_sharded_index(index_dir: Path, mmap: bool = True) -> ShardedIndex:
+    """Open every shard listed in `<index_dir>/shards.json`."""
+    index_dir = Path(index_dir)
+    manifest = read_shard_manifest(index_dir)
+    backend = manifest["backend"]
+    shards = []
+    if backend == "numpy":
+        from backend.vector_engine import NumpyVectorIndex
+        for name, info in sorted(manifest["shards"].items()):
+            shards.append(Shard(name, info["document_title"], backend, NumpyVectorIndex(index_dir / name, mmap=mmap)))
+    else:
+        import chromadb
+        client = chromadb.PersistentClient(path=str(index_dir))
+        for name, info in sorted(manifest["shards"].items()):
+            shards.append(Shard(name, info["document_title"], backend, client.get_collection(collection_name(name))))
+    threads = int(os.getenv("SHARD_SEARCH_THREADS", "0")) or None
+    print(f"🧩 Opened {len(shards)} {backend} shards from {index_dir}")
+    return ShardedIndex(shards, backend, manifest.get("embedding_model", ""), max_workers=threads)
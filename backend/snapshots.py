@@ -0,0 +1,351 @@
+"""
+Versioned, compressed index snapshots and atomic hot-swap.
+
+`ingest.py --publish` packs a built index (Chroma or NumPy: vectors, metadata
+and manifest) into `<version>.tar.gz` with a `<version>.json` sidecar in the
+snapshots directory, and points `latest.json` at it. The backend extracts a
+snapshot into a local cache directory, opens it off the request path and swaps
+it into an `IndexHolder` with a single reference assignment. Requests that
+already took a reference keep searching the old index until they finish.
+
+    python backend/snapshots.py publish --backend numpy --index numpy_index
+    python backend/snapshots.py list
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import tarfile
+import tempfile
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from config.paths import SNAPSHOTS_DIR, SNAPSHOT_CACHE_DIR, VECTORSTORE_DIR, NUMPY_INDEX_DIR
+from backend.shards import is_sharded, read_shard_manifest, open_sharded_index
+
+LATEST_FILE = "latest.json"
+SNAPSHOT_BACKENDS = ("chroma", "numpy")
+COLLECTION_NAME = "legal_docs"
+# Extracted versions kept on disk: the live one plus the one it replaced
+KEEP_EXTRACTED = 2
+
+
+# ---------- Publishing ----------
+def file_sha256(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def new_version() -> str:
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _write_json_atomic(path: Path, payload: Dict):
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def publish_snapshot(index_dir: Path, backend: str, embedding_model: str = "",
+                     snapshots_dir: Path = SNAPSHOTS_DIR, version: Optional[str] = None,
+                     set_latest: bool = True) -> Dict:
+    """Pack index_dir into <version>.tar.gz plus a <version>.json manifest."""
+    if backend not in SNAPSHOT_BACKENDS:
+        raise ValueError(f"Unknown snapshot backend '{backend}'")
+    index_dir = Path(index_dir)
+    if not index_dir.is_dir() or not any(index_dir.iterdir()):
+        raise FileNotFoundError(f"No index to publish at {index_dir}")
+
+    snapshots_dir = Path(snapshots_dir)
+    snapshots_dir.mkdir(parents=True, exist_ok=True)
+    version = version or new_version()
+    archive = snapshots_dir / f"{version}.tar.gz"
+    if archive.exists():
+        raise FileExistsError(f"Snapshot {version} already exists")
+
+    info = {"version": version, "backend": backend, "embedding_model": embedding_model}
+    if is_sharded(index_dir):
+        shard_manifest = read_shard_manifest(index_dir)
+        info["embedding_model"] = embedding_model or shard_manifest.get("embedding_model", "")
+        info["shards"] = sorted(shard_manifest["shards"])
+        info["rows"] = sum(shard.get("rows", 0) for shard in shard_manifest["shards"].values())
+    elif backend == "numpy":
+        with open(index_dir / "manifest.json", "r", encoding="utf-8") as f:
+            index_manifest = json.load(f)
+        info["embedding_model"] = embedding_model or index_manifest.get("embedding_model", "")
+        info["rows"] = index_manifest.get("rows")
+        info["compression"] = index_manifest.get("compression")
+
+    tmp_archive = archive.with_name(archive.name + ".tmp")
+    with tarfile.open(tmp_archive, "w:gz") as tar:
+        for path in sorted(index_dir.rglob("*")):
+            tar.add(path, arcname=path.relative_to(index_dir).as_posix(), recursive=False)
+    os.replace(tmp_archive, archive)
+
+    info.update({
+        "archive": archive.name,
+        "sha256": file_sha256(archive),
+        "size_mb": round(archive.stat().st_size / 1024 / 1024, 2),
+        "created": datetime.now(timezone.utc).isoformat(),
+    })
+    _write_json_atomic(snapshots_dir / f"{version}.json", info)
+    if set_latest:
+        _write_json_atomic(snapshots_dir / LATEST_FILE, {"version": version})
+    print(f"📦 Published {backend} snapshot {version} ({info['size_mb']} MB) to {snapshots_dir}")
+    return info
+
+
+def list_snapshots(snapshots_dir: Path = SNAPSHOTS_DIR) -> List[Dict]:
+    snapshots = []
+    for path in sorted(Path(snapshots_dir).glob("*.json")):
+        if path.name == LATEST_FILE:
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            snapshots.append(json.load(f))
+    return snapshots
+
+
+def latest_version(snapshots_dir: Path = SNAPSHOTS_DIR) -> Optional[str]:
+    path = Path(snapshots_dir) / LATEST_FILE
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("version")
+
+
+def read_snapshot_info(version: str, snapshots_dir: Path = SNAPSHOTS_DIR) -> Dict:
+    path = Path(snapshots_dir) / f"{version}.json"
+    if not path.exists():
+        raise FileNotFoundError(f"Snapshot {version} not found in {snapshots_dir}")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ---------- Loading ----------
+def extract_snapshot(version: str, snapshots_dir: Path = SNAPSHOTS_DIR,
+                     cache_dir: Path = SNAPSHOT_CACHE_DIR) -> Path:
+    """Verify and unpack a snapshot into cache_dir/<version>, reusing a previous extraction."""
+    target = Path(cache_dir) / version
+    if target.is_dir():
+        return target
+
+    info = read_snapshot_info(version, snapshots_dir)
+    archive = Path(snapshots_dir) / info["archive"]
+    if file_sha256(archive) != info["sha256"]:
+        raise IOError(f"Snapshot {version} failed checksum verification")
+
+    # Private staging dir: several workers may extract the same version at once
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=f".{version}.extracting-", dir=cache_dir))
+    try:
+        with tarfile.open(archive, "r:gz") as tar:
+            for member in tar.getmembers():
+                if member.name.startswith("/") or ".." in Path(member.name).parts or not (member.isfile() or member.isdir()):
+                    raise IOError(f"Unsafe path in snapshot {version}: {member.name}")
+            # The "data" filter (Python 3.12+, backported) additionally blocks links and devices
+            extract_kwargs = {"filter": "data"} if hasattr(tarfile, "data_filter") else {}
+            tar.extractall(staging, **extract_kwargs)
+        try:
+            os.replace(staging, target)
+        except OSError:
+            # Another process finished first; its copy is identical
+            if not target.is_dir():
+                raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return target
+
+
+class LoadedIndex:
+    """An opened snapshot: `store` is a NumpyVectorIndex, a Chroma collection or a ShardedIndex."""
+
+    def __init__(self, version: str, backend: str, store, embedding_model: str, path: Path):
+        self.version = version
+        self.backend = backend
+        self.store = store
+        self.embedding_model = embedding_model
+        self.path = path
+        self.loaded_at = datetime.now(timezone.utc).isoformat()
+
+    def describe(self) -> Dict:
+        return {
+            "version": self.version,
+            "backend": self.backend,
+            "embedding_model": self.embedding_model,
+            "path": str(self.path),
+            "loaded_at": self.loaded_at,
+        }
+
+
+def open_index(path: Path, backend: str, version: str = "local", embedding_model: str = "") -> LoadedIndex:
+    """Open an extracted (or locally built) index directory."""
+    if is_sharded(path):
+        store = open_sharded_index(path)
+        embedding_model = embedding_model or store.embedding_model
+    elif backend == "numpy":
+        from backend.vector_engine import NumpyVectorIndex
+        store = NumpyVectorIndex(path)
+        embedding_model = embedding_model or store.embedding_model
+    else:
+        import chromadb
+        store = chromadb.PersistentClient(path=str(path)).get_collection(name=COLLECTION_NAME)
+    return LoadedIndex(version, backend, store, embedding_model, path)
+
+
+def load_snapshot(version: str, snapshots_dir: Path = SNAPSHOTS_DIR,
+                  cache_dir: Path = SNAPSHOT_CACHE_DIR) -> LoadedIndex:
+    info = read_snapshot_info(version, snapshots_dir)
+    path = extract_snapshot(version, snapshots_dir, cache_dir)
+    return open_index(path, info["backend"], version, info.get("embedding_model", ""))
+
+
+def prune_extracted(cache_dir: Path = SNAPSHOT_CACHE_DIR, keep: List[str] = ()):
+    """Delete older extracted versions. Mapped files stay valid for readers until unmapped."""
+    versions = sorted(p for p in Path(cache_dir).iterdir() if p.is_dir() and not p.name.startswith("."))
+    stale = [p for p in versions if p.name not in keep][:max(len(versions) - KEEP_EXTRACTED, 0)]
+    for path in stale:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+# ---------- Hot-swap ----------
+class IndexHolder:
+    """
+    Holds the live index. Readers call `current()` once per request and use that
+    object throughout; `swap_to()` loads the next snapshot before replacing the
+    reference, so in-flight requests are never interrupted.
+    """
+
+    def __init__(self, snapshots_dir: Path = SNAPSHOTS_DIR, cache_dir: Path = SNAPSHOT_CACHE_DIR,
+                 prepare: Optional[Callable[[LoadedIndex], None]] = None):
+        self.snapshots_dir = Path(snapshots_dir)
+        self.cache_dir = Path(cache_dir)
+        self.prepare = prepare
+        self._current: Optional[LoadedIndex] = None
+        self._swap_lock = threading.Lock()
+        self.status = {"state": "empty", "loading": None, "error": None, "swaps": 0}
+
+    def current(self) -> Optional[LoadedIndex]:
+        return self._current
+
+    def swap_to(self, version: Optional[str] = None) -> LoadedIndex:
+        """Load `version` (default: latest) and make it live. Serialised; blocking."""
+        with self._swap_lock:
+            version = version or latest_version(self.snapshots_dir)
+            if not version:
+                raise FileNotFoundError(f"No published snapshot in {self.snapshots_dir}")
+            if self._current is not None and self._current.version == version:
+                return self._current
+
+            self.status.update({"state": "loading", "loading": version, "error": None})
+            started = time.perf_counter()
+            try:
+                loaded = load_snapshot(version, self.snapshots_dir, self.cache_dir)
+                if self.prepare:
+                    self.prepare(loaded)
+            except Exception as e:
+                self.status.update({"state": "ready" if self._current else "failed",
+                                    "loading": None, "error": f"{version}: {e}"})
+                raise
+
+            previous = self._current
+            self._current = loaded
+            self.status.update({"state": "ready", "loading": None, "swaps": self.status["swaps"] + 1})
+            print(f"🔁 Index snapshot {version} live after {time.perf_counter() - started:.1f}s"
+                  + (f" (replaced {previous.version})" if previous else ""))
+            prune_extracted(self.cache_dir, keep=[version] + ([previous.version] if previous else []))
+            return loaded
+
+    def swap_in_background(self, version: Optional[str] = None) -> threading.Thread:
+        def run():
+            try:
+                self.swap_to(version)
+            except Exception as e:
+                print(f"❌ Snapshot swap failed: {e}")
+
+        thread = threading.Thread(target=run, name="snapshot-swap", daemon=True)
+        thread.start()
+        return thread
+
+    def describe(self) -> Dict:
+        current = self._current
+        return {
+            "current": current.describe() if current else None,
+            "latest": latest_version(self.snapshots_dir),
+            **self.status,
+        }
+
+
+class SnapshotWatcher(threading.Thread):
+    """Polls latest.json and hot-swaps when it points at a new version."""
+
+    def __init__(self, holder: IndexHolder, interval: float):
+        super().__init__(name="snapshot-watcher", daemon=True)
+        self.holder = holder
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                latest = latest_version(self.holder.snapshots_dir)
+                current = self.holder.current()
+                if latest and (current is None or current.version != latest):
+                    self.holder.swap_to(latest)
+            except Exception as e:
+                print(f"⚠️  Snapshot watcher: {e}")
+
+    def stop(self):
+        self.stopped.set()
+
+
+# ---------- CLI ----------
+def main():
+    parser = argparse.ArgumentParser(description="Publish and inspect index snapshots.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    publish = sub.add_parser("publish", help="Pack a built index as a new snapshot")
+    publish.add_argument("--backend", choices=SNAPSHOT_BACKENDS, default="chroma")
+    publish.add_argument("--index", type=Path, default=None,
+                         help="Index directory (defaults to chroma_db/ or numpy_index/)")
+    publish.add_argument("--model", default="", help="Embedding model the index was built with")
+    publish.add_argument("--version", default=None, help="Version label (default: UTC timestamp)")
+    publish.add_argument("--no-latest", action="store_true", help="Do not point latest.json at it")
+    publish.add_argument("--snapshots", type=Path, default=SNAPSHOTS_DIR)
+
+    listing = sub.add_parser("list", help="List published snapshots")
+    listing.add_argument("--snapshots", type=Path, default=SNAPSHOTS_DIR)
+
+    promote = sub.add_parser("promote", help="Point latest.json at an existing snapshot (rollback)")
+    promote.add_argument("version")
+    promote.add_argument("--snapshots", type=Path, default=SNAPSHOTS_DIR)
+    args = parser.parse_args()
+
+    if args.command == "publish":
+        default_dir = NUMPY_INDEX_DIR if args.backend == "numpy" else VECTORSTORE_DIR
+        publish_snapshot(args.index or default_dir, args.backend, args.model,
+                         args.snapshots, args.version, set_latest=not args.no_latest)
+    elif args.command == "list":
+        latest = latest_version(args.snapshots)
+        for info in list_snapshots(args.snapshots):
+            marker = "⭐" if info["version"] == latest else "  "
+            print(f"{marker} {info['version']}  {info['backend']:<7}{info['size_mb']:>8} MB  {info.get('embedding_model', '')}")
+    elif args.command == "promote":
+        read_snapshot_info(args.version, args.snapshots)
+        _write_json_atomic(Path(args.snapshots) / LATEST_FILE, {"version": args.version})
+        print(f"✅ latest.json now points at {args.version}")
+
+
+if __name__ == "__main__":
+    main()
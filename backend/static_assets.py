@@ -0,0 +1,165 @@
+"""
+In-memory serving of the built frontend (frontend/dist).
+
+At startup every file is read once, compressed (gzip, plus brotli when the
+optional `brotli` package is installed; `.br`/`.gz` siblings produced by the
+build are used as-is) and given an ETag. Requests are then answered from
+memory with the best encoding the client accepts, `Cache-Control: immutable`
+for Vite's content-hashed `assets/`, and 304 for a matching `If-None-Match`;
+everything else revalidates. Unknown paths outside `assets/` fall back to
+index.html for client-side routing.
+"""
+import gzip
+import hashlib
+import mimetypes
+from pathlib import Path
+from typing import Dict, Optional
+
+from starlette.responses import FileResponse, Response
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+# Not worth compressing: already compressed formats and tiny files
+INCOMPRESSIBLE = {".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif", ".ico", ".woff", ".woff2",
+                  ".gz", ".br", ".zip", ".mp4", ".webm"}
+MIN_COMPRESS_BYTES = 1024
+# Larger files are streamed from disk (still with cache headers) instead of held in memory
+MAX_INLINE_BYTES = 8 * 1024 * 1024
+ENCODINGS = ("br", "gzip")
+
+
+def accepted_encodings(header: str) -> Dict[str, float]:
+    """Accept-Encoding as {coding: q}; codings with q=0 are excluded."""
+    accepted = {}
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted[coding] = q
+    return accepted
+
+
+class StaticAsset:
+    def __init__(self, path: Path, rel: str, content_type: str, cache_control: str):
+        self.path = path
+        self.rel = rel
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.size = path.stat().st_size
+        self.inline = self.size <= MAX_INLINE_BYTES
+        self.variants: Dict[str, bytes] = {}
+        self.etag = ""
+
+    def load(self):
+        if not self.inline:
+            stat = self.path.stat()
+            self.etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+            return
+        body = self.path.read_bytes()
+        self.etag = f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+        self.variants["identity"] = body
+        if self.path.suffix.lower() in INCOMPRESSIBLE or len(body) < MIN_COMPRESS_BYTES:
+            return
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            prebuilt = self.path.with_name(self.path.name + suffix)
+            if prebuilt.is_file():
+                compressed = prebuilt.read_bytes()
+            elif encoding == "gzip":
+                compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            elif brotli is not None:
+                compressed = brotli.compress(body, quality=11)
+            else:
+                continue
+            if len(compressed) < len(body):
+                self.variants[encoding] = compressed
+
+    def etag_for(self, encoding: str) -> str:
+        # Each representation needs its own strong validator
+        return self.etag if encoding == "identity" else f'{self.etag[:-1]}-{encoding}"'
+
+    def respond(self, accept_encoding: str, if_none_match: Optional[str], head: bool = False) -> Response:
+        headers = {"Cache-Control": self.cache_control}
+        if not self.inline:
+            return FileResponse(self.path, media_type=self.content_type,
+                                headers={**headers, "ETag": self.etag})
+
+        accepted = accepted_encodings(accept_encoding)
+        encoding = "identity"
+        for candidate in ENCODINGS:
+            if candidate in self.variants and accepted.get(candidate, accepted.get("*", 0)) > 0:
+                encoding = candidate
+                break
+        etag = self.etag_for(encoding)
+        headers["ETag"] = etag
+        if len(self.variants) > 1:
+            headers["Vary"] = "Accept-Encoding"
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+
+        if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+            return Response(status_code=304, headers=headers)
+        body = self.variants[encoding]
+        if head:
+            headers["Content-Length"] = str(len(body))
+            return Response(status_code=200, media_type=self.content_type, headers=headers)
+        return Response(content=body, media_type=self.content_type, headers=headers)
+
+
+class StaticIndex:
+    """Every file under `dist_dir`, keyed by URL path relative to the site root."""
+
+    def __init__(self, dist_dir: Path):
+        self.dist_dir = Path(dist_dir)
+        self.assets: Dict[str, StaticAsset] = {}
+        for path in sorted(self.dist_dir.rglob("*")):
+            if not path.is_file():
+                continue
+            rel = path.relative_to(self.dist_dir).as_posix()
+            # Build-time .br/.gz siblings are variants of their source file, not separate URLs
+            if path.suffix in (".br", ".gz") and path.with_suffix("").is_file():
+                continue
+            content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+            if content_type.startswith("text/") or content_type in ("application/javascript", "image/svg+xml"):
+                content_type += "; charset=utf-8"
+            # Vite content-hashes everything it emits into assets/, so those never change
+            cache_control = IMMUTABLE if rel.startswith("assets/") else REVALIDATE
+            asset = StaticAsset(path, rel, content_type, cache_control)
+            asset.load()
+            self.assets[rel] = asset
+        self.index_html = self.assets.get("index.html")
+
+    def lookup(self, url_path: str) -> Optional[StaticAsset]:
+        """The file for `url_path`, index.html for client-side routes, None for a missing asset."""
+        rel = url_path.lstrip("/")
+        asset = self.assets.get(rel)
+        if asset is not None:
+            return asset
+        if rel.startswith("assets/"):
+            # A stale hashed bundle must 404, not come back as HTML with a JS content type
+            return None
+        return self.index_html
+
+    def stats(self) -> Dict:
+        inline = [a for a in self.assets.values() if a.inline]
+        return {
+            "files": len(self.assets),
+            "bytes": sum(a.size for a in self.assets.values()),
+            "memory_bytes": sum(len(v) for a in inline for v in a.variants.values()),
+            "brotli": brotli is not None,
+            "compressed": {enc: sum(1 for a in inline if enc in a.variants) for enc in ENCODINGS},
+        }
@@ -0,0 +1,238 @@
+"""
+Sweep HNSW build/search parameters for the Chroma collection and pick the
+fastest setting that meets a recall target.
+
+The vectors are read back from the existing collection, so the corpus is not
+re-embedded. Each grid point (space, M, ef_construction, ef_search) is built in
+a scratch directory and measured on the evaluation queries: build time, index
+size on disk, query latency (p50/p95) and recall@k against exact search in the
+same space. The chosen parameters go to hnsw_params.json, which ingest.py uses
+for new collections; --apply also rebuilds the live collection from its stored
+vectors with the parameters in its metadata, where Chroma (and so the backend)
+reads them.
+
+    python backend/tune_hnsw.py --k 8 --min-recall 0.95
+    python backend/tune_hnsw.py --spaces cosine ip l2 --M 8 16 32 --ef-search 16 32 64 128 --apply
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from itertools import product
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from config.paths import VECTORSTORE_DIR
+from backend.hnsw import HnswParams, SPACES, HNSW_PARAMS_FILE, save_hnsw_params
+from backend.shards import is_sharded, replace_dir
+from backend.benchmark_retrieval import load_queries, recall_at_k, percentile_ms, dir_size_mb
+
+COLLECTION_NAME = "legal_docs"
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+# Chroma rejects larger add() batches
+ADD_BATCH_SIZE = 4000
+
+
+def read_collection(persist_dir: Path) -> Dict:
+    import chromadb
+
+    if is_sharded(persist_dir):
+        raise ValueError(f"{persist_dir} holds per-Act shards; tune on a flat collection and rebuild the "
+                         "shards with ingest.py --shard-by-act (it reads hnsw_params.json).")
+    collection = chromadb.PersistentClient(path=str(persist_dir)).get_collection(name=COLLECTION_NAME)
+    stored = collection.get(include=["embeddings", "documents", "metadatas"])
+    return {
+        "ids": stored["ids"],
+        "vectors": np.asarray(stored["embeddings"], dtype=np.float32),
+        "documents": stored["documents"],
+        "metadatas": stored["metadatas"],
+        "metadata": dict(collection.metadata or {}),
+    }
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int, space: str) -> np.ndarray:
+    """Row ids of the exact top-k in the given space (what HNSW approximates)."""
+    if space == "cosine":
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    if space == "l2":
+        scores = -(np.sum(queries ** 2, axis=1, keepdims=True) - 2 * queries @ vectors.T
+                   + np.sum(vectors ** 2, axis=1)[None, :])
+    else:
+        scores = queries @ vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def add_in_batches(collection, ids: List[str], vectors: np.ndarray, documents=None, metadatas=None):
+    for start in range(0, len(ids), ADD_BATCH_SIZE):
+        end = start + ADD_BATCH_SIZE
+        collection.add(ids=ids[start:end], embeddings=vectors[start:end].tolist(),
+                       documents=documents[start:end] if documents else None,
+                       metadatas=metadatas[start:end] if metadatas else None)
+
+
+def try_set_search_ef(collection, ef_search: int) -> bool:
+    """Change ef_search on a built collection; older chromadb fixes it at creation (False)."""
+    try:
+        collection.modify(configuration={"hnsw": {"ef_search": ef_search}})
+        return True
+    except Exception:
+        return False
+
+
+def release_chroma():
+    # Chroma caches one system per path; drop it so scratch directories can be removed
+    try:
+        from chromadb.api.client import SharedSystemClient
+        SharedSystemClient.clear_system_cache()
+    except (ImportError, AttributeError):
+        pass
+
+
+def measure(collection, query_embs: np.ndarray, truth: np.ndarray, k: int, repeat: int) -> Dict:
+    latencies, recalls = [], []
+    for qi, emb in enumerate(query_embs):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            res = collection.query(query_embeddings=[emb.tolist()], n_results=k, include=["distances"])
+            latencies.append(time.perf_counter() - start)
+        recalls.append(recall_at_k([int(i) for i in res["ids"][0]], truth[qi].tolist()))
+    return {
+        "recall_at_k": round(float(np.mean(recalls)), 4),
+        "p50_ms": percentile_ms(latencies, 50),
+        "p95_ms": percentile_ms(latencies, 95),
+    }
+
+
+def sweep(vectors: np.ndarray, query_embs: np.ndarray, k: int, spaces: List[str], Ms: List[int],
+          ef_constructions: List[int], ef_searches: List[int], repeat: int) -> List[Dict]:
+    import chromadb
+
+    ids = [str(i) for i in range(len(vectors))]
+    rows = []
+    for space in spaces:
+        truth = exact_top_k(vectors, query_embs, k, space)
+        for M, ef_construction in product(Ms, ef_constructions):
+            pending = sorted(ef_searches)
+            while pending:
+                with tempfile.TemporaryDirectory(prefix="hnsw_") as scratch:
+                    params = HnswParams(space, M, ef_construction, pending[0])
+                    print(f"🔄 Building {params.label()}...")
+                    client = chromadb.PersistentClient(path=scratch)
+                    collection = client.create_collection(name="tuning", metadata=params.metadata())
+                    start = time.perf_counter()
+                    add_in_batches(collection, ids, vectors)
+                    build_s = time.perf_counter() - start
+                    size_mb = dir_size_mb(Path(scratch))
+
+                    # Every ef_search that can be set on this build is measured on it
+                    while pending:
+                        ef_search = pending[0]
+                        if ef_search != params.ef_search and not try_set_search_ef(collection, ef_search):
+                            break
+                        params.ef_search = pending.pop(0)
+                        rows.append({"params": params.to_dict(), "label": params.label(),
+                                     "build_s": round(build_s, 3), "disk_mb": size_mb,
+                                     **measure(collection, query_embs, truth, k, repeat)})
+                    del collection, client
+                    release_chroma()
+    return rows
+
+
+def choose(rows: List[Dict], min_recall: float) -> Dict:
+    """Lowest p50 latency (then smallest index) among rows meeting min_recall, else the best recall."""
+    passing = [r for r in rows if r["recall_at_k"] >= min_recall]
+    if passing:
+        return min(passing, key=lambda r: (r["p50_ms"], r["disk_mb"], r["build_s"]))
+    print(f"⚠️  No setting reached recall@k {min_recall}; choosing the most accurate one.")
+    return max(rows, key=lambda r: (r["recall_at_k"], -r["p50_ms"]))
+
+
+def apply_params(persist_dir: Path, data: Dict, params: HnswParams):
+    """Rebuild the live collection from its stored vectors with `params` in its metadata."""
+    import chromadb
+
+    staging = persist_dir.with_name(f".{persist_dir.name}.tuning")
+    shutil.rmtree(staging, ignore_errors=True)
+    metadata = {key: value for key, value in data["metadata"].items() if not key.startswith("hnsw:")}
+    client = chromadb.PersistentClient(path=str(staging))
+    collection = client.create_collection(name=COLLECTION_NAME, metadata={**metadata, **params.metadata()})
+    add_in_batches(collection, data["ids"], data["vectors"], data["documents"], data["metadatas"])
+    del collection, client
+    release_chroma()
+    replace_dir(staging, persist_dir)
+    print(f"✅ Rebuilt '{COLLECTION_NAME}' in {persist_dir} with {params.label()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HNSW speed/recall sweep for the Chroma collection.")
+    parser.add_argument("--source", type=Path, default=VECTORSTORE_DIR, help="Chroma directory to read vectors from")
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", DEFAULT_EMBEDDING_MODEL),
+                        help="Query encoder (must be the one the collection was built with)")
+    parser.add_argument("--k", type=int, default=8, help="Top-k for recall (default: 8)")
+    parser.add_argument("--queries", type=int, default=100, help="Maximum number of eval queries (default: 100)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed repetitions per query (default: 3)")
+    parser.add_argument("--spaces", nargs="+", choices=SPACES, default=["cosine"])
+    parser.add_argument("--M", nargs="+", type=int, default=[8, 16, 32])
+    parser.add_argument("--ef-construction", nargs="+", type=int, default=[100, 200])
+    parser.add_argument("--ef-search", nargs="+", type=int, default=[16, 32, 64, 128])
+    parser.add_argument("--min-recall", type=float, default=0.95, help="Recall@k the chosen setting must reach")
+    parser.add_argument("--params-out", type=Path, default=HNSW_PARAMS_FILE,
+                        help="Where to write the chosen parameters (default: hnsw_params.json)")
+    parser.add_argument("--apply", action="store_true",
+                        help="Also rebuild the source collection with the chosen parameters")
+    parser.add_argument("--output", type=Path, default=None, help="Optional path to write the JSON report")
+    args = parser.parse_args()
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    data = read_collection(args.source)
+    print(f"📦 {len(data['ids'])} vectors x {data['vectors'].shape[1]} from {args.source}")
+    model = HuggingFaceEmbeddings(
+        model_name=args.model,
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'normalize_embeddings': True}
+    )
+    queries = load_queries(args.queries)
+    query_embs = np.asarray(model.embed_documents(queries), dtype=np.float32)
+    if query_embs.shape[1] != data["vectors"].shape[1]:
+        print(f"❌ {args.model} encodes {query_embs.shape[1]} dims, the collection has "
+              f"{data['vectors'].shape[1]}: pass the --model it was built with.")
+        return 2
+
+    rows = sweep(data["vectors"], query_embs, args.k, args.spaces, args.M, args.ef_construction,
+                 args.ef_search, args.repeat)
+    best = choose(rows, args.min_recall)
+    report = {"k": args.k, "queries": len(queries), "rows": len(data["ids"]), "min_recall": args.min_recall,
+              "current": (HnswParams.from_metadata(data["metadata"]) or HnswParams("l2", 16, 100, 10)).to_dict(),
+              "chosen": best, "settings": rows}
+
+    print(f"\n📊 HNSW sweep (recall@{args.k} vs. exact search, {len(queries)} queries)")
+    print(f"{'setting':<32}{'build s':>9}{'disk MB':>9}{'recall':>8}{'p50 ms':>9}{'p95 ms':>9}")
+    for row in rows:
+        mark = " ⭐" if row is best else ""
+        print(f"{row['label']:<32}{row['build_s']:>9}{row['disk_mb']:>9}{row['recall_at_k']:>8}"
+              f"{row['p50_ms']:>9}{row['p95_ms']:>9}{mark}")
+
+    params = HnswParams.from_dict(best["params"])
+    save_hnsw_params(params, args.params_out, {k: best[k] for k in ("recall_at_k", "p50_ms", "p95_ms", "disk_mb")})
+    print(f"✅ Chosen {params.label()} written to {args.params_out}")
+    if args.apply:
+        apply_params(args.source, data, params)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
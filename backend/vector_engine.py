@@ -0,0 +1,354 @@
+"""
+Exact-search vector engine backed by a memory-mapped NumPy matrix.
+
+For a corpus of a few thousand clauses a brute-force dot product is both
+faster and lighter than Chroma's SQLite + HNSW stack. The index is a plain
+directory:
+
+    manifest.json         dimensions, row count, embedding model, compression settings
+    vectors.npy           (rows, dim) float32 / float16 / int8 matrix (memory-mapped)
+    scales.npy            per-row dequantisation scales (int8 only)
+    pq_codes.npy          (rows, subvectors) uint8 codes (pq only)
+    pq_codebooks.npy      (subvectors, centroids, sub_dim) centroids (pq only)
+    rescore_vectors.npy   float16 copy used to re-score pq candidates exactly
+    pca_mean.npy          PCA projection (pca reduction only)
+    pca_components.npy
+    records.json          parallel array of {"text", "metadata"} per row
+"""
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.compression import (
+    CompressionSettings, QUANTIZATIONS, encode_pq, fit_pca, pq_lookup_tables,
+    pq_scores, quantize_int8, reduce_vectors, train_pq, training_sample,
+)
+
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"
+SCALES_FILE = "scales.npy"
+PQ_CODES_FILE = "pq_codes.npy"
+PQ_CODEBOOKS_FILE = "pq_codebooks.npy"
+RESCORE_FILE = "rescore_vectors.npy"
+PCA_MEAN_FILE = "pca_mean.npy"
+PCA_COMPONENTS_FILE = "pca_components.npy"
+RECORDS_FILE = "records.json"
+
+SUPPORTED_DTYPES = QUANTIZATIONS
+INDEX_FORMAT_VERSION = 2
+
+# Rows scored per matmul block; bounds the float32 scratch buffer to
+# BLOCK_ROWS x dim x 4 bytes regardless of the on-disk dtype.
+BLOCK_ROWS = 4096
+
+
+def clause_key(meta: Dict) -> str:
+    """Stable identifier of a clause, independent of the vector store's own IDs."""
+    return "|".join(str(meta.get(field, "")) for field in (
+        "document_title", "part_number", "article_number", "clause_index", "section"
+    ))
+
+
+class NumpyIndexWriter:
+    """
+    Incrementally build a NumPy index with bounded memory.
+
+    Batches are spooled to disk as raw float32 rows and JSON lines; `close()`
+    then fits any reduction/quantiser on a sample and writes the final files
+    block by block from a memory-mapped view of the spool.
+    """
+
+    def __init__(self, out_dir: Path, compression: Optional[CompressionSettings] = None,
+                 embedding_model: str = ""):
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.compression = compression or CompressionSettings()
+        self.embedding_model = embedding_model
+        self.rows = 0
+        self.source_dim = None
+        self._vector_spool_path = self.out_dir / ".vectors.spool"
+        self._record_spool_path = self.out_dir / ".records.spool"
+        self._vector_spool = open(self._vector_spool_path, "wb")
+        self._record_spool = open(self._record_spool_path, "w", encoding="utf-8")
+
+    def add(self, embeddings, entries: Sequence[Dict]):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(entries):
+            raise ValueError("Embeddings must be a (rows, dim) matrix with one row per entry.")
+        if self.source_dim is None:
+            self.source_dim = int(vectors.shape[1])
+        elif vectors.shape[1] != self.source_dim:
+            raise ValueError(f"Embedding dimension changed from {self.source_dim} to {vectors.shape[1]}")
+
+        self._vector_spool.write(vectors.tobytes())
+        for e in entries:
+            self._record_spool.write(json.dumps({"text": e["text"], "metadata": e["metadata"]}, ensure_ascii=False))
+            self._record_spool.write("\n")
+        self.rows += len(entries)
+
+    def _open_output(self, name: str, dtype, shape) -> np.ndarray:
+        return np.lib.format.open_memmap(self.out_dir / name, mode="w+", dtype=dtype, shape=shape)
+
+    def close(self) -> Path:
+        self._vector_spool.close()
+        self._record_spool.close()
+        if not self.rows:
+            self._cleanup()
+            raise ValueError("Cannot write an empty index.")
+
+        compression = self.compression
+        for name in (VECTORS_FILE, SCALES_FILE, PQ_CODES_FILE, PQ_CODEBOOKS_FILE,
+                     RESCORE_FILE, PCA_MEAN_FILE, PCA_COMPONENTS_FILE):
+            (self.out_dir / name).unlink(missing_ok=True)
+
+        source = np.memmap(self._vector_spool_path, dtype=np.float32, mode="r",
+                           shape=(self.rows, self.source_dim))
+
+        pca = None
+        if compression.reduction == "pca":
+            pca = fit_pca(source, compression.dim)
+            np.save(self.out_dir / PCA_MEAN_FILE, pca[0])
+            np.save(self.out_dir / PCA_COMPONENTS_FILE, pca[1])
+        dim = compression.dim if compression.reduction != "none" else self.source_dim
+
+        codebooks = scales = rescore = None
+        if compression.quantization == "pq":
+            codebooks = train_pq(reduce_vectors(training_sample(source), compression, pca),
+                                 compression.pq_subvectors)
+            np.save(self.out_dir / PQ_CODEBOOKS_FILE, codebooks)
+            target = self._open_output(PQ_CODES_FILE, np.uint8, (self.rows, compression.pq_subvectors))
+            if compression.rescore_candidates:
+                rescore = self._open_output(RESCORE_FILE, np.float16, (self.rows, dim))
+        else:
+            target = self._open_output(VECTORS_FILE, compression.quantization, (self.rows, dim))
+            if compression.quantization == "int8":
+                scales = np.empty(self.rows, dtype=np.float32)
+
+        for start in range(0, self.rows, BLOCK_ROWS):
+            stop = min(start + BLOCK_ROWS, self.rows)
+            block = reduce_vectors(np.asarray(source[start:stop]), compression, pca)
+            if codebooks is not None:
+                target[start:stop] = encode_pq(block, codebooks)
+                if rescore is not None:
+                    rescore[start:stop] = block.astype(np.float16)
+            elif scales is not None:
+                target[start:stop], scales[start:stop] = quantize_int8(block)
+            else:
+                target[start:stop] = block.astype(compression.quantization)
+
+        target.flush()
+        del target, source
+        if rescore is not None:
+            rescore.flush()
+            del rescore
+        if scales is not None:
+            np.save(self.out_dir / SCALES_FILE, scales)
+
+        with open(self._record_spool_path, "r", encoding="utf-8") as spool, \
+                open(self.out_dir / RECORDS_FILE, "w", encoding="utf-8") as f:
+            f.write("[")
+            for i, line in enumerate(spool):
+                if i:
+                    f.write(",")
+                f.write(line.rstrip("\n"))
+            f.write("]")
+
+        manifest = {
+            "format_version": INDEX_FORMAT_VERSION,
+            "rows": self.rows,
+            "dim": int(dim),
+            "source_dim": self.source_dim,
+            "embedding_model": self.embedding_model,
+            "normalized": True,
+            "compression": compression.to_dict(),
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        with open(self.out_dir / MANIFEST_FILE, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+        self._cleanup()
+        return self.out_dir
+
+    def discard(self):
+        """Abandon the build and remove the spool files."""
+        self._vector_spool.close()
+        self._record_spool.close()
+        self._cleanup()
+
+    def _cleanup(self):
+        self._vector_spool_path.unlink(missing_ok=True)
+        self._record_spool_path.unlink(missing_ok=True)
+
+
+def write_numpy_index(out_dir: Path, embeddings, entries: Sequence[Dict],
+                      compression: Optional[CompressionSettings] = None,
+                      embedding_model: str = "") -> Path:
+    """Write embeddings plus their {"text", "metadata"} entries as a NumPy index."""
+    writer = NumpyIndexWriter(out_dir, compression=compression, embedding_model=embedding_model)
+    writer.add(embeddings, entries)
+    return writer.close()
+
+
+class NumpyVectorIndex:
+    """Brute-force inner-product search over a memory-mapped, optionally compressed matrix."""
+
+    def __init__(self, index_dir: Path, mmap: bool = True):
+        self.index_dir = Path(index_dir)
+        manifest_path = self.index_dir / MANIFEST_FILE
+        if not manifest_path.exists():
+            raise FileNotFoundError(f"No NumPy index manifest at {manifest_path}")
+
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+
+        # Format 1 indexes only recorded a storage dtype
+        if "compression" in self.manifest:
+            self.compression = CompressionSettings.from_dict(self.manifest["compression"])
+        else:
+            self.compression = CompressionSettings(quantization=self.manifest["dtype"])
+
+        mmap_mode = "r" if mmap else None
+        self.vectors = self.scales = self.pq_codes = self.pq_codebooks = self.rescore_vectors = None
+        self.pca = None
+
+        if self.compression.quantization == "pq":
+            self.pq_codes = np.load(self.index_dir / PQ_CODES_FILE, mmap_mode=mmap_mode)
+            self.pq_codebooks = np.load(self.index_dir / PQ_CODEBOOKS_FILE)
+            if self.compression.rescore_candidates:
+                self.rescore_vectors = np.load(self.index_dir / RESCORE_FILE, mmap_mode="r")
+            rows = self.pq_codes.shape[0]
+        else:
+            self.vectors = np.load(self.index_dir / VECTORS_FILE, mmap_mode=mmap_mode)
+            if self.compression.quantization == "int8":
+                self.scales = np.load(self.index_dir / SCALES_FILE)
+            rows = self.vectors.shape[0]
+
+        if self.compression.reduction == "pca":
+            self.pca = (np.load(self.index_dir / PCA_MEAN_FILE), np.load(self.index_dir / PCA_COMPONENTS_FILE))
+
+        with open(self.index_dir / RECORDS_FILE, "r", encoding="utf-8") as f:
+            self.records = json.load(f)
+
+        if len(self.records) != rows:
+            raise ValueError(
+                f"Index at {self.index_dir} is inconsistent: "
+                f"{rows} vectors vs {len(self.records)} records"
+            )
+
+    @property
+    def size(self) -> int:
+        return len(self.records)
+
+    @property
+    def dim(self) -> int:
+        return int(self.manifest["dim"])
+
+    @property
+    def source_dim(self) -> int:
+        return int(self.manifest.get("source_dim", self.manifest["dim"]))
+
+    @property
+    def embedding_model(self) -> str:
+        return self.manifest.get("embedding_model", "")
+
+    def footprint(self) -> Dict[str, int]:
+        """Bytes scanned on every query vs. bytes only touched for re-scoring."""
+        scanned = [self.vectors, self.scales, self.pq_codes, self.pq_codebooks]
+        if self.pca is not None:
+            scanned.extend(self.pca)
+        return {
+            "scanned_bytes": int(sum(a.nbytes for a in scanned if a is not None)),
+            "rescore_bytes": int(self.rescore_vectors.nbytes) if self.rescore_vectors is not None else 0,
+            "records_bytes": (self.index_dir / RECORDS_FILE).stat().st_size,
+        }
+
+    def _prepare_queries(self, query_embeddings) -> np.ndarray:
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        if queries.shape[1] != self.source_dim:
+            raise ValueError(
+                f"Query dimension {queries.shape[1]} does not match index dimension {self.source_dim} "
+                f"(index built with '{self.embedding_model}')."
+            )
+        return reduce_vectors(queries, self.compression, self.pca)
+
+    def _score_blocks(self, queries: np.ndarray):
+        """Yield (start, scores) for consecutive row blocks."""
+        if self.pq_codes is not None:
+            tables = pq_lookup_tables(queries, self.pq_codebooks)
+            for start in range(0, self.size, BLOCK_ROWS):
+                yield start, pq_scores(tables, np.asarray(self.pq_codes[start:start + BLOCK_ROWS]))
+            return
+
+        for start in range(0, self.size, BLOCK_ROWS):
+            block = np.asarray(self.vectors[start:start + BLOCK_ROWS], dtype=np.float32)
+            scores = queries @ block.T
+            if self.scales is not None:
+                scores *= self.scales[start:start + BLOCK_ROWS]
+            yield start, scores
+
+    def _rescore(self, queries: np.ndarray, cand_ids: np.ndarray) -> np.ndarray:
+        """Exact float scores for each query's candidate rows."""
+        scores = np.empty(cand_ids.shape, dtype=np.float32)
+        for qi, rows in enumerate(cand_ids):
+            order = np.argsort(rows)
+            exact = np.asarray(self.rescore_vectors[rows[order]], dtype=np.float32) @ queries[qi]
+            scores[qi, order] = exact
+        return scores
+
+    def top_k_indices(self, query_embeddings, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (row_ids, scores), each shaped (queries, k), best first."""
+        queries = self._prepare_queries(query_embeddings)
+        k = max(1, min(k, self.size))
+        keep_n = k
+        if self.rescore_vectors is not None:
+            keep_n = max(k, min(self.compression.rescore_candidates, self.size))
+        n_queries = queries.shape[0]
+
+        best_scores = np.full((n_queries, 0), -np.inf, dtype=np.float32)
+        best_ids = np.empty((n_queries, 0), dtype=np.int64)
+
+        for start, scores in self._score_blocks(queries):
+            ids = np.broadcast_to(np.arange(start, start + scores.shape[1]), scores.shape)
+            cand_scores = np.concatenate([best_scores, scores], axis=1)
+            cand_ids = np.concatenate([best_ids, ids], axis=1)
+
+            if cand_scores.shape[1] > keep_n:
+                keep = np.argpartition(-cand_scores, keep_n - 1, axis=1)[:, :keep_n]
+                cand_scores = np.take_along_axis(cand_scores, keep, axis=1)
+                cand_ids = np.take_along_axis(cand_ids, keep, axis=1)
+            best_scores, best_ids = cand_scores, cand_ids
+
+        if self.rescore_vectors is not None:
+            best_scores = self._rescore(queries, best_ids)
+
+        order = np.argsort(-best_scores, axis=1)[:, :k]
+        return np.take_along_axis(best_ids, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def _hits(self, row_ids: np.ndarray, scores: np.ndarray) -> List[Dict]:
+        hits = []
+        for row, score in zip(row_ids.tolist(), scores.tolist()):
+            record = self.records[row]
+            hits.append({"row": row, "score": score, "text": record["text"], "metadata": record["metadata"]})
+        return hits
+
+    def search(self, query_embedding, k: int = 4) -> List[Dict]:
+        """Top-k hits for a single query embedding."""
+        return self.search_batch([query_embedding], k)[0]
+
+    def search_batch(self, query_embeddings, k: int = 4) -> List[List[Dict]]:
+        """Top-k hits for several queries in one vectorised pass."""
+        row_ids, scores = self.top_k_indices(query_embeddings, k)
+        return [self._hits(r, s) for r, s in zip(row_ids, scores)]
+
+
+def load_numpy_index(index_dir: Path, mmap: bool = True) -> Optional[NumpyVectorIndex]:
+    """Load an index, or return None when it has not been built yet."""
+    try:
+        return NumpyVectorIndex(index_dir, mmap=mmap)
+    except FileNotFoundError:
+        return None
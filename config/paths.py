@@ -8,6 +8,9 @@ PROCESSED_DIR = PROJECT_ROOT / "processeddata"
 VECTORSTORE_DIR = PROJECT_ROOT / "chroma_db"
 VECTORSTORE1_DIR = PROJECT_ROOT / "chroma_db1"
 VECTORSTORE2_DIR = PROJECT_ROOT / "chroma_db2"
+NUMPY_INDEX_DIR = PROJECT_ROOT / "numpy_index"
+SNAPSHOTS_DIR = PROJECT_ROOT / "snapshots"
+SNAPSHOT_CACHE_DIR = PROJECT_ROOT / "index_cache"
 EVAL_PATH = DATA_DIR / "evaluation" / "Evaluation_dataset.json"
 # Ensure directories exist
 DATA_DIR.mkdir(exist_ok=True)
@@ -6,26 +6,31 @@ Maintains exact local file structure for seamless integration.
 """
 
 import os
+import io
 import json
 import pickle
+import shutil
+import hashlib
 import zipfile
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Set
 import argparse
 from datetime import datetime
 
-# Google API imports
+# Google API imports (only required for the Google Drive backend)
 try:
     from google.auth.transport.requests import Request
     from google_auth_oauthlib.flow import InstalledAppFlow
     from google.oauth2 import service_account
     from googleapiclient.discovery import build
-    from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
-    import io
+    from googleapiclient.http import MediaIoBaseUpload
+    GOOGLE_API_AVAILABLE = True
 except ImportError:
-    print("❌ Missing Google API dependencies. Install with:")
-    print("pip install google-auth google-auth-oauthlib google-api-python-client")
-    exit(1)
+    GOOGLE_API_AVAILABLE = False
 
 # ============================================================
 # CONFIGURATION
@@ -52,9 +57,395 @@ class DataSyncConfig:
     # Google Drive folder name
     DRIVE_FOLDER_NAME = 'MyPocketLawyer_RAG_Data'
     
+    # Delta sync: remote manifest, content-addressed objects and local hash cache
+    MANIFEST_NAME = 'sync_manifest.json'
+    OBJECTS_FOLDER_NAME = 'objects'
+    LOCAL_MANIFEST_CACHE = '.sync_manifest_cache.json'
+    TRANSFER_WORKERS = 4
+    
+    # Streaming transfers: chunk size (multiple of 256 KiB) and resumable session state
+    TRANSFER_CHUNK_SIZE = 8 * 256 * 1024
+    TRANSFER_STATE_FILE = '.transfer_state.json'
+    # Temp files left by interrupted downloads and atomic writes; never synced
+    TEMP_SUFFIXES = ('.part', '.tmp')
+    
     # Local project root
     PROJECT_ROOT = Path(__file__).parent
 
+# ============================================================
+# STREAMING TRANSFER ENGINE
+# ============================================================
+
+class TransferComplete(Exception):
+    """Raised by a transport when the server reports the upload as finished"""
+
+
+class DriveTransport:
+    """Drive v3 resumable-upload and ranged-download protocol over AuthorizedSession"""
+    
+    UPLOAD_URL = 'https://www.googleapis.com/upload/drive/v3/files'
+    FILES_URL = 'https://www.googleapis.com/drive/v3/files'
+    
+    def __init__(self, drive_sync: 'GoogleDriveSync'):
+        self.drive = drive_sync
+        self._local = threading.local()
+    
+    def _session(self):
+        if getattr(self._local, 'session', None) is None:
+            from google.auth.transport.requests import AuthorizedSession
+            self._local.session = AuthorizedSession(self.drive.creds)
+        return self._local.session
+    
+    def find(self, name: str, parent: str) -> Optional[str]:
+        for file_info in self.drive.list_drive_files(parent, name=name):
+            return file_info['id']
+        return None
+    
+    def start_upload(self, name: str, parent: str, mimetype: str = 'application/octet-stream') -> str:
+        existing = self.find(name, parent)
+        headers = {'X-Upload-Content-Type': mimetype}
+        if existing:
+            resp = self._session().patch(f"{self.UPLOAD_URL}/{existing}?uploadType=resumable",
+                                         json={'name': name}, headers=headers)
+        else:
+            resp = self._session().post(f"{self.UPLOAD_URL}?uploadType=resumable",
+                                        json={'name': name, 'parents': [parent]}, headers=headers)
+        resp.raise_for_status()
+        return resp.headers['Location']
+    
+    @staticmethod
+    def _committed(resp) -> int:
+        # 308 Resume Incomplete carries "Range: bytes=0-N" once anything is stored
+        byte_range = resp.headers.get('Range')
+        return int(byte_range.split('-')[1]) + 1 if byte_range else 0
+    
+    def upload_chunk(self, session: str, data: bytes, offset: int, total: Optional[int]) -> int:
+        """Send bytes at offset; returns the committed offset or raises TransferComplete"""
+        end = offset + len(data) - 1
+        size = str(total) if total is not None else '*'
+        content_range = f"bytes {offset}-{end}/{size}" if data else f"bytes */{size}"
+        resp = self._session().put(session, data=data, headers={'Content-Range': content_range})
+        if resp.status_code in (200, 201):
+            raise TransferComplete()
+        if resp.status_code != 308:
+            resp.raise_for_status()
+        return self._committed(resp)
+    
+    def query_offset(self, session: str) -> int:
+        resp = self._session().put(session, headers={'Content-Range': 'bytes */*'})
+        if resp.status_code in (200, 201):
+            raise TransferComplete()
+        if resp.status_code != 308:
+            resp.raise_for_status()
+        return self._committed(resp)
+    
+    def open_download(self, ref: str, offset: int, chunk_size: int):
+        """Yield (restarted, chunk) pairs starting at offset"""
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        resp = self._session().get(f"{self.FILES_URL}/{ref}?alt=media", headers=headers, stream=True)
+        if resp.status_code == 416:
+            return
+        resp.raise_for_status()
+        restarted = bool(offset) and resp.status_code != 206
+        for chunk in resp.iter_content(chunk_size):
+            yield restarted, chunk
+            restarted = False
+
+
+class LocalTransport:
+    """Directory-backed stand-in speaking the same resumable protocol (offline testing)"""
+    
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.sessions_dir = self.root / '.sessions'
+        self.sessions_dir.mkdir(parents=True, exist_ok=True)
+    
+    def _target(self, name: str, parent: str) -> Path:
+        return self.root / parent / name if parent else self.root / name
+    
+    def find(self, name: str, parent: str) -> Optional[str]:
+        target = self._target(name, parent)
+        return str(target.relative_to(self.root)) if target.exists() else None
+    
+    def start_upload(self, name: str, parent: str, mimetype: str = 'application/octet-stream') -> str:
+        session = hashlib.sha256(f"{parent}/{name}/{datetime.now().isoformat()}".encode()).hexdigest()[:16]
+        with open(self.sessions_dir / f"{session}.json", 'w') as f:
+            json.dump({'name': name, 'parent': parent}, f)
+        (self.sessions_dir / f"{session}.part").touch()
+        return session
+    
+    def upload_chunk(self, session: str, data: bytes, offset: int, total: Optional[int]) -> int:
+        part = self.sessions_dir / f"{session}.part"
+        if not part.exists():
+            raise TransferComplete()
+        with open(part, 'r+b') as f:
+            f.seek(offset)
+            f.write(data)
+            f.truncate()
+        committed = offset + len(data)
+        if total is not None and committed >= total:
+            with open(self.sessions_dir / f"{session}.json", 'r') as f:
+                meta = json.load(f)
+            target = self._target(meta['name'], meta['parent'])
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(part, target)
+            (self.sessions_dir / f"{session}.json").unlink()
+            raise TransferComplete()
+        return committed
+    
+    def query_offset(self, session: str) -> int:
+        part = self.sessions_dir / f"{session}.part"
+        if not part.exists():
+            raise TransferComplete()
+        return part.stat().st_size
+    
+    def open_download(self, ref: str, offset: int, chunk_size: int):
+        with open(self.root / ref, 'rb') as f:
+            f.seek(offset)
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                yield False, chunk
+
+
+class _ChunkPipe(io.RawIOBase):
+    """Non-seekable write end handing fixed-size chunks to the uploader via a bounded queue"""
+    
+    EOF = object()
+    
+    def __init__(self, chunk_size: int, max_chunks: int):
+        self.chunk_size = chunk_size
+        self.queue = queue.Queue(maxsize=max_chunks)
+        self.cancelled = threading.Event()
+        self._buffer = bytearray()
+        self._written = 0
+        self._ended = False
+    
+    def writable(self) -> bool:
+        return True
+    
+    def tell(self) -> int:
+        return self._written
+    
+    def _put(self, item) -> None:
+        # Blocks while the uploader is behind (backpressure), unless it gave up
+        while not self.cancelled.is_set():
+            try:
+                self.queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        raise IOError("upload cancelled")
+    
+    def write(self, data) -> int:
+        self._buffer += data
+        self._written += len(data)
+        while len(self._buffer) >= self.chunk_size:
+            self._put(bytes(self._buffer[:self.chunk_size]))
+            del self._buffer[:self.chunk_size]
+        return len(data)
+    
+    def end(self, error: Optional[BaseException] = None) -> None:
+        if self._ended or self.cancelled.is_set():
+            return
+        self._ended = True
+        if self._buffer and error is None:
+            self._put(bytes(self._buffer))
+        self._buffer = bytearray()
+        self._put(error or _ChunkPipe.EOF)
+
+
+class TransferEngine:
+    """
+    Chunked, resumable transfers with bounded memory (safe to share across threads).
+    
+    Uploads are sent as resumable sessions in TRANSFER_CHUNK_SIZE pieces (a multiple of
+    256 KiB, as Drive requires); session URIs are persisted so an interrupted
+    upload continues from the server's committed offset on the next run.
+    Downloads stream into '<file>.part' and resume from its size.
+    """
+    
+    PIPE_DEPTH = 4
+    MAX_RETRIES = 5
+    
+    def __init__(self, transport, config: DataSyncConfig):
+        self.transport = transport
+        self.state_path = config.PROJECT_ROOT / config.TRANSFER_STATE_FILE
+        self.chunk_size = config.TRANSFER_CHUNK_SIZE
+        self._state_lock = threading.Lock()
+    
+    # ---------- resumable session state ----------
+    
+    def _load_state(self) -> Dict[str, str]:
+        if not self.state_path.exists():
+            return {}
+        try:
+            with open(self.state_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def _set_session(self, key: str, session: Optional[str]) -> None:
+        with self._state_lock:
+            state = self._load_state()
+            if session:
+                state[key] = session
+            else:
+                state.pop(key, None)
+            with open(self.state_path, 'w') as f:
+                json.dump(state, f, indent=2)
+    
+    def _resume_session(self, key: str, name: str, parent: str, mimetype: str):
+        """Return (session, committed_offset), reusing a persisted session when still valid"""
+        session = self._load_state().get(key)
+        if session:
+            try:
+                return session, self.transport.query_offset(session)
+            except TransferComplete:
+                self._set_session(key, None)
+                return None, -1
+            except Exception:
+                pass  # expired or unknown session: start over
+        session = self.transport.start_upload(name, parent, mimetype)
+        self._set_session(key, session)
+        return session, 0
+    
+    def _send(self, session: str, data: bytes, offset: int, total: Optional[int]) -> int:
+        """Send one chunk, retrying from the server's committed offset; returns the new offset"""
+        failures = 0
+        while True:
+            try:
+                committed = self.transport.upload_chunk(session, data, offset, total)
+            except TransferComplete:
+                raise
+            except Exception as e:
+                failures += 1
+                if failures >= self.MAX_RETRIES:
+                    raise
+                print(f"⚠️  Chunk at byte {offset} failed ({e}), retrying...")
+                time.sleep(2 ** failures)
+                committed = self.transport.query_offset(session)
+            if committed >= offset + len(data):
+                return committed
+            if committed <= offset:
+                failures += 1
+                if failures >= self.MAX_RETRIES:
+                    raise IOError(f"upload stalled at byte {offset}")
+            # Partial commit: resend only what the server does not have yet
+            data, offset = data[max(committed - offset, 0):], max(committed, offset)
+    
+    # ---------- uploads ----------
+    
+    def upload_file(self, local_path: Path, name: str, parent: str,
+                    mimetype: str = 'application/octet-stream') -> int:
+        """Upload a file chunk by chunk, resuming a previous session if one exists"""
+        local_path = Path(local_path)
+        stat = local_path.stat()
+        total = stat.st_size
+        key = f"file:{parent}/{name}:{total}:{stat.st_mtime}"
+        session, offset = self._resume_session(key, name, parent, mimetype)
+        if session is None:
+            return total
+        try:
+            with open(local_path, 'rb') as f:
+                f.seek(offset)
+                while True:
+                    data = f.read(self.chunk_size)
+                    offset = self._send(session, data, offset, total)
+                    f.seek(offset)
+                    if not data:
+                        break
+        except TransferComplete:
+            pass
+        self._set_session(key, None)
+        return total
+    
+    def upload_stream(self, producer, name: str, parent: str, resume_key: Optional[str] = None,
+                      mimetype: str = 'application/octet-stream') -> int:
+        """
+        Upload bytes written by producer(fileobj) while it is still producing them.
+        The producer runs on its own thread, so compression overlaps network I/O;
+        at most PIPE_DEPTH chunks are buffered. With a resume_key, a deterministic
+        producer is re-run and bytes the server already holds are skipped.
+        """
+        key = f"stream:{parent}/{name}:{resume_key}" if resume_key else None
+        if key:
+            session, skip = self._resume_session(key, name, parent, mimetype)
+            if session is None:
+                return -1
+        else:
+            session, skip = self.transport.start_upload(name, parent, mimetype), 0
+        
+        pipe = _ChunkPipe(self.chunk_size, self.PIPE_DEPTH)
+        
+        def produce():
+            try:
+                producer(pipe)
+                pipe.end()
+            except BaseException as e:
+                pipe.end(e)
+        
+        thread = threading.Thread(target=produce, daemon=True)
+        thread.start()
+        
+        position, offset, held = 0, skip, None
+        try:
+            while True:
+                item = pipe.queue.get()
+                if isinstance(item, BaseException):
+                    raise item
+                if held is not None:
+                    final = item is _ChunkPipe.EOF
+                    start = position - len(held)
+                    if start + len(held) > offset:
+                        data = held[max(offset - start, 0):]
+                        total = position if final else None
+                        offset = self._send(session, data, max(offset, start), total)
+                    elif final:
+                        self._send(session, b'', position, position)
+                if item is _ChunkPipe.EOF:
+                    if held is None:
+                        self._send(session, b'', 0, 0)
+                    break
+                held = item
+                position += len(item)
+        except TransferComplete:
+            pass
+        finally:
+            pipe.cancelled.set()
+            thread.join()
+        if key:
+            self._set_session(key, None)
+        return position
+    
+    # ---------- downloads ----------
+    
+    def download_file(self, ref: str, local_path: Path) -> int:
+        """Stream a remote file to disk via '<file>.part', resuming a partial download"""
+        local_path = Path(local_path)
+        local_path.parent.mkdir(parents=True, exist_ok=True)
+        part = local_path.with_name(local_path.name + '.part')
+        offset = part.stat().st_size if part.exists() else 0
+        
+        for attempt in range(self.MAX_RETRIES):
+            try:
+                with open(part, 'ab') as f:
+                    for restarted, chunk in self.transport.open_download(ref, offset, self.chunk_size):
+                        if restarted:
+                            f.seek(0)
+                            f.truncate()
+                            offset = 0
+                        f.write(chunk)
+                        offset += len(chunk)
+                break
+            except Exception as e:
+                if attempt == self.MAX_RETRIES - 1:
+                    raise
+                print(f"⚠️  Download of {local_path.name} interrupted at {offset} bytes ({e}), resuming...")
+                time.sleep(2 ** attempt)
+                offset = part.stat().st_size
+        
+        os.replace(part, local_path)
+        return offset
+
 # ============================================================
 # GOOGLE DRIVE SERVICE
 # ============================================================
@@ -65,10 +456,32 @@ class GoogleDriveSync:
     def __init__(self, config: DataSyncConfig):
         self.config = config
         self.service = None
+        self.creds = None
         self.drive_folder_id = None
+        self._local = threading.local()
+        self._engine = None
+    
+    def transfer_engine(self) -> TransferEngine:
+        """Shared streaming transfer engine speaking the Drive resumable protocol"""
+        if self._engine is None:
+            self._engine = TransferEngine(DriveTransport(self), self.config)
+        return self._engine
+        
+    def thread_service(self):
+        """Drive service for the calling thread (httplib2 clients are not thread-safe)"""
+        if threading.current_thread() is threading.main_thread():
+            return self.service
+        if getattr(self._local, 'service', None) is None:
+            self._local.service = build('drive', 'v3', credentials=self.creds, cache_discovery=False)
+        return self._local.service
         
     def authenticate(self) -> bool:
         """Authenticate with Google Drive using OAuth"""
+        if not GOOGLE_API_AVAILABLE:
+            print("❌ Missing Google API dependencies. Install with:")
+            print("pip install google-auth google-auth-oauthlib google-api-python-client")
+            return False
+        
         creds_path = self.config.PROJECT_ROOT / self.config.CREDENTIALS_FILE
         
         if not creds_path.exists():
@@ -142,6 +555,7 @@ class GoogleDriveSync:
                     pickle.dump(creds, token)
             
             # Build Drive service
+            self.creds = creds
             self.service = build('drive', 'v3', credentials=creds)
             print("✅ OAuth authentication successful!")
             return True
@@ -177,66 +591,337 @@ class GoogleDriveSync:
         return folder['id']
     
     def upload_file(self, local_path: Path, drive_folder_id: str, drive_filename: str = None) -> str:
-        """Upload file to Google Drive"""
+        """Upload file to Google Drive in resumable chunks (replaces a same-named file)"""
         if not drive_filename:
             drive_filename = local_path.name
         
-        # Check if file already exists
-        query = f"name='{drive_filename}' and parents in '{drive_folder_id}' and trashed=false"
-        results = self.service.files().list(q=query).execute()
-        existing_files = results.get('files', [])
-        
-        file_metadata = {'name': drive_filename, 'parents': [drive_folder_id]}
-        media = MediaFileUpload(str(local_path), resumable=True)
-        
-        if existing_files:
-            # Update existing file (without parents field)
-            file_id = existing_files[0]['id']
-            update_metadata = {'name': drive_filename}
-            self.service.files().update(
-                fileId=file_id, 
-                body=update_metadata, 
-                media_body=media
-            ).execute()
-            print(f"📤 Updated: {drive_filename}")
-        else:
-            # Create new file
-            self.service.files().create(
-                body=file_metadata, 
-                media_body=media
-            ).execute()
-            print(f"📤 Uploaded: {drive_filename}")
-        
+        self.transfer_engine().upload_file(local_path, drive_filename, drive_folder_id)
+        print(f"📤 Uploaded: {drive_filename}")
         return drive_filename
     
     def download_file(self, drive_file_id: str, local_path: Path) -> bool:
-        """Download file from Google Drive"""
+        """Stream a Drive file to disk chunk by chunk, resuming a partial download"""
         try:
-            request = self.service.files().get_media(fileId=drive_file_id)
-            file_io = io.BytesIO()
-            downloader = MediaIoBaseDownload(file_io, request)
-            done = False
-            while done is False:
-                status, done = downloader.next_chunk()
-            
-            # Ensure parent directory exists
-            local_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            # Write file content
-            with open(local_path, 'wb') as f:
-                f.write(file_io.getvalue())
-            
+            self.transfer_engine().download_file(drive_file_id, local_path)
             print(f"📥 Downloaded: {local_path.name}")
             return True
         except Exception as e:
             print(f"❌ Failed to download {local_path.name}: {str(e)}")
             return False
     
-    def list_drive_files(self, folder_id: str) -> List[Dict]:
-        """List all files in a Drive folder"""
+    def list_drive_files(self, folder_id: str, name: str = None) -> List[Dict]:
+        """List all files in a Drive folder (following pagination), optionally by exact name"""
         query = f"parents in '{folder_id}' and trashed=false"
-        results = self.service.files().list(q=query, fields="files(id, name, mimeType)").execute()
-        return results.get('files', [])
+        if name:
+            escaped = name.replace("\\", "\\\\").replace("'", "\\'")
+            query += f" and name='{escaped}'"
+        
+        files, page_token = [], None
+        while True:
+            results = self.thread_service().files().list(
+                q=query,
+                fields="nextPageToken, files(id, name, mimeType)",
+                pageSize=1000,
+                pageToken=page_token
+            ).execute()
+            files.extend(results.get('files', []))
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return files
+
+# ============================================================
+# DELTA SYNC (CONTENT-ADDRESSED MANIFEST)
+# ============================================================
+
+def file_sha256(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """Stream a file through SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_sync_paths(config: DataSyncConfig):
+    """Yield project-relative POSIX paths of every file under sync, skipping temp files"""
+    for folder in config.SYNC_FOLDERS:
+        folder_path = config.PROJECT_ROOT / folder
+        if folder_path.exists():
+            for file_path in sorted(folder_path.rglob('*')):
+                if file_path.is_file() and file_path.suffix not in config.TEMP_SUFFIXES:
+                    yield file_path.relative_to(config.PROJECT_ROOT).as_posix()
+    for file_name in config.SYNC_FILES:
+        if (config.PROJECT_ROOT / file_name).is_file():
+            yield Path(file_name).as_posix()
+
+
+def build_local_manifest(config: DataSyncConfig, previous: Optional[Dict] = None) -> Dict[str, Dict]:
+    """
+    Manifest of {path: {size, sha256, mtime}} for local files.
+    Hashes from the previous manifest are reused when size and mtime are unchanged.
+    """
+    previous = previous or {}
+    manifest = {}
+    for rel_path in iter_sync_paths(config):
+        stat = (config.PROJECT_ROOT / rel_path).stat()
+        cached = previous.get(rel_path)
+        if cached and cached['size'] == stat.st_size and cached['mtime'] == stat.st_mtime:
+            sha = cached['sha256']
+        else:
+            sha = file_sha256(config.PROJECT_ROOT / rel_path)
+        manifest[rel_path] = {'size': stat.st_size, 'sha256': sha, 'mtime': stat.st_mtime}
+    return manifest
+
+
+def diff_manifests(local: Dict[str, Dict], remote: Dict[str, Dict]) -> Dict[str, List[str]]:
+    """Classify paths by where they changed (content is compared by hash only)"""
+    diff = {'local_only': [], 'remote_only': [], 'changed': [], 'unchanged': []}
+    for path, entry in local.items():
+        if path not in remote:
+            diff['local_only'].append(path)
+        elif remote[path]['sha256'] != entry['sha256']:
+            diff['changed'].append(path)
+        else:
+            diff['unchanged'].append(path)
+    diff['remote_only'] = [path for path in remote if path not in local]
+    return diff
+
+
+class StorageBackend:
+    """Remote store holding one manifest plus content-addressed objects (named by SHA-256)"""
+    
+    name = 'storage'
+    
+    def read_manifest(self) -> Dict[str, Dict]:
+        raise NotImplementedError
+    
+    def write_manifest(self, manifest: Dict[str, Dict]) -> None:
+        raise NotImplementedError
+    
+    def list_objects(self) -> Set[str]:
+        raise NotImplementedError
+    
+    def put_object(self, sha: str, local_path: Path) -> None:
+        raise NotImplementedError
+    
+    def get_object(self, sha: str, local_path: Path) -> None:
+        raise NotImplementedError
+
+
+class LocalStorageBackend(StorageBackend):
+    """Filesystem stand-in for remote storage (offline use and testing)"""
+    
+    name = 'local'
+    
+    def __init__(self, root: Path, config: DataSyncConfig):
+        self.root = Path(root)
+        self.config = config
+        self.objects_dir = self.root / config.OBJECTS_FOLDER_NAME
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        # Objects go through the same chunked/resumable path as Drive uploads
+        self.engine = TransferEngine(LocalTransport(self.root), config)
+    
+    def _object_folder(self, sha: str) -> str:
+        return f"{self.config.OBJECTS_FOLDER_NAME}/{sha[:2]}"
+    
+    def read_manifest(self) -> Dict[str, Dict]:
+        manifest_path = self.root / self.config.MANIFEST_NAME
+        if not manifest_path.exists():
+            return {}
+        with open(manifest_path, 'r') as f:
+            return json.load(f).get('files', {})
+    
+    def write_manifest(self, manifest: Dict[str, Dict]) -> None:
+        tmp_path = self.root / (self.config.MANIFEST_NAME + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'updated': datetime.now().isoformat(), 'files': manifest}, f, indent=2)
+        os.replace(tmp_path, self.root / self.config.MANIFEST_NAME)
+    
+    def list_objects(self) -> Set[str]:
+        return {p.name for p in self.objects_dir.glob('*/*') if p.is_file()}
+    
+    def put_object(self, sha: str, local_path: Path) -> None:
+        self.engine.upload_file(local_path, sha, self._object_folder(sha))
+    
+    def get_object(self, sha: str, local_path: Path) -> None:
+        self.engine.download_file(f"{self._object_folder(sha)}/{sha}", local_path)
+
+
+class DriveStorageBackend(StorageBackend):
+    """Google Drive store: manifest in the project folder, objects in a subfolder"""
+    
+    name = 'drive'
+    
+    def __init__(self, drive_sync: GoogleDriveSync, config: DataSyncConfig):
+        self.drive = drive_sync
+        self.config = config
+        self.engine = drive_sync.transfer_engine()
+        self.objects_folder_id = drive_sync.get_or_create_folder(
+            config.OBJECTS_FOLDER_NAME, drive_sync.drive_folder_id
+        )
+        self._object_ids: Dict[str, str] = {}
+    
+    def _find_manifest(self) -> Optional[Dict]:
+        for file_info in self.drive.list_drive_files(self.drive.drive_folder_id, name=self.config.MANIFEST_NAME):
+            return file_info
+        return None
+    
+    def read_manifest(self) -> Dict[str, Dict]:
+        file_info = self._find_manifest()
+        if not file_info:
+            return {}
+        content = self.drive.service.files().get_media(fileId=file_info['id']).execute()
+        return json.loads(content).get('files', {})
+    
+    def write_manifest(self, manifest: Dict[str, Dict]) -> None:
+        payload = json.dumps({'updated': datetime.now().isoformat(), 'files': manifest}, indent=2).encode()
+        media = MediaIoBaseUpload(io.BytesIO(payload), mimetype='application/json')
+        existing = self._find_manifest()
+        if existing:
+            self.drive.service.files().update(fileId=existing['id'], media_body=media).execute()
+        else:
+            self.drive.service.files().create(
+                body={'name': self.config.MANIFEST_NAME, 'parents': [self.drive.drive_folder_id]},
+                media_body=media
+            ).execute()
+    
+    def list_objects(self) -> Set[str]:
+        self._object_ids = {f['name']: f['id'] for f in self.drive.list_drive_files(self.objects_folder_id)}
+        return set(self._object_ids)
+    
+    def put_object(self, sha: str, local_path: Path) -> None:
+        self.engine.upload_file(local_path, sha, self.objects_folder_id)
+    
+    def get_object(self, sha: str, local_path: Path) -> None:
+        if sha not in self._object_ids:
+            self.list_objects()
+        self.engine.download_file(self._object_ids[sha], local_path)
+
+
+class DeltaSync:
+    """Uploads/downloads only files whose content hash differs, in parallel"""
+    
+    def __init__(self, config: DataSyncConfig, backend: StorageBackend, workers: int = None):
+        self.config = config
+        self.backend = backend
+        self.workers = workers or config.TRANSFER_WORKERS
+        self.stats = {'uploaded': 0, 'downloaded': 0, 'skipped': 0, 'errors': 0, 'bytes': 0}
+        self._stats_lock = threading.Lock()
+    
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[key] += amount
+    
+    def _cache_path(self) -> Path:
+        return self.config.PROJECT_ROOT / self.config.LOCAL_MANIFEST_CACHE
+    
+    def load_local_manifest(self) -> Dict[str, Dict]:
+        previous = {}
+        if self._cache_path().exists():
+            try:
+                with open(self._cache_path(), 'r') as f:
+                    previous = json.load(f)
+            except (OSError, ValueError):
+                previous = {}
+        manifest = build_local_manifest(self.config, previous)
+        self.save_local_manifest(manifest)
+        return manifest
+    
+    def save_local_manifest(self, manifest: Dict[str, Dict]) -> None:
+        with open(self._cache_path(), 'w') as f:
+            json.dump(manifest, f)
+    
+    def _run_parallel(self, jobs: Dict[str, callable]) -> List[str]:
+        """Run {label: fn} jobs on the worker pool, returning labels that failed"""
+        failed = []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(fn): label for label, fn in jobs.items()}
+            for future in as_completed(futures):
+                label = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"❌ {label}: {e}")
+                    failed.append(label)
+        self.stats['errors'] += len(failed)
+        return failed
+    
+    def push(self, dry_run: bool = False) -> bool:
+        """Upload changed files and publish the local manifest as the remote one"""
+        print(f"\n🔄 Delta upload to {self.backend.name} storage...")
+        local = self.load_local_manifest()
+        remote = self.backend.read_manifest()
+        diff = diff_manifests(local, remote)
+        
+        existing = self.backend.list_objects()
+        pending: Dict[str, str] = {}
+        for path in diff['local_only'] + diff['changed']:
+            sha = local[path]['sha256']
+            if sha not in existing and sha not in pending:
+                pending[sha] = path
+        
+        self.stats['skipped'] += len(diff['unchanged'])
+        print(f"📊 {len(diff['unchanged'])} unchanged, {len(diff['local_only'])} new, "
+              f"{len(diff['changed'])} changed, {len(pending)} objects to upload")
+        if dry_run:
+            for sha, path in pending.items():
+                print(f"  📤 would upload: {path}")
+            return True
+        
+        def upload(sha: str, path: str):
+            self.backend.put_object(sha, self.config.PROJECT_ROOT / path)
+            self._count('uploaded')
+            self._count('bytes', local[path]['size'])
+            print(f"  📤 Uploaded: {path}")
+        
+        failed = self._run_parallel({path: (lambda s=sha, p=path: upload(s, p)) for sha, path in pending.items()})
+        if failed:
+            print("❌ Some uploads failed; remote manifest left unchanged.")
+            return False
+        
+        self.backend.write_manifest(local)
+        print("✅ Delta upload completed.")
+        return True
+    
+    def pull(self, dry_run: bool = False) -> bool:
+        """Download files whose remote hash differs from the local copy"""
+        print(f"\n🔄 Delta download from {self.backend.name} storage...")
+        remote = self.backend.read_manifest()
+        if not remote:
+            print("❌ No remote manifest found. Run an upload first.")
+            return False
+        local = self.load_local_manifest()
+        diff = diff_manifests(local, remote)
+        pending = diff['remote_only'] + diff['changed']
+        
+        self.stats['skipped'] += len(diff['unchanged'])
+        print(f"📊 {len(diff['unchanged'])} unchanged, {len(pending)} files to download")
+        if dry_run:
+            for path in pending:
+                print(f"  📥 would download: {path}")
+            return True
+        
+        def download(path: str):
+            entry = remote[path]
+            target = self.config.PROJECT_ROOT / path
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = target.with_name(target.name + '.part')
+            self.backend.get_object(entry['sha256'], tmp_path)
+            if file_sha256(tmp_path) != entry['sha256']:
+                tmp_path.unlink(missing_ok=True)
+                raise IOError("hash mismatch after download")
+            os.replace(tmp_path, target)
+            os.utime(target, (entry['mtime'], entry['mtime']))
+            self._count('downloaded')
+            self._count('bytes', entry['size'])
+            print(f"  📥 Downloaded: {path}")
+        
+        failed = self._run_parallel({path: (lambda p=path: download(p)) for path in pending})
+        self.load_local_manifest()
+        if failed:
+            return False
+        print("✅ Delta download completed.")
+        return True
 
 # ============================================================
 # MAIN SYNC CLASS
@@ -245,9 +930,13 @@ class GoogleDriveSync:
 class MyPocketLawyerDataSync:
     """Main class for syncing MyPocketLawyer data with Google Drive"""
     
-    def __init__(self):
+    def __init__(self, backend: str = 'drive', local_store: Optional[Path] = None, workers: Optional[int] = None):
         self.config = DataSyncConfig()
         self.drive_sync = GoogleDriveSync(self.config)
+        self.backend = backend
+        self.local_store = local_store
+        self.workers = workers
+        self.storage: Optional[StorageBackend] = None
         self.stats = {
             'uploaded': 0,
             'downloaded': 0,
@@ -255,10 +944,18 @@ class MyPocketLawyerDataSync:
         }
     
     def setup(self) -> bool:
-        """Initialize Google Drive connection"""
+        """Initialize Google Drive connection (or the local storage stand-in)"""
         print("🚀 MyPocketLawyer Data Sync Tool")
         print("=" * 50)
         
+        if self.backend == 'local':
+            if not self.local_store:
+                print("❌ --local-store is required with --backend local")
+                return False
+            self.storage = LocalStorageBackend(self.local_store, self.config)
+            print(f"📁 Using local storage: {self.local_store}")
+            return True
+        
         if not self.drive_sync.authenticate():
             return False
         
@@ -269,37 +966,62 @@ class MyPocketLawyerDataSync:
         
         return True
     
-    def create_archive(self, archive_path: Path) -> bool:
-        """Create ZIP archive of all sync data"""
-        print("📦 Creating data archive...")
-        
+    def get_storage(self) -> StorageBackend:
+        if self.storage is None:
+            self.storage = DriveStorageBackend(self.drive_sync, self.config)
+        return self.storage
+    
+    def _delta(self, direction: str, dry_run: bool) -> bool:
+        delta = DeltaSync(self.config, self.get_storage(), self.workers)
         try:
-            with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                
-                # Add folders
-                for folder in self.config.SYNC_FOLDERS:
-                    folder_path = self.config.PROJECT_ROOT / folder
-                    if folder_path.exists():
-                        for file_path in folder_path.rglob('*'):
-                            if file_path.is_file():
-                                # Maintain relative path structure in archive
-                                arc_name = file_path.relative_to(self.config.PROJECT_ROOT)
-                                zipf.write(file_path, arc_name)
-                                print(f"  📄 Added: {arc_name}")
-                
-                # Add individual files
-                for file_name in self.config.SYNC_FILES:
-                    file_path = self.config.PROJECT_ROOT / file_name
-                    if file_path.exists():
-                        zipf.write(file_path, file_name)
-                        print(f"  📄 Added: {file_name}")
-            
-            print(f"✅ Archive created: {archive_path}")
-            return True
-            
+            success = delta.push(dry_run) if direction == 'push' else delta.pull(dry_run)
         except Exception as e:
-            print(f"❌ Failed to create archive: {str(e)}")
-            return False
+            print(f"❌ Delta sync failed: {str(e)}")
+            delta.stats['errors'] += 1
+            success = False
+        self.stats['uploaded'] += delta.stats['uploaded']
+        self.stats['downloaded'] += delta.stats['downloaded']
+        self.stats['errors'] += delta.stats['errors']
+        print(f"📦 Transferred {round(delta.stats['bytes'] / 1024 / 1024, 2)} MB, "
+              f"skipped {delta.stats['skipped']} unchanged files")
+        return success
+    
+    def delta_upload(self, dry_run: bool = False) -> bool:
+        """Upload only files whose content changed since the remote manifest"""
+        return self._delta('push', dry_run)
+    
+    def delta_download(self, dry_run: bool = False) -> bool:
+        """Download only files whose content differs from the remote manifest"""
+        return self._delta('pull', dry_run)
+    
+    def _archive_target(self):
+        """(transfer engine, folder) that the legacy ZIP archive is stored in"""
+        if self.backend == 'local':
+            return self.storage.engine, ''
+        return self.drive_sync.transfer_engine(), self.drive_sync.drive_folder_id
+    
+    def _archive_resume_key(self) -> str:
+        """Identifies the archive contents so an interrupted upload can be resumed"""
+        digest = hashlib.sha256()
+        for rel_path in iter_sync_paths(self.config):
+            stat = (self.config.PROJECT_ROOT / rel_path).stat()
+            digest.update(f"{rel_path}:{stat.st_size}:{stat.st_mtime}\n".encode())
+        return digest.hexdigest()[:16]
+    
+    def create_archive(self, fileobj) -> int:
+        """
+        Write a ZIP archive of all sync data to a (possibly non-seekable) file object.
+        Files are added in sorted order so the same inputs produce the same bytes.
+        """
+        print("📦 Streaming data archive...")
+        count = 0
+        with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            for rel_path in iter_sync_paths(self.config):
+                # Maintain relative path structure in archive
+                zipf.write(self.config.PROJECT_ROOT / rel_path, rel_path)
+                print(f"  📄 Added: {rel_path}")
+                count += 1
+        return count
     
     def extract_archive(self, archive_path: Path) -> bool:
         """Extract ZIP archive to maintain file structure"""
@@ -321,99 +1043,71 @@ class MyPocketLawyerDataSync:
             return False
     
     def upload_data(self) -> bool:
-        """Upload all sync data to Google Drive as ZIP archive"""
+        """Upload all sync data as a ZIP archive, compressing while uploading (no temp file)"""
         print("\n🔄 Starting data upload...")
-        
-        # Create temporary archive
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        archive_name = f"mypocketlawyer_data_{timestamp}.zip"
-        temp_archive = self.config.PROJECT_ROOT / "temp" / archive_name
-        temp_archive.parent.mkdir(exist_ok=True)
         
         try:
-            # Create archive
-            if not self.create_archive(temp_archive):
-                return False
-            
-            # Upload to Drive
-            self.drive_sync.upload_file(
-                temp_archive, 
-                self.drive_sync.drive_folder_id, 
-                "mypocketlawyer_data_latest.zip"
+            engine, folder = self._archive_target()
+            started = time.time()
+            archive_bytes = engine.upload_stream(
+                self.create_archive,
+                "mypocketlawyer_data_latest.zip",
+                folder,
+                resume_key=self._archive_resume_key(),
+                mimetype='application/zip'
             )
+            if archive_bytes < 0:
+                print("✅ Archive already uploaded by a previous run.")
+                return True
             
             # Create metadata file
             metadata = {
                 "timestamp": timestamp,
                 "sync_folders": self.config.SYNC_FOLDERS,
                 "sync_files": self.config.SYNC_FILES,
-                "archive_size_mb": round(temp_archive.stat().st_size / 1024 / 1024, 2)
+                "archive_size_mb": round(archive_bytes / 1024 / 1024, 2)
             }
-            
-            metadata_path = temp_archive.parent / "sync_metadata.json"
-            with open(metadata_path, 'w') as f:
-                json.dump(metadata, f, indent=2)
-            
-            self.drive_sync.upload_file(
-                metadata_path,
-                self.drive_sync.drive_folder_id,
-                "sync_metadata.json"
-            )
+            payload = json.dumps(metadata, indent=2).encode()
+            engine.upload_stream(lambda f: f.write(payload), "sync_metadata.json", folder,
+                                 mimetype='application/json')
             
             self.stats['uploaded'] += 2
+            elapsed = max(time.time() - started, 1e-6)
             print(f"\n✅ Upload completed successfully!")
-            print(f"📊 Archive size: {metadata['archive_size_mb']} MB")
+            print(f"📊 Archive size: {metadata['archive_size_mb']} MB "
+                  f"({round(archive_bytes / 1024 / 1024 / elapsed, 2)} MB/s)")
             
             return True
             
         except Exception as e:
             print(f"❌ Upload failed: {str(e)}")
+            print("💡 Re-run the same command to resume the upload.")
             self.stats['errors'] += 1
             return False
-        
-        finally:
-            # Cleanup temporary files
-            if temp_archive.exists():
-                temp_archive.unlink()
-            if temp_archive.parent.exists():
-                import shutil
-                shutil.rmtree(temp_archive.parent)
     
     def download_data(self) -> bool:
-        """Download data from Google Drive and extract to maintain structure"""
+        """Download the data archive straight to disk and extract to maintain structure"""
         print("\n🔄 Starting data download...")
         
+        # Kept across failed runs so the partial download can resume
+        temp_dir = self.config.PROJECT_ROOT / "temp"
         try:
-            # List files in Drive folder
-            drive_files = self.drive_sync.list_drive_files(self.drive_sync.drive_folder_id)
-            
-            # Find latest data archive
-            data_archive = None
-            metadata_file = None
-            
-            for file_info in drive_files:
-                if file_info['name'] == 'mypocketlawyer_data_latest.zip':
-                    data_archive = file_info
-                elif file_info['name'] == 'sync_metadata.json':
-                    metadata_file = file_info
+            engine, folder = self._archive_target()
+            archive_ref = engine.transport.find('mypocketlawyer_data_latest.zip', folder)
+            metadata_ref = engine.transport.find('sync_metadata.json', folder)
             
-            if not data_archive:
-                print("❌ No data archive found in Google Drive")
+            if not archive_ref:
+                print("❌ No data archive found in remote storage")
                 return False
             
-            # Create temporary directory
-            temp_dir = self.config.PROJECT_ROOT / "temp"
             temp_dir.mkdir(exist_ok=True)
             temp_archive = temp_dir / "downloaded_data.zip"
             
-            # Download archive
-            if not self.drive_sync.download_file(data_archive['id'], temp_archive):
-                return False
-            
             # Download metadata if available
-            if metadata_file:
+            if metadata_ref:
                 metadata_path = temp_dir / "metadata.json"
-                self.drive_sync.download_file(metadata_file['id'], metadata_path)
+                engine.download_file(metadata_ref, metadata_path)
                 
                 # Display metadata
                 try:
@@ -424,29 +1118,37 @@ class MyPocketLawyerDataSync:
                 except:
                     pass
             
+            # Download archive
+            engine.download_file(archive_ref, temp_archive)
+            print(f"📥 Downloaded: {temp_archive.name}")
+            
             # Extract archive
             if not self.extract_archive(temp_archive):
                 return False
             
             self.stats['downloaded'] += 1
             print(f"\n✅ Download completed successfully!")
+            shutil.rmtree(temp_dir)
             
             return True
             
         except Exception as e:
             print(f"❌ Download failed: {str(e)}")
+            print("💡 Re-run the same command to resume the download.")
             self.stats['errors'] += 1
             return False
-        
-        finally:
-            # Cleanup temporary files
-            temp_dir = self.config.PROJECT_ROOT / "temp"
-            if temp_dir.exists():
-                import shutil
-                shutil.rmtree(temp_dir)
     
     def check_status(self) -> None:
         """Check Google Drive sync status"""
+        if self.backend == 'local':
+            remote = self.storage.read_manifest()
+            local = build_local_manifest(self.config)
+            diff = diff_manifests(local, remote)
+            print(f"\n📁 Local store: {self.local_store} ({len(remote)} files in manifest)")
+            print(f"  • unchanged: {len(diff['unchanged'])}, changed: {len(diff['changed'])}, "
+                  f"local only: {len(diff['local_only'])}, remote only: {len(diff['remote_only'])}")
+            return
+        
         print("\n🔍 Checking Google Drive status...")
         
         try:
@@ -494,10 +1196,12 @@ def main():
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog="""
 Examples:
-  python data_sync.py upload          # Upload data to Google Drive
-  python data_sync.py download        # Download data from Google Drive  
+  python data_sync.py upload          # Upload changed files to Google Drive (delta sync)
+  python data_sync.py download        # Download changed files from Google Drive (delta sync)
+  python data_sync.py upload --archive    # Legacy: upload everything as one ZIP archive
   python data_sync.py status          # Check sync status
   python data_sync.py setup           # Initial setup and authentication
+  python data_sync.py upload --backend local --local-store /tmp/mpl_store   # Offline store
         """
     )
     
@@ -513,10 +1217,42 @@ Examples:
         help='Force operation without confirmation prompts'
     )
     
+    parser.add_argument(
+        '--archive',
+        action='store_true',
+        help='Transfer everything as a single ZIP archive instead of delta sync'
+    )
+    
+    parser.add_argument(
+        '--backend',
+        choices=['drive', 'local'],
+        default='drive',
+        help='Remote storage: Google Drive or a local directory (default: drive)'
+    )
+    
+    parser.add_argument(
+        '--local-store',
+        type=Path,
+        help='Directory used as remote storage with --backend local'
+    )
+    
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=DataSyncConfig.TRANSFER_WORKERS,
+        help=f'Parallel file transfers (default: {DataSyncConfig.TRANSFER_WORKERS})'
+    )
+    
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Show what delta sync would transfer without transferring'
+    )
+    
     args = parser.parse_args()
     
     # Initialize sync tool
-    sync_tool = MyPocketLawyerDataSync()
+    sync_tool = MyPocketLawyerDataSync(args.backend, args.local_store, args.workers)
     
     if args.command == 'setup':
         if sync_tool.setup():
@@ -533,28 +1269,28 @@ Examples:
             return 1
     
     elif args.command == 'upload':
-        if not args.force:
+        if not args.force and not args.dry_run:
             confirm = input("\n⚠️  This will upload local data to Google Drive. Continue? (y/N): ")
             if confirm.lower() != 'y':
                 print("Operation cancelled.")
                 return 0
         
         if sync_tool.setup():
-            success = sync_tool.upload_data()
+            success = sync_tool.upload_data() if args.archive else sync_tool.delta_upload(args.dry_run)
             sync_tool.print_stats()
             return 0 if success else 1
         else:
             return 1
     
     elif args.command == 'download':
-        if not args.force:
+        if not args.force and not args.dry_run:
             confirm = input("\n⚠️  This will overwrite local data with Google Drive content. Continue? (y/N): ")
             if confirm.lower() != 'y':
                 print("Operation cancelled.")
                 return 0
         
         if sync_tool.setup():
-            success = sync_tool.download_data()
+            success = sync_tool.download_data() if args.archive else sync_tool.delta_download(args.dry_run)
             sync_tool.print_stats()
             return 0 if success else 1
         else:
@@ -36,6 +36,10 @@ const LegalAssistant = () => {
     const [input, setInput] = useState("");
     const [isLoading, setIsLoading] = useState(false);
     const messagesContainerRef = useRef<HTMLDivElement>(null);
+    // Lets the backend treat "and what about that?" as a follow-up to the previous question
+    const sessionIdRef = useRef<string>(
+        crypto.randomUUID?.() ?? `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`
+    );
 
     useEffect(() => {
         if (messagesContainerRef.current) {
@@ -65,7 +69,7 @@ const LegalAssistant = () => {
             const response = await fetch(`${BACKEND_URL}/chat`, {
                 method: "POST",
                 headers: { "Content-Type": "application/json" },
-                body: JSON.stringify({ query: input, k: 8 }),
+                body: JSON.stringify({ query: input, k: 8, session_id: sessionIdRef.current }),
             });
 
             if (!response.ok) {
@@ -14,6 +14,9 @@ FRONTEND_PATH = BASE_DIR / "frontend"
 
 PYTHON_EXEC = sys.executable  # Use current Python environment
 
+# `python run.py --prod` serves with the pre-fork multi-worker server instead of --reload
+PROD_MODE = "--prod" in sys.argv
+
 # ============================================================
 # RUN BACKEND AND FRONTEND
 # ============================================================
@@ -23,10 +26,11 @@ PYTHON_EXEC = sys.executable  # Use current Python environment
 
 try:
     print("🚀 Starting backend (FastAPI)...")
-    backend_proc = subprocess.Popen(
-        [PYTHON_EXEC, "-m", "uvicorn", "backend.main:app", "--reload", "--host", "0.0.0.0", "--port", "8000"],
-        cwd=BASE_DIR
-    )
+    if PROD_MODE:
+        backend_cmd = [PYTHON_EXEC, str(BASE_DIR / "backend" / "serve.py"), "--host", "0.0.0.0", "--port", "8000"]
+    else:
+        backend_cmd = [PYTHON_EXEC, "-m", "uvicorn", "backend.main:app", "--reload", "--host", "0.0.0.0", "--port", "8000"]
+    backend_proc = subprocess.Popen(backend_cmd, cwd=BASE_DIR)
 
     # Start frontend:
     # If frontend contains package.json -> assume Node/Vite app and run `npm run dev`
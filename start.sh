@@ -3,15 +3,23 @@
 
 echo "🚀 Starting MyPocketLawyer..."
 
-# Check if chroma_db exists and has data
-if [ -d "/app/chroma_db" ] && [ -n "$(ls -A /app/chroma_db 2>/dev/null)" ]; then
-    echo "✅ ChromaDB found with data, skipping ingestion."
+# Never ingest at boot: embedding the corpus does not fit in 512MB RAM.
+# Prefer a published snapshot (python backend/ingest.py --publish), else the baked-in chroma_db.
+SNAPSHOTS_DIR="${SNAPSHOTS_DIR:-/app/snapshots}"
+if [ -z "$INDEX_SNAPSHOT" ] && [ -f "$SNAPSHOTS_DIR/latest.json" ]; then
+    export INDEX_SNAPSHOT=latest
+fi
+
+if [ -n "$INDEX_SNAPSHOT" ]; then
+    echo "✅ Serving index snapshot '$INDEX_SNAPSHOT' from $SNAPSHOTS_DIR."
+elif [ -d "/app/chroma_db" ] && [ -n "$(ls -A /app/chroma_db 2>/dev/null)" ]; then
+    echo "✅ ChromaDB found with data."
 else
-    echo "⚠️  ChromaDB not found. This will cause issues on free tier due to memory limits."
-    echo "📚 Attempting data ingestion (may fail due to 512MB RAM limit)..."
-    python backend/ingest.py || echo "❌ Ingestion failed - not enough memory"
+    echo "⚠️  No index snapshot or ChromaDB found. Retrieval will fail until one is published;"
+    echo "   build it elsewhere with 'python backend/ingest.py --publish' and copy snapshots/ here."
 fi
 
-# Start the FastAPI application
+# Start the FastAPI application: the encoder and index are loaded once and
+# shared copy-on-write by the workers (count from WEB_CONCURRENCY, else cores/memory)
 echo "🌐 Starting FastAPI server..."
-uvicorn backend.main:app --host 0.0.0.0 --port 8000
+exec python backend/serve.py --host 0.0.0.0 --port "${PORT:-8000}"